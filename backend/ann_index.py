@@ -0,0 +1,74 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index in NumPy.
+
+Unit vectors are clustered with spherical k-means; a query is compared with
+the centroids and only the vectors in the n_probe closest lists are scored
+exactly by cosine similarity.
+"""
+from typing import Tuple
+
+import numpy as np
+
+# Rows per block when assigning vectors to centroids, bounding the (rows x lists) buffer
+ASSIGN_CHUNK = 65536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class IVFIndex:
+    """Spherical k-means IVF index over a fixed set of unit vectors"""
+
+    def __init__(self, vectors: np.ndarray, n_lists: int = None, n_iter: int = 10, seed: int = 0):
+        self.vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        num_vectors = len(self.vectors)
+        if num_vectors == 0:
+            # An empty corpus has no lists; search() then finds nothing
+            self.n_lists = 0
+            self.centroids = np.zeros((0, self.vectors.shape[1]), dtype=np.float32)
+            self.list_ids = np.zeros(0, dtype=np.int64)
+            self.list_offsets = np.zeros(1, dtype=np.int64)
+            return
+        self.n_lists = max(1, min(n_lists or int(np.sqrt(num_vectors)), num_vectors))
+
+        rng = np.random.default_rng(seed)
+        self.centroids = self.vectors[rng.choice(num_vectors, self.n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = self._assign(self.vectors)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignments, self.vectors)
+            counts = np.bincount(assignments, minlength=self.n_lists)
+            # Empty lists keep their previous centroid
+            filled = counts > 0
+            self.centroids[filled] = _normalize(sums[filled])
+
+        assignments = self._assign(self.vectors)
+        self.list_ids = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.list_offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=self.n_lists), out=self.list_offsets[1:])
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), ASSIGN_CHUNK):
+            block = vectors[start:start + ASSIGN_CHUNK]
+            assignments[start:start + ASSIGN_CHUNK] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def search(self, query: np.ndarray, k: int, n_probe: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and cosine similarities of the approximate top k vectors, best first"""
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        n_probe = min(n_probe, self.n_lists)
+        if n_probe < 1:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        probe = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        ids = np.concatenate([self.list_ids[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probe])
+        if len(ids) == 0:
+            return ids, np.zeros(0, dtype=np.float32)
+        scores = self.vectors[ids] @ query
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return ids[top], scores[top]
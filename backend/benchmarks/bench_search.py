@@ -0,0 +1,291 @@
+"""
+End-to-end search benchmark on a synthetic corpus.
+
+    python benchmarks/bench_search.py --recipes 200000 --output bench.json
+    python benchmarks/bench_search.py --recipes 200000 --compare bench.json --max-p99-ms 50
+
+Writes a Word2Vec model and cleaned recipe CSV/.npz of the requested size (or
+reuses them from --data-dir), builds the on-disk index, then measures:
+
+- load time and memory for each load path (model + CSV, model + .npz, prebuilt
+  index), each in a fresh process so memory figures are not shared
+- single-query latency percentiles for every search mode, with the query
+  cache disabled
+- search_many throughput
+- typo correction cost: preprocess_query alone and each mode on misspelled queries
+- with --vector-dtype float16/int8, ranking agreement of exact search with float32
+
+The JSON report records the commit and parameters so runs can be compared
+across commits with --compare.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantized_vectors import VECTOR_DTYPES
+from search_engine import SEARCH_MODES, OptimizedSearchEngine
+from benchmarks.synthetic import misspell, synthetic_corpus_files, synthetic_queries
+
+REPORT_VERSION = 1
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (Linux), or the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    ms = np.array(seconds) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "qps": len(ms) / (ms.sum() / 1000),
+    }
+
+
+def timed(fn, inputs) -> List[float]:
+    latencies = []
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def measure_load(engine_args: Dict[str, str]) -> Dict[str, Any]:
+    """Load an engine in this process and report time and memory; run in a fresh process"""
+    gc.collect()
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    engine = OptimizedSearchEngine(**engine_args)
+    seconds = time.perf_counter() - start
+    if engine.word_index is None or engine.doc_offsets is None:
+        raise RuntimeError(f"Engine did not load from {engine_args}")
+    gc.collect()
+    return {
+        "seconds": seconds,
+        "rss_delta_mb": (current_rss_bytes() - rss_before) / 2 ** 20,
+        "peak_rss_mb": peak_rss_bytes() / 2 ** 20,
+        "num_docs": int(len(engine.doc_offsets) - 1),
+    }
+
+
+def measure_loads(paths: Dict[str, str], index_path: str, vector_dtype: str = "float32") -> Dict[str, Dict[str, Any]]:
+    load_paths = {
+        "model_csv": {"model_path": paths["model"], "recipes_path": paths["csv"], "vector_dtype": vector_dtype},
+        "model_npz": {"model_path": paths["model"], "recipes_path": paths["npz"], "vector_dtype": vector_dtype},
+        "index": {"index_path": index_path},
+    }
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name, engine_args in load_paths.items():
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[name] = pool.submit(measure_load, engine_args).result()
+        print(f"load {name:10s} {results[name]['seconds']:8.2f} s  "
+              f"rss +{results[name]['rss_delta_mb']:8.1f} MB  peak {results[name]['peak_rss_mb']:8.1f} MB")
+    return results
+
+
+def measure_modes(engine: OptimizedSearchEngine, queries: List[str], typo_queries: List[str],
+                  top_k: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for mode in SEARCH_MODES:
+        for query in queries[:5]:
+            engine.search(query, top_k, mode)
+        clean = latency_stats(timed(lambda query: engine.search(query, top_k, mode), queries))
+        typo = latency_stats(timed(lambda query: engine.search(query, top_k, mode), typo_queries))
+        results[mode] = {"clean": clean, "typo": typo, "typo_overhead_p50_ms": typo["p50_ms"] - clean["p50_ms"]}
+        print(f"{mode:10s}  p50={clean['p50_ms']:8.2f} ms  p99={clean['p99_ms']:8.2f} ms  "
+              f"qps={clean['qps']:8.1f}  typo p50={typo['p50_ms']:8.2f} ms")
+    return results
+
+
+def measure_typo_correction(engine: OptimizedSearchEngine, queries: List[str],
+                            typo_queries: List[str]) -> Dict[str, Any]:
+    stats = latency_stats(timed(engine.preprocess_query, typo_queries))
+    corrected = [engine.preprocess_query(typo) == query for query, typo in zip(queries, typo_queries)]
+    stats["corrected_fraction"] = float(np.mean(corrected))
+    print(f"typo correction  p50={stats['p50_ms']:8.3f} ms  p99={stats['p99_ms']:8.3f} ms  "
+          f"corrected={stats['corrected_fraction']:.1%}")
+    return stats
+
+
+def measure_batch(engine: OptimizedSearchEngine, queries: List[str], top_k: int) -> Dict[str, Any]:
+    engine.search_many(queries[:engine.batch_size], top_k)
+    start = time.perf_counter()
+    engine.search_many(queries, top_k)
+    seconds = time.perf_counter() - start
+    print(f"search_many  {len(queries)} queries in {seconds:.2f} s  ({len(queries) / seconds:.1f} queries/s)")
+    return {"queries": len(queries), "seconds": seconds, "qps": len(queries) / seconds,
+            "batch_size": engine.batch_size}
+
+
+def git_commit() -> Dict[str, Any]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def run(num_recipes: int = 100000, vocab_size: int = 20000, vector_size: int = 100,
+        tokens_per_recipe: int = 60, num_queries: int = 200, top_k: int = 10, seed: int = 0,
+        data_dir: str = None, measure_load_paths: bool = True, vector_dtype: str = "float32") -> Dict[str, Any]:
+    """Run every measurement and return the report"""
+    params = {"recipes": num_recipes, "vocab": vocab_size, "vector_size": vector_size,
+              "tokens_per_recipe": tokens_per_recipe, "queries": num_queries, "top_k": top_k, "seed": seed,
+              "vector_dtype": vector_dtype}
+    with tempfile.TemporaryDirectory(prefix="bench-search-") as scratch:
+        data_dir = data_dir or scratch
+        corpus_dir = os.path.join(data_dir, f"corpus-{num_recipes}-{vocab_size}-{vector_size}-"
+                                            f"{tokens_per_recipe}-{seed}")
+        start = time.perf_counter()
+        if os.path.exists(os.path.join(corpus_dir, "cleaned_recipe_data.npz")):
+            paths = {"model": os.path.join(corpus_dir, "word2vec_model"),
+                     "csv": os.path.join(corpus_dir, "cleaned_recipe_data.csv"),
+                     "npz": os.path.join(corpus_dir, "cleaned_recipe_data.npz")}
+        else:
+            paths = synthetic_corpus_files(corpus_dir, num_recipes, vocab_size, vector_size,
+                                           tokens_per_recipe, seed)
+        generate_seconds = time.perf_counter() - start
+
+        index_path = os.path.join(corpus_dir, f"search_index_{vector_dtype}")
+        start = time.perf_counter()
+        builder = OptimizedSearchEngine(model_path=paths["model"], recipes_path=paths["npz"])
+        build_seconds = time.perf_counter() - start
+        vocabulary = types.SimpleNamespace(vocab=builder.model.index_to_key, word_counts=builder.word_counts)
+        queries = synthetic_queries(vocabulary, num_queries, seed=seed + 1)
+        agreement = None
+        if vector_dtype != "float32":
+            agreement = builder.vector_agreement(queries, vector_dtype, top_k)
+            print(f"{vector_dtype} vs float32: overlap@{top_k}={agreement['overlap_at_k']:.3f}  "
+                  f"top1={agreement['top1']:.3f}  identical={agreement['exact']:.3f}")
+            builder.quantize_vectors(vector_dtype)
+        start = time.perf_counter()
+        builder.save_index(index_path)
+        vectors_mb = (builder.word_vectors.nbytes + (builder.word_scales.nbytes if builder.word_scales is not None
+                                                     else 0)) / 2 ** 20
+        del builder
+        build_seconds += time.perf_counter() - start
+        print(f"corpus ready in {generate_seconds:.2f} s, index built in {build_seconds:.2f} s")
+
+        loads = measure_loads(paths, index_path, vector_dtype) if measure_load_paths else {}
+
+        engine = OptimizedSearchEngine(index_path=index_path, query_cache_size=0)
+        start = time.perf_counter()
+        engine._ensure_ann_index()
+        ann_seconds = time.perf_counter() - start
+
+        rng = np.random.default_rng(seed + 1)
+        typo_queries = [misspell(query, rng) for query in queries]
+        report = {
+            "version": REPORT_VERSION,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            **git_commit(),
+            "params": params,
+            "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                            "platform": platform.platform(), "cpu_count": os.cpu_count()},
+            "setup": {"generate_seconds": generate_seconds, "build_index_seconds": build_seconds,
+                      "ann_index_seconds": ann_seconds, "word_vectors_mb": vectors_mb},
+            "ranking_agreement": agreement,
+            "load": loads,
+            "modes": measure_modes(engine, queries, typo_queries, top_k),
+            "typo_correction": measure_typo_correction(engine, queries, typo_queries),
+            "batch": measure_batch(engine, queries, top_k),
+        }
+        return report
+
+
+def flatten(report: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    values = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = float(value)
+    return values
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print every timing and throughput figure next to the baseline run"""
+    print(f"\ncompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at')})")
+    if baseline.get("params") != report.get("params"):
+        print(f"warning: parameters differ: {baseline.get('params')} vs {report.get('params')}")
+    current, previous = flatten(report), flatten(baseline)
+    for key in sorted(current):
+        if key.startswith(("params.", "environment.", "version")) or key not in previous:
+            continue
+        if not key.endswith(("p50_ms", "p99_ms", "seconds", "qps", "rps", "_mb")) or previous[key] == 0:
+            continue
+        print(f"{key:45s} {previous[key]:12.3f} -> {current[key]:12.3f}  ({current[key] / previous[key]:6.2f}x)")
+
+
+def slo_violations(report: Dict[str, Any], max_p99_ms: float) -> List[str]:
+    return [f"{mode} p99 {stats['clean']['p99_ms']:.2f} ms > {max_p99_ms} ms"
+            for mode, stats in report["modes"].items() if stats["clean"]["p99_ms"] > max_p99_ms]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark search load time, latency and throughput")
+    parser.add_argument("--recipes", type=int, default=100000, help="Synthetic corpus size")
+    parser.add_argument("--vocab", type=int, default=20000, help="Synthetic vocabulary size")
+    parser.add_argument("--vector-size", type=int, default=100)
+    parser.add_argument("--tokens-per-recipe", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=200, help="Queries per measurement")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vector-dtype", default="float32", choices=VECTOR_DTYPES,
+                        help="Word vector storage type of the index under test")
+    parser.add_argument("--data-dir", help="Keep (and reuse) the generated corpus and index here")
+    parser.add_argument("--skip-load", action="store_true", help="Skip the per-load-path measurements")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    parser.add_argument("--max-p99-ms", type=float, help="Exit non-zero if any mode's p99 latency is higher")
+    args = parser.parse_args()
+    report = run(args.recipes, args.vocab, args.vector_size, args.tokens_per_recipe, args.queries,
+                 args.top_k, args.seed, args.data_dir, not args.skip_load, args.vector_dtype)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    if args.max_p99_ms is not None:
+        violations = slo_violations(report, args.max_p99_ms)
+        for violation in violations:
+            print(f"SLO violated: {violation}")
+        sys.exit(1 if violations else 0)
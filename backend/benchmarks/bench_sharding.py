@@ -0,0 +1,72 @@
+"""
+Scaling benchmark for sharded full-scan scoring.
+
+    python benchmarks/bench_sharding.py --recipes 1000000 --shards 1,2,4,8,16,32
+
+Caches and candidate pruning are disabled so every query scores the whole
+corpus; reports single-query latency and throughput per shard count.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_engine import OptimizedSearchEngine
+from benchmarks.synthetic import synthetic_index, synthetic_queries
+
+
+def default_shard_counts():
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def run(num_recipes: int, shard_counts, num_queries: int, top_k: int):
+    index = synthetic_index(num_recipes=num_recipes)
+    queries = synthetic_queries(index, num_queries)
+    results = []
+    baseline = None
+    for num_shards in shard_counts:
+        engine = OptimizedSearchEngine(prune_candidates=False, query_cache_size=0, word_cache_bytes=0,
+                                       num_shards=num_shards)
+        engine.use_index(index)
+        engine.search(queries[0], top_k)  # warm up the shard pool
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            engine.search(query, top_k)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+        qps = len(queries) / (latencies.sum() / 1000)
+        baseline = baseline or qps
+        results.append({
+            "shards": num_shards,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "qps": qps,
+            "speedup": qps / baseline,
+        })
+        print(f"shards={num_shards:3d}  p50={results[-1]['p50_ms']:8.2f} ms  "
+              f"p99={results[-1]['p99_ms']:8.2f} ms  qps={qps:8.1f}  speedup={qps / baseline:5.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sharded search scoring")
+    parser.add_argument("--recipes", type=int, default=200000, help="Synthetic corpus size")
+    parser.add_argument("--shards", default=",".join(map(str, default_shard_counts())),
+                        help="Comma-separated shard counts to compare")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per shard count")
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+    report = run(args.recipes, [int(n) for n in args.shards.split(",")], args.queries, args.top_k)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"recipes": args.recipes, "results": report}, f, indent=2)
@@ -0,0 +1,276 @@
+"""
+Concurrent load test of the FastAPI app.
+
+    python benchmarks/loadtest.py --concurrency 32 --duration 30 --output load.json
+    python benchmarks/loadtest.py --base-url http://localhost:8000 --scenarios search --compare load.json
+
+Virtual users repeatedly pick a scenario (by weight) from benchmarks/scenarios
+and run its steps in order. Without --base-url the app is served in-process
+through httpx's ASGI transport, with a synthetic search corpus, SQLite and
+in-memory Mongo (see loadtest_app.py); scenarios whose routers cannot be
+mounted are skipped and listed in the report.
+
+Scenario files are JSON:
+
+    {"name": ..., "weight": 1, "routers": ["recipes"], "variables": {"title": [...]},
+     "steps": [{"name": ..., "method": "POST", "path": "/api/recipes/", "json": {...},
+                "params": {...}, "expect": [201], "save": {"recipe_id": "id"}}]}
+
+"{var}" placeholders in path, params and json are filled from a random choice
+of each variable, {iteration} (unique per flow) and values saved from earlier
+responses. A string that is exactly one placeholder keeps the value's type.
+
+The report has requests per second, latency percentiles and error rates in
+total and per step.
+"""
+import argparse
+import asyncio
+import glob
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_search import compare, git_commit
+
+REPORT_VERSION = 1
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+def load_scenarios(names: List[str] = None) -> List[Dict[str, Any]]:
+    """Scenario files by name (or path); all of SCENARIO_DIR when names is empty"""
+    paths = [name if name.endswith(".json") else os.path.join(SCENARIO_DIR, name + ".json") for name in names or []]
+    scenarios = []
+    for path in paths or sorted(glob.glob(os.path.join(SCENARIO_DIR, "*.json"))):
+        with open(path) as f:
+            scenario = json.load(f)
+        scenario.setdefault("weight", 1)
+        scenario.setdefault("routers", [])
+        scenario.setdefault("variables", {})
+        scenarios.append(scenario)
+    return scenarios
+
+
+def fill(template, values: Dict[str, Any]):
+    """Substitute {name} placeholders throughout a string, list or dict"""
+    if isinstance(template, str):
+        match = PLACEHOLDER.fullmatch(template)
+        if match:
+            return values[match.group(1)]
+        return PLACEHOLDER.sub(lambda m: str(values[m.group(1)]), template)
+    if isinstance(template, list):
+        return [fill(item, values) for item in template]
+    if isinstance(template, dict):
+        return {key: fill(value, values) for key, value in template.items()}
+    return template
+
+
+def extract(body: Any, path: str):
+    """Value at a dotted path ("id", "results.0") of a JSON response"""
+    for part in path.split("."):
+        body = body[int(part)] if isinstance(body, list) else body[part]
+    return body
+
+
+class StepStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses = Counter()
+        self.errors = 0
+        self.error_samples: List[str] = []
+
+    def record(self, seconds: float, status, error: str = None):
+        self.latencies.append(seconds)
+        self.statuses[str(status)] += 1
+        if error is not None:
+            self.errors += 1
+            if len(self.error_samples) < 5:
+                self.error_samples.append(error)
+
+    def merge(self, other: "StepStats"):
+        self.latencies += other.latencies
+        self.statuses.update(other.statuses)
+        self.errors += other.errors
+        self.error_samples = (self.error_samples + other.error_samples)[:5]
+
+    def summary(self, wall_seconds: float) -> Dict[str, Any]:
+        ms = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        requests = len(self.latencies)
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": self.errors / requests if requests else 0.0,
+            "rps": requests / wall_seconds if wall_seconds else 0.0,
+            "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p90_ms": float(np.percentile(ms, 90)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            "max_ms": float(ms.max()),
+            "statuses": dict(self.statuses),
+            "error_samples": self.error_samples,
+        }
+
+
+async def run_flow(client: httpx.AsyncClient, scenario: Dict[str, Any], values: Dict[str, Any],
+                   stats: Dict[str, StepStats]):
+    """Run one pass over a scenario's steps; stop at the first failure a later step depends on"""
+    for step in scenario["steps"]:
+        key = f"{scenario['name']}/{step['name']}"
+        start = time.perf_counter()
+        try:
+            response = await client.request(step.get("method", "GET"), fill(step["path"], values),
+                                            params=fill(step.get("params"), values),
+                                            json=fill(step.get("json"), values))
+        except KeyError as e:
+            stats[key].record(0.0, "skipped", f"missing value {e}")
+            return
+        except httpx.HTTPError as e:
+            stats[key].record(time.perf_counter() - start, "exception", f"{type(e).__name__}: {e}")
+            return
+        seconds = time.perf_counter() - start
+        if response.status_code not in step.get("expect", [200]):
+            stats[key].record(seconds, response.status_code, f"{response.status_code}: {response.text[:200]}")
+            if step.get("save"):
+                return
+            continue
+        stats[key].record(seconds, response.status_code)
+        for name, path in step.get("save", {}).items():
+            values[name] = extract(response.json(), path)
+
+
+async def virtual_user(client: httpx.AsyncClient, scenarios: List[Dict[str, Any]], variables: Dict[str, list],
+                       deadline: float, iterations: int, counter, rng: random.Random,
+                       stats: Dict[str, StepStats]):
+    weights = [scenario["weight"] for scenario in scenarios]
+    done = 0
+    while time.perf_counter() < deadline and (iterations is None or done < iterations):
+        scenario = rng.choices(scenarios, weights)[0]
+        values = {name: rng.choice(choices) for name, choices in {**scenario["variables"], **variables}.items()
+                  if choices}
+        values["iteration"] = next(counter)
+        await run_flow(client, scenario, values, stats)
+        done += 1
+
+
+async def run_load(client: httpx.AsyncClient, scenarios: List[Dict[str, Any]], concurrency: int = 16,
+                   duration: float = 30.0, iterations: int = None, variables: Dict[str, list] = None,
+                   seed: int = 0) -> Dict[str, Any]:
+    """Run concurrency virtual users until duration passes (or each ran iterations flows)"""
+    user_stats = [{} for _ in range(concurrency)]
+    for stats in user_stats:
+        for scenario in scenarios:
+            for step in scenario["steps"]:
+                stats[f"{scenario['name']}/{step['name']}"] = StepStats()
+    counter = itertools.count()
+    start = time.perf_counter()
+    deadline = start + duration if duration else float("inf")
+    await asyncio.gather(*[
+        virtual_user(client, scenarios, variables or {}, deadline, iterations, counter,
+                     random.Random(seed * 1000 + i), user_stats[i])
+        for i in range(concurrency)
+    ])
+    wall_seconds = time.perf_counter() - start
+
+    steps = {key: StepStats() for key in user_stats[0]} if user_stats else {}
+    total = StepStats()
+    for stats in user_stats:
+        for key, step_stats in stats.items():
+            steps[key].merge(step_stats)
+            total.merge(step_stats)
+    return {
+        "wall_seconds": wall_seconds,
+        "total": total.summary(wall_seconds),
+        "steps": {key: step_stats.summary(wall_seconds) for key, step_stats in steps.items()},
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    for name, reason in report["skipped"].items():
+        print(f"skipped {name}: {reason}")
+    print(f"{'step':40s} {'requests':>9s} {'rps':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'errors':>8s}")
+    for key, stats in [*report["steps"].items(), ("total", report["total"])]:
+        if stats["requests"]:
+            print(f"{key:40s} {stats['requests']:9d} {stats['rps']:9.1f} {stats['p50_ms']:9.2f} "
+                  f"{stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f} {stats['error_rate']:8.2%}")
+
+
+async def main(args) -> Dict[str, Any]:
+    scenarios = load_scenarios([name for name in args.scenarios.split(",") if name])
+    skipped = {}
+    variables = {}
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        from benchmarks.loadtest_app import build_app
+
+        routers = sorted({router for scenario in scenarios for router in scenario["routers"]})
+        app, skipped_routers, variables = build_app(routers, args.data_dir, args.recipes)
+        for scenario in scenarios:
+            missing = [f"{router} ({skipped_routers[router]})" for router in scenario["routers"]
+                       if router in skipped_routers]
+            if missing:
+                skipped[scenario["name"]] = "router not mounted: " + ", ".join(missing)
+        scenarios = [scenario for scenario in scenarios if scenario["name"] not in skipped]
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest",
+                                   timeout=args.timeout)
+    if not scenarios:
+        raise SystemExit("No runnable scenarios: " + json.dumps(skipped))
+
+    async with client:
+        results = await run_load(client, scenarios, args.concurrency, args.duration, args.iterations,
+                                 variables, args.seed)
+    report = {
+        "version": REPORT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        **git_commit(),
+        "params": {"concurrency": args.concurrency, "duration": args.duration, "iterations": args.iterations,
+                   "scenarios": [scenario["name"] for scenario in scenarios],
+                   "target": args.base_url or "in-process", "recipes": None if args.base_url else args.recipes},
+        "skipped": skipped,
+        **results,
+    }
+    print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the FlavorConnect API")
+    parser.add_argument("--scenarios", default="", help="Comma-separated scenario names or files (default: all)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run for")
+    parser.add_argument("--iterations", type=int, help="Stop each virtual user after this many flows")
+    parser.add_argument("--base-url", help="Test a running server instead of the in-process app")
+    parser.add_argument("--recipes", type=int, default=20000, help="Synthetic search corpus size (in-process)")
+    parser.add_argument("--data-dir", help="Keep (and reuse) the synthetic corpus and SQLite database here")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    parser.add_argument("--max-error-rate", type=float, help="Exit non-zero if the total error rate is higher")
+    args = parser.parse_args()
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    if args.max_error_rate is not None and report["total"]["error_rate"] > args.max_error_rate:
+        print(f"Error rate {report['total']['error_rate']:.2%} is above {args.max_error_rate:.2%}")
+        sys.exit(1)
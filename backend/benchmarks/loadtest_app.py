@@ -0,0 +1,126 @@
+"""
+The FastAPI app from main.py wired to local stand-ins for load testing.
+
+- search serves a synthetic corpus (benchmarks/synthetic.py) unless
+  SEARCH_INDEX_PATH already points at a built index
+- the SQL routers (recipes, favorites, comments, users) run on SQLite through
+  a get_db override instead of MySQL
+- routers/chat.py gets the in-memory collections from memory_mongo.py
+  instead of MongoDB
+
+Every authenticated route runs as one load-test user. A router whose imports
+fail is left out and reported with the reason, so the scenarios that need it
+are skipped instead of failing.
+"""
+import importlib
+import logging
+import os
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import memory_mongo
+from benchmarks.synthetic import synthetic_corpus_files, synthetic_queries
+
+logger = logging.getLogger(__name__)
+
+LOADTEST_USER = {"email": "loadtest@example.com", "username": "loadtest", "hashed_password": "loadtest"}
+
+
+def prepare_search_corpus(data_dir: str, num_recipes: int) -> List[str]:
+    """Point main.py at a synthetic index (built once per size) and return matching queries"""
+    from search_engine import OptimizedSearchEngine
+    from search_index import read_index
+
+    index_path = os.environ.get("SEARCH_INDEX_PATH")
+    if not index_path or not os.path.exists(index_path):
+        corpus_dir = os.path.join(data_dir, f"loadtest-corpus-{num_recipes}")
+        index_path = os.path.join(corpus_dir, "search_index")
+        if not os.path.exists(index_path):
+            paths = synthetic_corpus_files(corpus_dir, num_recipes, vocab_size=max(200, num_recipes // 10))
+            OptimizedSearchEngine(model_path=paths["model"], recipes_path=paths["npz"]).save_index(index_path)
+        os.environ["SEARCH_INDEX_PATH"] = index_path
+    return synthetic_queries(read_index(index_path), 200)
+
+
+def _sqlite_session_factory(database_url: str):
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    engine = create_engine(database_url, connect_args={"check_same_thread": False, "timeout": 30})
+
+    @event.listens_for(engine, "connect")
+    def use_wal(connection, _):
+        # Concurrent readers alongside the writer, like InnoDB
+        connection.execute("PRAGMA journal_mode=WAL")
+
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def mount_routers(app, routers: List[str], database_url: str) -> Dict[str, str]:
+    """Include routers in app on SQLite and in-memory Mongo; returns {router: reason} for those left out"""
+    skipped = {}
+    try:
+        import auth
+        import database
+        import models
+    except ImportError as e:
+        return {name: f"needs module {e.name!r}" for name in routers}
+
+    import migrate_db
+
+    engine, SessionLocal = _sqlite_session_factory(database_url)
+    # Same steps as start.sh: create the tables, then apply the migrations
+    models.Base.metadata.create_all(bind=engine)
+    migrate_db.migrate(engine)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == LOADTEST_USER["email"]).first()
+        if user is None:
+            user = models.User(**LOADTEST_USER)
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        db.expunge(user)
+    finally:
+        db.close()
+
+    app.dependency_overrides[database.get_db] = get_db
+    app.dependency_overrides[auth.get_current_active_user] = lambda: user
+
+    if "chat" in routers:
+        mongo = memory_mongo.install()
+        mongo.users_collection.seed([{"mysql_id": user.id, "username": user.username}])
+
+    for name in routers:
+        try:
+            module = importlib.import_module(f"routers.{name}")
+        except ImportError as e:
+            skipped[name] = f"needs module {e.name!r}"
+            continue
+        app.include_router(module.router)
+    return skipped
+
+
+def build_app(routers: List[str] = ("recipes", "favorites", "chat"), data_dir: str = None,
+              num_recipes: int = 20000, database_url: str = None) -> Tuple[object, Dict[str, str], Dict[str, list]]:
+    """Return (app, skipped routers, variables for the scenarios)"""
+    data_dir = data_dir or tempfile.mkdtemp(prefix="loadtest-")
+    queries = prepare_search_corpus(data_dir, num_recipes)
+    import main
+
+    database_url = database_url or f"sqlite:///{os.path.join(data_dir, 'loadtest.db')}"
+    skipped = mount_routers(main.app, list(routers), database_url)
+    for name, reason in skipped.items():
+        logger.warning("Router %s not mounted: %s", name, reason)
+    return main.app, skipped, {"query": queries}
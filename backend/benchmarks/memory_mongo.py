@@ -0,0 +1,144 @@
+"""
+In-memory stand-in for the motor collections in mongodb.py.
+
+Implements the subset of the async collection API that routers/chat.py uses
+(find_one, find().sort().to_list(), insert_one, update_one with $set, $push,
+$pull and $inc, delete_one, count_documents) so the chat routes can be load
+tested without a MongoDB server. Filters match on equality, with Mongo's
+array semantics ({"members": x} matches documents whose members contain x),
+and {"$in": [...]}.
+"""
+import copy
+import itertools
+import os
+import sys
+import types
+from typing import Any, Dict, List, Optional
+
+try:
+    from bson import ObjectId
+except ImportError:
+    _counter = itertools.count()
+
+    class ObjectId(str):
+        """12-byte hex id used when bson is not installed"""
+
+        def __new__(cls, value: str = None):
+            if value is None:
+                value = os.urandom(8).hex() + format(next(_counter) % 2 ** 32, "08x")
+            return super().__new__(cls, value)
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+
+
+def _matches_value(actual, expected) -> bool:
+    if isinstance(expected, dict) and "$in" in expected:
+        return any(_matches_value(actual, value) for value in expected["$in"])
+    if isinstance(actual, list) and not isinstance(expected, list):
+        return expected in actual
+    return actual == expected
+
+
+def matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    return all(_matches_value(document.get(key), value) for key, value in (query or {}).items())
+
+
+class MemoryCursor:
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self._documents = documents
+
+    def sort(self, key: str, direction: int = 1) -> "MemoryCursor":
+        self._documents.sort(key=lambda document: document.get(key), reverse=direction < 0)
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        if count:
+            self._documents = self._documents[:count]
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._documents[:length] if length else list(self._documents)
+
+
+class MemoryCollection:
+    """One Mongo collection as a list of documents; every call returns copies"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._documents: List[Dict[str, Any]] = []
+
+    def seed(self, documents: List[Dict[str, Any]]):
+        """Insert documents synchronously, before the event loop is running"""
+        for document in documents:
+            self._documents.append({"_id": ObjectId(), **copy.deepcopy(document)})
+
+    async def find_one(self, query: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        for document in self._documents:
+            if matches(document, query):
+                return copy.deepcopy(document)
+        return None
+
+    def find(self, query: Dict[str, Any] = None) -> MemoryCursor:
+        return MemoryCursor([copy.deepcopy(document) for document in self._documents if matches(document, query)])
+
+    async def insert_one(self, document: Dict[str, Any]) -> InsertOneResult:
+        document = copy.deepcopy(document)
+        document.setdefault("_id", ObjectId())
+        self._documents.append(document)
+        return InsertOneResult(document["_id"])
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any]) -> UpdateResult:
+        for document in self._documents:
+            if matches(document, query):
+                for key, value in update.get("$set", {}).items():
+                    document[key] = copy.deepcopy(value)
+                for key, value in update.get("$inc", {}).items():
+                    document[key] = document.get(key, 0) + value
+                for key, value in update.get("$push", {}).items():
+                    document.setdefault(key, []).append(copy.deepcopy(value))
+                for key, value in update.get("$pull", {}).items():
+                    document[key] = [item for item in document.get(key, []) if item != value]
+                return UpdateResult(1, 1)
+        return UpdateResult(0, 0)
+
+    async def delete_one(self, query: Dict[str, Any]) -> DeleteResult:
+        for i, document in enumerate(self._documents):
+            if matches(document, query):
+                del self._documents[i]
+                return DeleteResult(1)
+        return DeleteResult(0)
+
+    async def count_documents(self, query: Dict[str, Any] = None) -> int:
+        return sum(1 for document in self._documents if matches(document, query))
+
+
+def install() -> types.ModuleType:
+    """Register an in-memory mongodb module so `from mongodb import ...` gets these collections
+
+    Must run before routers/chat.py is imported.
+    """
+    module = types.ModuleType("mongodb")
+    module.users_collection = MemoryCollection("users")
+    module.group_chats_collection = MemoryCollection("group_chats")
+    module.messages_collection = MemoryCollection("messages")
+
+    async def init_mongodb():
+        return None
+
+    module.init_mongodb = init_mongodb
+    sys.modules["mongodb"] = module
+    return module
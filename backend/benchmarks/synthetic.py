@@ -0,0 +1,151 @@
+"""
+Synthetic search corpora for benchmarking OptimizedSearchEngine.
+
+Word frequencies follow a Zipf law so posting lists, caches and typo
+correction see a realistic skew; vectors are random unit vectors.
+synthetic_corpus_files writes the same corpus as the files save_recipes.py and
+Word2Vec training produce, so the whole load path can be measured too.
+"""
+import os
+import sys
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from gensim.models import Word2Vec
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_loader import RecipeCorpusWriter
+from search_index import SearchIndex
+from spell_index import build_delete_table
+
+LETTERS = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+
+
+def synthetic_vocab(vocab_size: int, rng: np.random.Generator) -> List[str]:
+    """vocab_size distinct lowercase words of 3 to 10 letters"""
+    words = []
+    seen = set()
+    while len(words) < vocab_size:
+        for length in rng.integers(3, 11, size=vocab_size - len(words)):
+            word = "".join(rng.choice(LETTERS, size=length))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+    return words
+
+
+def zipf_probabilities(vocab_size: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, vocab_size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def synthetic_index(num_recipes: int = 100000, vocab_size: int = 20000, vector_size: int = 100,
+                    tokens_per_recipe: int = 60, seed: int = 0) -> SearchIndex:
+    """In-memory SearchIndex with the same layout build_index.py writes"""
+    rng = np.random.default_rng(seed)
+    vocab = synthetic_vocab(vocab_size, rng)
+    vectors = rng.standard_normal((vocab_size, vector_size)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    probabilities = zipf_probabilities(vocab_size)
+    word_counts = np.maximum(1, (probabilities * num_recipes * tokens_per_recipe).astype(np.int64))
+
+    # Draw tokens, then keep each (recipe, word) pair once, sorted by recipe then word
+    docs = np.repeat(np.arange(num_recipes, dtype=np.int64), tokens_per_recipe)
+    tokens = rng.choice(vocab_size, size=len(docs), p=probabilities)
+    pairs = np.unique(docs * vocab_size + tokens)
+    doc_token_ids = (pairs % vocab_size).astype(np.int32)
+    doc_offsets = np.zeros(num_recipes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs // vocab_size, minlength=num_recipes), out=doc_offsets[1:])
+
+    spell_hashes, spell_word_ids = build_delete_table(vocab)
+    metadata = {
+        "Title": [f"Synthetic recipe {i}" for i in range(num_recipes)],
+        "Image_Name": [f"synthetic-{i}" for i in range(num_recipes)],
+        "Instructions": ["Combine everything and cook until done."] * num_recipes,
+    }
+    return SearchIndex(
+        vocab=vocab,
+        word_vectors=vectors,
+        word_counts=word_counts,
+        doc_token_ids=doc_token_ids,
+        doc_offsets=doc_offsets,
+        metadata=metadata,
+        recipe_ids=np.arange(num_recipes, dtype=np.int64),
+        spell_hashes=spell_hashes,
+        spell_word_ids=spell_word_ids,
+    )
+
+
+def synthetic_queries(index: SearchIndex, num_queries: int = 100, max_words: int = 3,
+                      seed: int = 1) -> List[str]:
+    """Queries of 1..max_words words drawn by corpus frequency"""
+    rng = np.random.default_rng(seed)
+    probabilities = index.word_counts / index.word_counts.sum()
+    queries = []
+    for length in rng.integers(1, max_words + 1, size=num_queries):
+        words = rng.choice(len(index.vocab), size=length, p=probabilities)
+        queries.append(" ".join(index.vocab[w] for w in words))
+    return queries
+
+
+def synthetic_model(index: SearchIndex) -> Word2Vec:
+    """gensim Word2Vec model holding the index vocabulary, counts and vectors (no training)"""
+    model = Word2Vec(vector_size=index.word_vectors.shape[1], min_count=1, workers=1)
+    model.build_vocab_from_freq({word: int(count) for word, count in zip(index.vocab, index.word_counts)})
+    # build_vocab_from_freq orders words by count, so copy vectors by key
+    rows = [model.wv.key_to_index[word] for word in index.vocab]
+    model.wv.vectors[rows] = index.word_vectors
+    return model
+
+
+def synthetic_corpus_files(directory: str, num_recipes: int = 100000, vocab_size: int = 20000,
+                           vector_size: int = 100, tokens_per_recipe: int = 60, seed: int = 0,
+                           chunk_size: int = 20000) -> Dict[str, str]:
+    """Write word2vec_model, cleaned_recipe_data.csv and .npz for a synthetic corpus into directory"""
+    os.makedirs(directory, exist_ok=True)
+    index = synthetic_index(num_recipes, vocab_size, vector_size, tokens_per_recipe, seed)
+    paths = {
+        "model": os.path.join(directory, "word2vec_model"),
+        "csv": os.path.join(directory, "cleaned_recipe_data.csv"),
+        "npz": os.path.join(directory, "cleaned_recipe_data.npz"),
+    }
+    synthetic_model(index).save(paths["model"])
+
+    vocab = np.array(index.vocab, dtype=object)
+    writer = RecipeCorpusWriter(paths["csv"], paths["npz"])
+    try:
+        for start in range(0, num_recipes, chunk_size):
+            stop = min(start + chunk_size, num_recipes)
+            writer.write(pd.DataFrame({
+                "Title": index.metadata["Title"][start:stop],
+                "Instructions": index.metadata["Instructions"][start:stop],
+                "Image_Name": index.metadata["Image_Name"][start:stop],
+                "index": np.arange(start, stop),
+                "combined_cleaned": [" ".join(vocab[index.doc_token_ids[index.doc_offsets[i]:index.doc_offsets[i + 1]]])
+                                     for i in range(start, stop)],
+            }))
+    finally:
+        writer.close()
+    return paths
+
+
+def misspell(query: str, rng: np.random.Generator) -> str:
+    """One random edit (substitution, deletion, insertion or transposition) per word of 4+ letters"""
+    words = []
+    for word in query.split():
+        if len(word) >= 4:
+            position = int(rng.integers(1, len(word) - 1))
+            letter = str(rng.choice(LETTERS))
+            edit = int(rng.integers(4))
+            if edit == 0:
+                word = word[:position] + letter + word[position + 1:]
+            elif edit == 1:
+                word = word[:position] + word[position + 1:]
+            elif edit == 2:
+                word = word[:position] + letter + word[position:]
+            else:
+                word = word[:position - 1] + word[position] + word[position - 1] + word[position + 1:]
+        words.append(word)
+    return " ".join(words)
@@ -0,0 +1,50 @@
+"""
+Build the on-disk search index served by main.py.
+
+Run after save_recipes.py (and whenever word2vec_model is retrained):
+
+    python build_index.py --model word2vec_model --recipes cleaned_recipe_data.csv --output search_index
+
+--vector-dtype int8 (or float16) stores the word vectors quantized; with
+--recall-queries it also reports how closely exact rankings follow float32.
+"""
+import argparse
+import time
+
+from quantized_vectors import VECTOR_DTYPES
+from search_engine import OptimizedSearchEngine
+
+
+def build_index(model_path: str, recipes_path: str, output_path: str, recall_queries=None,
+                vector_dtype: str = "float32"):
+    start_time = time.time()
+    engine = OptimizedSearchEngine(model_path=model_path, recipes_path=recipes_path)
+    if engine.word_index is None or engine.recipes is None:
+        raise FileNotFoundError(f"Need both {model_path} and {recipes_path} to build the index")
+    if vector_dtype != "float32":
+        if recall_queries:
+            agreement = engine.vector_agreement(recall_queries, vector_dtype, top_k=10)
+            print(f"{vector_dtype} vs float32 rankings over {agreement['queries']} queries: "
+                  f"overlap@10={agreement['overlap_at_k']:.3f}, top1={agreement['top1']:.3f}, "
+                  f"identical={agreement['exact']:.3f}")
+        engine.quantize_vectors(vector_dtype)
+    engine.save_index(output_path)
+    print(f"Indexed {len(engine.recipes)} recipes and {len(engine.word_index)} words "
+          f"into {output_path} in {time.time() - start_time:.2f} seconds")
+    if recall_queries:
+        report = engine.ann_recall_at_k(recall_queries, top_k=10)
+        print("ANN recall@10 vs exact: " + ", ".join(f"{mode}={recall:.3f}" for mode, recall in report.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the FlavorConnect search index")
+    parser.add_argument("--model", default="word2vec_model", help="Path to the gensim Word2Vec model")
+    parser.add_argument("--recipes", default="cleaned_recipe_data.csv", help="Path to the cleaned recipe CSV")
+    parser.add_argument("--output", default="search_index", help="Directory to write the index to")
+    parser.add_argument("--vector-dtype", default="float32", choices=VECTOR_DTYPES,
+                        help="Storage type of the word vectors in the index")
+    parser.add_argument("--recall-queries", default="",
+                        help="Comma-separated queries to report ANN recall@10 against exact scoring on")
+    args = parser.parse_args()
+    queries = [query.strip() for query in args.recall_queries.split(",") if query.strip()]
+    build_index(args.model, args.recipes, args.output, queries, args.vector_dtype)
@@ -0,0 +1,130 @@
+"""
+Stand-ins for the app modules this repository does not ship, for tests only.
+
+models.py, schemas.py, auth.py and database.py come with the MySQL deployment
+rather than this repository. When one cannot be imported, a minimal version
+is registered under its name, declaring just what recipe_queries.py and the
+recipe and favorites routers use, so those are tested on SQLite instead of
+being skipped. The real modules win whenever they are importable.
+"""
+import importlib
+import sys
+import types
+from typing import List, Optional
+
+
+def _standin_models():
+    from sqlalchemy import Column, ForeignKey, Integer, String, Table, Text
+    from sqlalchemy.orm import declarative_base, relationship
+
+    Base = declarative_base()
+    recipe_tags = Table(
+        "recipe_tags", Base.metadata,
+        Column("recipe_id", ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True),
+        Column("tag_id", ForeignKey("tags.id"), primary_key=True),
+    )
+
+    class User(Base):
+        __tablename__ = "users"
+        id = Column(Integer, primary_key=True)
+        email = Column(String(100), unique=True)
+        username = Column(String(50), unique=True)
+        hashed_password = Column(String(200))
+
+    # No favorite_count: model_columns.py maps it when models.py lacks it
+    class Recipe(Base):
+        __tablename__ = "recipes"
+        id = Column(Integer, primary_key=True)
+        title = Column(String(200))
+        description = Column(Text)
+        ingredients = Column(Text)
+        instructions = Column(Text)
+        image_url = Column(String(500))
+        user_id = Column(Integer, ForeignKey("users.id"))
+        tags = relationship("Tag", secondary=recipe_tags, back_populates="recipes")
+
+    class Tag(Base):
+        __tablename__ = "tags"
+        id = Column(Integer, primary_key=True)
+        # NOCASE compares names case-insensitively, like MySQL's default collation
+        name = Column(String(50, collation="NOCASE"), unique=True, nullable=False)
+        recipes = relationship("Recipe", secondary=recipe_tags, back_populates="tags")
+
+    class Favorite(Base):
+        __tablename__ = "favorites"
+        id = Column(Integer, primary_key=True)
+        user_id = Column(Integer, ForeignKey("users.id"))
+        recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"))
+
+    return dict(Base=Base, recipe_tags=recipe_tags, User=User, Recipe=Recipe, Tag=Tag, Favorite=Favorite)
+
+
+def _standin_schemas():
+    from pydantic import BaseModel, ConfigDict
+
+    class Tag(BaseModel):
+        model_config = ConfigDict(from_attributes=True)
+        id: int
+        name: str
+
+    class RecipeCreate(BaseModel):
+        title: str
+        description: Optional[str] = None
+        ingredients: Optional[str] = None
+        instructions: Optional[str] = None
+        image_url: Optional[str] = None
+        tags: List[str] = []
+
+    class Recipe(BaseModel):
+        model_config = ConfigDict(from_attributes=True)
+        id: int
+        title: str
+        description: Optional[str] = None
+        ingredients: Optional[str] = None
+        instructions: Optional[str] = None
+        image_url: Optional[str] = None
+        user_id: int
+        tags: List[Tag] = []
+
+    class RecipeDetail(Recipe):
+        favorite_count: int = 0
+
+    class FavoriteCreate(BaseModel):
+        recipe_id: int
+
+    class Favorite(BaseModel):
+        model_config = ConfigDict(from_attributes=True)
+        id: int
+        user_id: int
+        recipe_id: int
+
+    return dict(Tag=Tag, RecipeCreate=RecipeCreate, Recipe=Recipe, RecipeDetail=RecipeDetail,
+                FavoriteCreate=FavoriteCreate, Favorite=Favorite)
+
+
+def _standin_auth():
+    from fastapi import HTTPException
+
+    def get_current_active_user():
+        # Tests override this dependency with their own user
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    return dict(get_current_active_user=get_current_active_user)
+
+
+def _standin_database():
+    def get_db():
+        # Tests override this dependency with a session on their own engine
+        raise RuntimeError("No database configured for tests")
+
+    return dict(get_db=get_db)
+
+
+for _name, _build in [("models", _standin_models), ("schemas", _standin_schemas),
+                      ("auth", _standin_auth), ("database", _standin_database)]:
+    try:
+        importlib.import_module(_name)
+    except ImportError:
+        _module = types.ModuleType(_name, f"Test stand-in for {_name}.py (see conftest.py)")
+        _module.__dict__.update(_build())
+        sys.modules[_name] = _module
@@ -0,0 +1,166 @@
+"""
+Ingredient-based recipe suggestions from the search engine's own corpus.
+
+An ingredient is one or more vocabulary words ("chicken breast"); words
+outside the vocabulary go through the engine's spelling correction and are
+otherwise ignored. A recipe contains an ingredient when it contains all of its
+words. Each word's posting list (the engine's inverted index) is expanded once
+into a packed bitset over the recipes, so "recipes containing this ingredient"
+is a bitwise AND, and candidates are the recipes holding the most
+ingredients.
+
+Candidates are then scored on their tokens. An ingredient the recipe contains
+counts 1; one it lacks counts its embedding similarity to the closest recipe
+word when that is at least near_threshold (so "shallot" can stand in for
+"onion"), and 0 otherwise. coverage is the mean over the requested ingredients,
+and the ingredients counting 0 are reported as missing.
+
+The corpus tokens come from recipe titles and instructions (save_recipes.py
+drops the raw ingredient column), which name nearly every ingredient used.
+"""
+import re
+from typing import Any, Dict, List
+
+import numpy as np
+
+from recipe_cards import SearchResults
+from search_cache import WordScoreCache
+
+_WORD = re.compile(r"[^\W\d_]+")
+
+
+class IngredientIndex:
+    """Ingredient lookups over an OptimizedSearchEngine's recipes
+
+    Packed bitsets are cached per word (bounded by bitset_cache_bytes) and
+    rebuilt after the engine merges its delta segment or loads a new corpus.
+    """
+
+    def __init__(self, engine, near_threshold: float = 0.6, near_neighbours: int = 5,
+                 max_candidates: int = 2000, bitset_cache_bytes: int = 32 * 1024 * 1024):
+        self.engine = engine
+        self.near_threshold = near_threshold
+        self.near_neighbours = near_neighbours
+        self.max_candidates = max_candidates
+        self.bitsets = WordScoreCache(bitset_cache_bytes)
+        self._postings = None
+
+    def ingredient_word_ids(self, ingredient: str) -> np.ndarray:
+        """Distinct vocabulary ids of an ingredient's words, after spelling correction"""
+        word_index = self.engine.word_index
+        ids = []
+        for word in _WORD.findall(ingredient.lower()):
+            word = self.engine.correct_word(word)
+            if word in word_index:
+                ids.append(word_index[word])
+        return np.unique(np.array(ids, dtype=np.int64))
+
+    def _bitset(self, word_id: int, num_docs: int) -> np.ndarray:
+        bits = self.bitsets.get(word_id)
+        if bits is None:
+            engine = self.engine
+            mask = np.zeros(num_docs, dtype=bool)
+            mask[engine.term_doc_ids[engine.term_offsets[word_id]:engine.term_offsets[word_id + 1]]] = True
+            bits = np.packbits(mask)
+            self.bitsets.put(word_id, bits)
+        return bits
+
+    def _ingredient_bitset(self, word_ids: np.ndarray, num_docs: int) -> np.ndarray:
+        """Recipes containing every word of an ingredient"""
+        bits = self._bitset(int(word_ids[0]), num_docs).copy()
+        for word_id in word_ids[1:]:
+            np.bitwise_and(bits, self._bitset(int(word_id), num_docs), out=bits)
+        return bits
+
+    def _candidates(self, ingredient_ids: List[np.ndarray], word_sims: np.ndarray, word_rows: List[np.ndarray],
+                    num_docs: int, deleted) -> np.ndarray:
+        """Main-index recipes holding the most ingredients (or close neighbours of their words)"""
+        counts = np.zeros(num_docs, dtype=np.int32)
+        for ids, rows in zip(ingredient_ids, word_rows):
+            bits = self._ingredient_bitset(ids, num_docs)
+            if self.near_neighbours > 0:
+                # Recipes lacking the ingredient but holding a close stand-in for one of its words
+                sims = word_sims[rows]
+                n = min(self.near_neighbours + 1, sims.shape[1])
+                neighbours = np.argpartition(-sims, n - 1, axis=1)[:, :n]
+                for row, words in zip(sims, neighbours):
+                    for word_id in words[row[words] >= self.near_threshold]:
+                        np.bitwise_or(bits, self._bitset(int(word_id), num_docs), out=bits)
+            counts += np.unpackbits(bits, count=num_docs)
+        if deleted is not None:
+            counts[deleted] = 0
+        hits = np.flatnonzero(counts)
+        if len(hits) > self.max_candidates:
+            hits = np.sort(hits[np.argpartition(-counts[hits], self.max_candidates - 1)[:self.max_candidates]])
+        return hits
+
+    def _check_postings(self):
+        # A merge or reload replaces the postings arrays, invalidating every bitset
+        if self._postings is not self.engine.term_doc_ids:
+            self.bitsets.clear()
+            self._postings = self.engine.term_doc_ids
+
+    def suggest(self, ingredients: List[str], top_k: int = 5, min_coverage: float = 0.0) -> List[Dict[str, Any]]:
+        """Recipe cards ranked by ingredient coverage, best first
+
+        Each card has relevance_score (the coverage), matched_ingredients,
+        near_ingredients and missing_ingredients. Ties go to the recipe with
+        more exact matches, then the shorter recipe.
+        """
+        engine = self.engine
+        names = list(dict.fromkeys(name.strip() for name in ingredients if name.strip()))
+        if not names:
+            return []
+        with engine._segments.read():
+            self._check_postings()
+            delta = engine.delta.snapshot()
+            num_docs = len(engine.doc_offsets) - 1
+            parsed = [(name, self.ingredient_word_ids(name)) for name in names]
+            known = [(name, ids) for name, ids in parsed if len(ids)]
+            if not known:
+                return []
+            words = np.unique(np.concatenate([ids for _, ids in known]))
+            word_sims = engine._query_similarities(words)
+            word_rows = [np.searchsorted(words, ids) for _, ids in known]
+
+            doc_ids = self._candidates([ids for _, ids in known], word_sims, word_rows, num_docs, delta.deleted)
+            token_ids, offsets = engine._gather_docs(doc_ids)
+            live = np.flatnonzero(delta.live)
+            if len(live):
+                # Runtime-added recipes are few; consider all of them
+                delta_tokens = [delta.token_ids[delta.offsets[i]:delta.offsets[i + 1]] for i in live]
+                token_ids = np.concatenate([token_ids, *delta_tokens])
+                offsets = np.concatenate([offsets, offsets[-1] + np.cumsum([len(t) for t in delta_tokens])])
+                doc_ids = np.concatenate([doc_ids, delta.doc_ids[live]])
+            if len(doc_ids) == 0:
+                return []
+
+            # Per word and recipe: closest recipe word, and whether the word itself occurs
+            max_sims = engine._max_similarities(word_sims, token_ids, offsets)
+            present = np.zeros_like(max_sims, dtype=bool)
+            nonempty = np.diff(offsets) > 0
+            if len(token_ids):
+                present[:, nonempty] = np.maximum.reduceat(token_ids[None, :] == words[:, None],
+                                                           offsets[:-1][nonempty], axis=1)
+            lengths = np.diff(offsets)
+
+        contains = np.stack([present[rows].all(axis=0) for rows in word_rows])
+        similarity = np.stack([max_sims[rows].mean(axis=0) for rows in word_rows])
+        near = ~contains & (similarity >= self.near_threshold)
+        credit = np.where(contains, 1.0, np.where(near, similarity, 0.0))
+        coverage = credit.sum(axis=0) / len(names)
+        order = np.lexsort((lengths, -contains.sum(axis=0), -coverage))
+        order = order[coverage[order] >= max(min_coverage, 1e-9)][:top_k]
+
+        cards = engine.cards.cards(SearchResults(doc_ids[order], coverage[order]))
+        unknown = [name for name, ids in parsed if not len(ids)]
+        for card, column in zip(cards, order):
+            card["matched_ingredients"] = [name for (name, _), hit in zip(known, contains[:, column]) if hit]
+            card["near_ingredients"] = [name for (name, _), hit in zip(known, near[:, column]) if hit]
+            card["missing_ingredients"] = [name for (name, _), hit, close in
+                                           zip(known, contains[:, column], near[:, column])
+                                           if not hit and not close] + unknown
+        return cards
+
+    def stats(self) -> Dict[str, Any]:
+        return {"bitsets": self.bitsets.stats()}
@@ -1,18 +1,31 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Header
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional, Dict, Any
 import uvicorn
 import requests
 import os
-from pydantic import BaseModel
-from search_engine import OptimizedSearchEngine
+from pydantic import BaseModel, Field
+from search_engine import OptimizedSearchEngine, SEARCH_MODES
+from search_executor import SearchExecutor, SearchOverloadedError, SearchTimeoutError
+from search_reload import SearchReloader, engine_sources
+import search_service
+import spoonacular_client
+from search_metrics import REGISTRY, HTTP_REQUESTS_TOTAL, HTTP_REQUEST_SECONDS
 # from routers.chatbot import router as chatbot_router
 import json
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response
+from fastapi import Request
+import logging
+import time
 # import config  # Import the new config module
 
 
-app = FastAPI(title="FlavorConnect API", description="Backend API for FlavorConnect")
+# LOG_LEVEL=DEBUG logs every search query and its top recipe ids
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+app = FastAPI(title="FlavorConnect API", description="Backend API for FlavorConnect",
+              default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -25,14 +38,76 @@ app.add_middleware(
 
 # # Initialize search engine
 # SPOONACULAR_API_KEY = os.getenv("SPOONACULAR_API_KEY", "1b3d4b9a211a493c8f57108ba5556b81")
-SEARCH_ENGINE = OptimizedSearchEngine(
-    model_path="word2vec_model",
-    recipes_path="cleaned_recipe_data.csv"
+# Workers memory-map the prebuilt index (python build_index.py) when it exists
+# and only fall back to parsing the model and CSV otherwise
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search_index")
+SEARCH_MODEL_PATH = os.getenv("SEARCH_MODEL_PATH", "word2vec_model")
+SEARCH_RECIPES_PATH = os.getenv("SEARCH_RECIPES_PATH", "cleaned_recipe_data.csv")
+
+
+def search_sources(model_path: str = None, recipes_path: str = None, index_path: str = None) -> Dict[str, Optional[str]]:
+    return engine_sources(model_path, recipes_path, index_path, default_model=SEARCH_MODEL_PATH,
+                          default_recipes=SEARCH_RECIPES_PATH, default_index=SEARCH_INDEX_PATH)
+
+
+def build_search_engine(model_path: str = None, recipes_path: str = None,
+                        index_path: str = None) -> OptimizedSearchEngine:
+    return OptimizedSearchEngine(
+        **search_sources(model_path, recipes_path, index_path),
+        num_shards=int(os.getenv("SEARCH_SHARDS", "1")),
+        merge_interval=float(os.getenv("SEARCH_MERGE_INTERVAL_SECONDS", "30")),
+        max_delta=int(os.getenv("SEARCH_MAX_DELTA", "1000")),
+        # float16 or int8 converts the vectors at load time; an index built with
+        # --vector-dtype serves its stored type when this is unset
+        vector_dtype=os.getenv("SEARCH_VECTOR_DTYPE") or None,
+        # Searches use the engine's own vector matrix; keeping gensim's float32 copy would undo quantizing
+        keep_model=False
+    )
+
+SEARCH_ENGINE = build_search_engine()
+# Recipe routers feed creates, edits and deletes into the engine's delta segment
+search_service.set_engine(SEARCH_ENGINE)
+
+# Searches run on a bounded pool so CPU-bound scoring never blocks the event loop
+SEARCH_EXECUTOR = SearchExecutor(
+    SEARCH_ENGINE,
+    kind=os.getenv("SEARCH_EXECUTOR", "thread"),
+    max_workers=int(os.getenv("SEARCH_WORKERS", "4")),
+    max_queue=int(os.getenv("SEARCH_QUEUE_DEPTH", "32")),
+    timeout=float(os.getenv("SEARCH_TIMEOUT_SECONDS", "10")),
+    index_path=SEARCH_INDEX_PATH if os.path.exists(SEARCH_INDEX_PATH) else None
 )
 
+# New models and indexes are loaded next to the serving engine and swapped in live
+SEARCH_RELOADER = SearchReloader(
+    SEARCH_EXECUTOR,
+    build_search_engine,
+    drain_timeout=float(os.getenv("SEARCH_DRAIN_TIMEOUT_SECONDS", "30")),
+    warmup_queries=[query for query in os.getenv("SEARCH_WARMUP_QUERIES", "chicken,chocolate cake").split(",") if query],
+    replace_engine=search_service.replace_engine
+)
+SEARCH_ADMIN_TOKEN = os.getenv("SEARCH_ADMIN_TOKEN")
+
+
+class ReloadRequest(BaseModel):
+    model_config = {"protected_namespaces": ()}
+
+    model_path: Optional[str] = None
+    recipes_path: Optional[str] = None
+    index_path: Optional[str] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    number: int = Field(50, ge=1, le=1000)
+    offset: int = Field(0, ge=0, le=10000)
+
+MAX_BATCH_QUERIES = int(os.getenv("SEARCH_MAX_BATCH_QUERIES", "1000"))
+
 
 @app.get("/search")
-async def search_recipes(query: str, number: int = 50):
+async def search_recipes(query: str, number: int = Query(50, ge=1, le=1000), mode: str = "exact",
+                         offset: int = Query(0, ge=0, le=10000)):
     # try:
     #     # Get Spoonacular results
     #     spoonacular_url = f"https://api.spoonacular.com/recipes/complexSearch"
@@ -49,7 +124,16 @@ async def search_recipes(query: str, number: int = 50):
     #     spoonacular_results = spoonacular_response.json().get('results', [])
         
         # Get Word2Vec results
-        word2vec_results = SEARCH_ENGINE.search(query, top_k=number)
+        if mode not in SEARCH_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+        try:
+            # Ids plus pre-encoded recipe cards, serialized on the search worker
+            body = await SEARCH_EXECUTOR.submit("search_json", query, number, mode, offset)
+        except SearchOverloadedError:
+            raise HTTPException(status_code=503, detail="Search is overloaded, retry shortly",
+                                headers={"Retry-After": "1"})
+        except SearchTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
         
         # Format and combine results
         # formatted_spoonacular = [format_spoonacular_recipe(recipe) for recipe in spoonacular_results]
@@ -78,12 +162,25 @@ async def search_recipes(query: str, number: int = 50):
         
         # return {"result": combined_results}
         # JSONResponse(content={"result": recipes})
-        return JSONResponse(content={"result": word2vec_results})
+        return Response(content=body, media_type="application/json")
         # except requests.exceptions.RequestException as e:
         #     raise HTTPException(status_code=500, detail=f"Spoonacular API error: {str(e)}")
         # except Exception as e:
         #     raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
+@app.post("/search/batch")
+async def search_recipes_batch(request: BatchSearchRequest):
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    try:
+        results = await SEARCH_EXECUTOR.submit("search_many", request.queries, request.number, request.offset)
+    except SearchOverloadedError:
+        raise HTTPException(status_code=503, detail="Search is overloaded, retry shortly",
+                            headers={"Retry-After": "1"})
+    except SearchTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    return ORJSONResponse(content={"results": results})
+
 # def format_spoonacular_recipe(recipe: Dict[str, Any]) -> Dict[str, Any]:
 #     """Format Spoonacular recipe data to match our schema"""
 #     return {
@@ -103,6 +200,38 @@ async def search_recipes(query: str, number: int = 50):
 # app.include_router(spoonacular.router)
 # app.include_router(chatbot_router)
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than raw path to keep label cardinality bounded
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start_time, route=route_path)
+    HTTP_REQUESTS_TOTAL.inc(method=request.method, route=route_path, status=response.status_code)
+    return response
+
+def collect_search_stats():
+    """Cache and executor stats of the serving engine, read at scrape time"""
+    engine = SEARCH_EXECUTOR.engine
+    query_cache = engine.query_cache.stats()
+    word_cache = engine.word_cache.stats()
+    executor = SEARCH_EXECUTOR.stats()
+    return [
+        ("search_query_cache_hits_total", "counter", "Query cache hits", [({}, query_cache["hits"])]),
+        ("search_query_cache_misses_total", "counter", "Query cache misses", [({}, query_cache["misses"])]),
+        ("search_query_cache_entries", "gauge", "Cached search results", [({}, query_cache["size"])]),
+        ("search_word_cache_hits_total", "counter", "Per-word score cache hits", [({}, word_cache["hits"])]),
+        ("search_word_cache_misses_total", "counter", "Per-word score cache misses", [({}, word_cache["misses"])]),
+        ("search_word_cache_bytes", "gauge", "Bytes held by the per-word score cache", [({}, word_cache["bytes"])]),
+        ("search_in_flight", "gauge", "Searches running or queued", [({}, executor["in_flight"])]),
+        ("search_rejected_total", "counter", "Searches rejected with 503", [({}, executor["rejected"])]),
+        ("search_timeouts_total", "counter", "Searches that timed out with 504", [({}, executor["timeouts"])]),
+        ("search_delta_recipes", "gauge", "Recipes waiting in the delta segment", [({}, len(engine.delta))]),
+    ]
+
+REGISTRY.add_collector(collect_search_stats)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to FlavorConnect API"}
@@ -111,6 +240,60 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not SEARCH_ADMIN_TOKEN or x_admin_token != SEARCH_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.post("/api/admin/search/reload", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+async def reload_search(request: ReloadRequest = ReloadRequest()):
+    """Load a new model/index in the background and swap it in without dropping searches"""
+    args = {key: value for key, value in request.dict().items() if value is not None}
+    try:
+        search_sources(**args)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not SEARCH_RELOADER.reload_in_background(**args):
+        raise HTTPException(status_code=409, detail="A search reload is already running")
+    return {"status": "reloading"}
+
+@app.get("/api/admin/search/reload", dependencies=[Depends(require_admin)])
+async def reload_status():
+    return SEARCH_RELOADER.status()
+
+@app.get("/api/diagnostics/search")
+async def search_diagnostics():
+    engine = SEARCH_EXECUTOR.engine
+    return {
+        "query_cache": engine.query_cache.stats(),
+        "word_cache": engine.word_cache.stats(),
+        "executor": SEARCH_EXECUTOR.stats(),
+        "delta": {
+            "recipes": len(engine.delta),
+            "pending": engine.delta.pending,
+            "merges": engine.merger.merges if engine.merger else 0,
+        },
+    }
+
+@app.on_event("startup")
+async def start_search_merger():
+    SEARCH_ENGINE.start_merger()
+    watch_seconds = float(os.getenv("SEARCH_WATCH_SECONDS", "0"))
+    if watch_seconds > 0:
+        SEARCH_RELOADER.watch({"model_path": SEARCH_MODEL_PATH, "recipes_path": SEARCH_RECIPES_PATH,
+                               "index_path": SEARCH_INDEX_PATH}, watch_seconds)
+
+@app.on_event("shutdown")
+async def shutdown_search_executor():
+    SEARCH_RELOADER.stop()
+    SEARCH_EXECUTOR.engine.stop_merger()
+    SEARCH_EXECUTOR.shutdown()
+    await spoonacular_client.close_client()
+
 # # Initialize MongoDB on startup
 # @app.on_event("startup")
 # async def startup_db_client():
@@ -0,0 +1,24 @@
+"""
+Columns the API relies on that models.py may not declare yet.
+
+models.py ships with the MySQL deployment rather than this repository. Until
+it declares these columns, importing this module maps them onto its classes.
+migrate_db.py adds them to existing databases with add_column_ddl(), which
+compiles the ALTER TABLE from the mapped Column itself, so the ORM and the
+DDL cannot drift apart. recipe_queries.py and migrate_db.py import it
+explicitly; anything else reading these columns should too.
+"""
+from sqlalchemy import Column, Integer
+from sqlalchemy.schema import CreateColumn
+
+import models
+
+if not hasattr(models.Recipe, "favorite_count"):
+    # Denormalized number of favorites rows, kept by recipe_queries.add_favorite/remove_favorite
+    models.Recipe.favorite_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+def add_column_ddl(model, name: str, dialect) -> str:
+    """ALTER TABLE statement adding model's mapped column name, as the ORM declares it"""
+    column = model.__table__.c[name]
+    return f"ALTER TABLE {model.__tablename__} ADD COLUMN {CreateColumn(column).compile(dialect=dialect)}"
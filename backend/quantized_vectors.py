@@ -0,0 +1,81 @@
+"""
+Reduced-precision storage for the unit word vectors used in scoring.
+
+float16 halves the matrix; int8 quarters it, storing each row as
+round(v / scale) with a float32 scale of max|v| / 127 per row. Similarities
+are computed block by block: a cache-sized block of rows is dequantized to
+float32 and multiplied with the query vectors, so the full float32 matrix is
+never materialized. For int8 the per-row scale is applied to the products,
+since q . (s * d) == s * (q . d).
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+# Rows dequantized per block; 4096 x 100 float32 is 1.6 MB, about an L2 cache
+DEQUANTIZE_BLOCK_ROWS = 4096
+
+
+def vector_dtype(data: np.ndarray) -> str:
+    return np.dtype(data.dtype).name
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(data, per-row scales or None) storing vectors in dtype"""
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector dtype {dtype!r}, expected one of {VECTOR_DTYPES}")
+    if dtype == "float32":
+        return np.asarray(vectors, dtype=np.float32), None
+    if dtype == "float16":
+        return np.asarray(vectors, dtype=np.float16), None
+    scales = np.abs(vectors).max(axis=1).astype(np.float32) / 127
+    scales[scales == 0] = 1.0
+    data = np.rint(vectors / scales[:, None]).clip(-127, 127).astype(np.int8)
+    return data, scales
+
+
+def dequantize(data: np.ndarray, scales: Optional[np.ndarray], ids=None) -> np.ndarray:
+    """float32 rows (all, or the rows at ids)"""
+    rows = data if ids is None else data[ids]
+    if rows.dtype == np.float32:
+        return np.asarray(rows)
+    rows = rows.astype(np.float32)
+    if scales is not None:
+        rows *= (scales if ids is None else scales[ids])[..., None]
+    return rows
+
+
+def similarities(data: np.ndarray, scales: Optional[np.ndarray], queries: np.ndarray,
+                 block_rows: int = DEQUANTIZE_BLOCK_ROWS) -> np.ndarray:
+    """queries @ dequantize(data).T as float32, shape (m, V)"""
+    queries = np.asarray(queries, dtype=np.float32)
+    if data.dtype == np.float32:
+        return queries @ data.T
+    out = np.empty((len(queries), len(data)), dtype=np.float32)
+    for start in range(0, len(data), block_rows):
+        stop = min(start + block_rows, len(data))
+        np.matmul(queries, data[start:stop].astype(np.float32).T, out=out[:, start:stop])
+        if scales is not None:
+            out[:, start:stop] *= scales[start:stop]
+    return out
+
+
+def ranking_agreement(reference: List[List[int]], results: List[List[int]]) -> Dict[str, float]:
+    """How closely ranked results follow the float32 reference rankings of the same queries
+
+    overlap_at_k is the mean share of reference results also returned, top1 the
+    share of queries with the same best result, and exact the share with an
+    identical ranking.
+    """
+    overlaps, top1, exact = [], [], []
+    for expected, found in zip(reference, results):
+        if not expected:
+            continue
+        overlaps.append(len(set(expected) & set(found)) / len(expected))
+        top1.append(bool(found) and found[0] == expected[0])
+        exact.append(list(found) == list(expected))
+    if not overlaps:
+        return {"queries": 0, "overlap_at_k": 1.0, "top1": 1.0, "exact": 1.0}
+    return {"queries": len(overlaps), "overlap_at_k": float(np.mean(overlaps)),
+            "top1": float(np.mean(top1)), "exact": float(np.mean(exact))}
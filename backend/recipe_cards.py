@@ -0,0 +1,119 @@
+"""
+Recipe cards returned with search results.
+
+Every recipe's display fields (id, dataset index, title, image name and an
+instructions snippet) are encoded once as an open JSON object fragment,
+b'{"id":3,"index":17,"Title":"...","Image_Name":"...","Snippet":"..."',
+and kept in one byte blob with offsets. "index" is always a row of the recipe
+dataset; recipes from the database (see search_service.py) carry their
+primary key as "recipe_id" instead. A response is then assembled by
+joining fragments and appending each relevance score, without building Python
+dicts or touching pandas per hit.
+"""
+import threading
+from typing import Any, Dict, List
+
+import numpy as np
+import orjson
+
+from search_index import CARD_COLUMN, StringColumn
+
+SNIPPET_LENGTH = 160
+
+
+def make_snippet(text: str, length: int = SNIPPET_LENGTH) -> str:
+    """First length characters of text, cut at a word boundary"""
+    text = " ".join(str(text).split())
+    if len(text) <= length:
+        return text
+    return text[:length].rsplit(" ", 1)[0] + "..."
+
+
+def encode_card(doc_id: int, recipe_id: int, title: str, image_name: str, instructions: str,
+                db_id: int = None) -> bytes:
+    """Open JSON object fragment for one recipe (the closing brace is added per response)
+
+    recipe_id is the dataset index; database recipes pass their primary key as db_id instead.
+    """
+    card = {"id": int(doc_id)}
+    if db_id is None:
+        card["index"] = int(recipe_id)
+    else:
+        card["recipe_id"] = int(db_id)
+    card.update({"Title": str(title), "Image_Name": str(image_name), "Snippet": make_snippet(instructions)})
+    return orjson.dumps(card)[:-1]
+
+
+class SearchResults:
+    """Ranked recipe ids and their relevance scores, best first"""
+
+    __slots__ = ("doc_ids", "scores")
+
+    def __init__(self, doc_ids: np.ndarray, scores: np.ndarray):
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+
+class RecipeCardStore:
+    """Pre-encoded card fragments for the main index, plus recipes added at runtime"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        self._added: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_columns(cls, titles: List[str], image_names: List[str], instructions: List[str],
+                     recipe_ids: np.ndarray) -> "RecipeCardStore":
+        fragments = [encode_card(i, recipe_ids[i], titles[i], image_names[i], instructions[i])
+                     for i in range(len(recipe_ids))]
+        offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+        np.cumsum([len(fragment) for fragment in fragments], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(fragments), dtype=np.uint8), offsets)
+
+    @classmethod
+    def from_metadata(cls, metadata: Dict[str, Any], recipe_ids: np.ndarray) -> "RecipeCardStore":
+        """Use the fragments stored in a search index, or encode them from its display columns"""
+        cards = metadata.get(CARD_COLUMN)
+        if isinstance(cards, StringColumn):
+            return cls(cards.data, cards.offsets)
+        num_docs = len(recipe_ids)
+        columns = [metadata.get(column) or [""] * num_docs for column in ("Title", "Image_Name", "Instructions")]
+        return cls.from_columns(*columns, recipe_ids)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def add(self, doc_id: int, metadata: Dict[str, Any]):
+        """Card for a recipe added after the index was built"""
+        fragment = encode_card(doc_id, metadata.get("index", -1),
+                               metadata.get("Title", ""), metadata.get("Image_Name", ""),
+                               metadata.get("Instructions", ""), metadata.get("recipe_id"))
+        with self._lock:
+            self._added[doc_id] = fragment
+
+    def fragment(self, doc_id: int) -> bytes:
+        if doc_id < len(self):
+            return bytes(self.data[self.offsets[doc_id]:self.offsets[doc_id + 1]])
+        fragment = self._added.get(doc_id)
+        if fragment is None:
+            return b'{"id":%d' % doc_id
+        return fragment
+
+    def column(self, num_docs: int) -> List[str]:
+        """Fragments of recipes 0..num_docs, stored as the CARD_COLUMN of a search index"""
+        return [self.fragment(i).decode("utf-8") for i in range(num_docs)]
+
+    def encode(self, results: SearchResults) -> bytes:
+        """JSON array of result cards with their relevance scores"""
+        parts = [self.fragment(int(doc_id)) + b',"relevance_score":' + orjson.dumps(float(score)) + b"}"
+                 for doc_id, score in zip(results.doc_ids, results.scores)]
+        return b"[" + b",".join(parts) + b"]"
+
+    def cards(self, results: SearchResults) -> List[Dict[str, Any]]:
+        """Result cards as dicts, for Python callers"""
+        return orjson.loads(self.encode(results))
@@ -0,0 +1,201 @@
+"""
+Recipe loading for OptimizedSearchEngine.
+
+The cleaned token column written by save_recipes.py is a Python list literal
+per row ("['chocolate', 'cake']"). Instead of eval-ing every cell, the whole
+column is stripped of list punctuation and split in one pass, and tokens are
+interned into an int32 code array with per-recipe offsets. Only the display
+columns search needs are kept in the DataFrame.
+
+Recipes can also be read from a columnar .npz file, written in one go by
+save_recipes_npz or streamed chunk by chunk by RecipeCorpusWriter.
+"""
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from search_index import StringColumn, encode_strings
+
+TOKEN_COLUMN = "combined_cleaned"
+RECIPE_COLUMNS = ["Title", "Image_Name", "Instructions", "index"]
+_LIST_PUNCTUATION = str.maketrans({char: " " for char in "[]'\","})
+
+
+class RecipeTokens:
+    """Interned recipe tokens: vocab[codes[offsets[i]:offsets[i + 1]]] is recipe i"""
+
+    def __init__(self, vocab: List[str], codes: np.ndarray, offsets: np.ndarray):
+        self.vocab = vocab
+        self.codes = codes
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def doc(self, i: int) -> List[str]:
+        return [self.vocab[code] for code in self.codes[self.offsets[i]:self.offsets[i + 1]]]
+
+    def to_word_ids(self, word_index: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """CSR layout of each recipe's distinct in-vocabulary word ids, sorted per recipe"""
+        lookup = np.array([word_index.get(token, -1) for token in self.vocab], dtype=np.int64)
+        word_ids = lookup[self.codes] if len(self.codes) else np.zeros(0, dtype=np.int64)
+        docs = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+        known = word_ids >= 0
+        num_words = max(len(word_index), 1)
+        pairs = np.unique(docs[known] * num_words + word_ids[known])
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // num_words, minlength=len(self)), out=offsets[1:])
+        return (pairs % num_words).astype(np.int32), offsets
+
+
+def parse_token_column(cells: pd.Series) -> RecipeTokens:
+    """Intern a column of list-literal (or whitespace-separated) token strings"""
+    cells = cells.fillna("").astype(str)
+    if cells.str.lstrip().str.startswith("[").any():
+        cells = cells.str.translate(_LIST_PUNCTUATION)
+    lengths = cells.str.count(r"\S+").to_numpy(dtype=np.int64)
+    tokens = " ".join(cells.tolist()).split()
+    if len(tokens) != lengths.sum():
+        raise ValueError("Token column could not be split consistently")
+    codes, vocab = pd.factorize(pd.Series(tokens, dtype=object), sort=False)
+    offsets = np.zeros(len(cells) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return RecipeTokens(list(vocab), codes.astype(np.int32), offsets)
+
+
+def load_recipes_csv(path: str) -> Tuple[pd.DataFrame, RecipeTokens]:
+    frame = pd.read_csv(path, usecols=lambda column: column in RECIPE_COLUMNS or column == TOKEN_COLUMN)
+    tokens = parse_token_column(frame.pop(TOKEN_COLUMN))
+    return frame, tokens
+
+
+def save_recipes_npz(path: str, frame: pd.DataFrame, tokens: RecipeTokens):
+    """Write recipe display columns and interned tokens as a columnar .npz file"""
+    arrays = {"token_codes": tokens.codes.astype(np.int32), "token_offsets": tokens.offsets.astype(np.int64)}
+    arrays["token_vocab"], arrays["token_vocab_offsets"] = encode_strings(tokens.vocab)
+    for column in RECIPE_COLUMNS:
+        if column not in frame.columns:
+            continue
+        if column == "index":
+            arrays["index"] = frame[column].to_numpy(dtype=np.int64)
+        else:
+            arrays[f"column_{column}"], arrays[f"column_{column}_offsets"] = encode_strings(
+                frame[column].fillna("").astype(str).tolist())
+    np.savez(path, **arrays)
+
+
+def load_recipes_npz(path: str) -> Tuple[pd.DataFrame, RecipeTokens]:
+    with np.load(path, allow_pickle=False) as data:
+        vocab = StringColumn(data["token_vocab"], data["token_vocab_offsets"]).tolist()
+        tokens = RecipeTokens(vocab, data["token_codes"], data["token_offsets"])
+        columns = {}
+        for column in RECIPE_COLUMNS:
+            if column == "index" and "index" in data:
+                columns[column] = data["index"]
+            elif f"column_{column}" in data:
+                columns[column] = StringColumn(data[f"column_{column}"], data[f"column_{column}_offsets"]).tolist()
+    return pd.DataFrame(columns), tokens
+
+
+def load_recipe_file(path: str) -> Tuple[pd.DataFrame, RecipeTokens]:
+    """Load recipes from the cleaned CSV or its .npz equivalent"""
+    if path.endswith(".npz"):
+        return load_recipes_npz(path)
+    return load_recipes_csv(path)
+
+
+class RecipeCorpusWriter:
+    """Streams cleaned recipe chunks to the CSV and the columnar .npz without holding them in memory
+
+    Tokens are interned as they arrive; codes and display strings are spooled to
+    scratch files next to npz_path and copied into the .npz archive on close().
+    Without an npz_path nothing is spooled.
+    """
+
+    def __init__(self, csv_path: str = None, npz_path: str = None):
+        self.csv_path = csv_path
+        self.npz_path = npz_path
+        self.vocab = {}
+        self.num_recipes = 0
+        self.num_tokens = 0
+        self._token_lengths = []
+        self._recipe_ids = []
+        self._scratch = None
+        self._codes_file = None
+        self._column_files = {}
+        if npz_path:
+            self._scratch = tempfile.mkdtemp(prefix="recipes-", dir=os.path.dirname(os.path.abspath(npz_path)))
+            self._codes_file = open(os.path.join(self._scratch, "token_codes"), "wb")
+            self._column_files = {column: open(os.path.join(self._scratch, f"column_{column}"), "wb")
+                                  for column in RECIPE_COLUMNS if column != "index"}
+        self._column_lengths = {column: [] for column in self._column_files}
+
+    def write(self, frame: pd.DataFrame):
+        """Append recipes whose TOKEN_COLUMN holds space-separated cleaned tokens"""
+        token_strings = frame[TOKEN_COLUMN].fillna("").astype(str)
+        if self.csv_path:
+            literals = ["['" + "', '".join(tokens.split()) + "']" if tokens else "[]" for tokens in token_strings]
+            frame.assign(**{TOKEN_COLUMN: literals}).to_csv(
+                self.csv_path, mode="w" if self.num_recipes == 0 else "a", header=self.num_recipes == 0, index=False)
+
+        tokens = " ".join(token_strings.tolist()).split()
+        chunk_codes, uniques = pd.factorize(pd.Series(tokens, dtype=object), sort=False)
+        lookup = np.array([self.vocab.setdefault(token, len(self.vocab)) for token in uniques], dtype=np.int32)
+        if self.npz_path:
+            if len(tokens):
+                self._codes_file.write(lookup[chunk_codes].astype(np.int32).tobytes())
+            self._token_lengths.append(token_strings.str.count(r"\S+").to_numpy(dtype=np.int64))
+            self._recipe_ids.append(frame["index"].to_numpy(dtype=np.int64) if "index" in frame.columns
+                                    else np.arange(self.num_recipes, self.num_recipes + len(frame), dtype=np.int64))
+        for column, f in self._column_files.items():
+            values = frame[column].fillna("").astype(str) if column in frame.columns else pd.Series([""] * len(frame))
+            encoded = [value.encode("utf-8") for value in values]
+            f.write(b"".join(encoded))
+            self._column_lengths[column].append(np.array([len(value) for value in encoded], dtype=np.int64))
+        self.num_recipes += len(frame)
+        self.num_tokens += len(tokens)
+
+    @staticmethod
+    def _offsets(lengths: List[np.ndarray]) -> np.ndarray:
+        lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return offsets
+
+    def _spooled(self, f, dtype) -> np.ndarray:
+        f.close()
+        if os.path.getsize(f.name) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(f.name, dtype=dtype, mode="r")
+
+    def close(self):
+        """Finish the CSV and write the .npz read by load_recipes_npz"""
+        try:
+            if not self.npz_path:
+                return
+            vocab_data, vocab_offsets = encode_strings(list(self.vocab))
+            arrays = {
+                "token_codes": self._spooled(self._codes_file, np.int32),
+                "token_offsets": self._offsets(self._token_lengths),
+                "token_vocab": vocab_data,
+                "token_vocab_offsets": vocab_offsets,
+                "index": np.concatenate(self._recipe_ids) if self._recipe_ids else np.zeros(0, dtype=np.int64),
+            }
+            for column, f in self._column_files.items():
+                arrays[f"column_{column}"] = self._spooled(f, np.uint8)
+                arrays[f"column_{column}_offsets"] = self._offsets(self._column_lengths[column])
+            # Same archive layout as np.savez, but arrays are streamed from the scratch files
+            with zipfile.ZipFile(self.npz_path, "w", allowZip64=True) as archive:
+                for name, array in arrays.items():
+                    with archive.open(name + ".npy", "w", force_zip64=True) as f:
+                        np.lib.format.write_array(f, np.asarray(array), allow_pickle=False)
+        finally:
+            if self._scratch is not None:
+                for f in [self._codes_file, *self._column_files.values()]:
+                    f.close()
+                shutil.rmtree(self._scratch, ignore_errors=True)
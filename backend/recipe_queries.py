@@ -0,0 +1,385 @@
+"""
+Database reads and writes shared by the recipe and favorites routers.
+
+Every read loads its recipes in one query and all their tags in one more,
+however many rows it returns, instead of one query per favorite or per lazily
+loaded relationship. Tags use subqueryload, which joins them to the original
+query; selectinload would send one IN query per 500 recipes. Lists are paginated by keyset:
+the caller passes back the last id it saw (after=...) and the next page
+starts with an index seek rather than counting past skipped rows with OFFSET.
+
+Recipe.favorite_count is a denormalized counter, changed in the same
+transaction as the favorite row, so showing a recipe never counts favorites.
+model_columns.py maps it when models.py does not declare it; migrate_db.py
+adds the column to existing databases, and backfill_favorite_counts()
+recomputes it for every recipe.
+
+Tags are upserted in bulk: one select of the existing names, one INSERT that
+skips names a concurrent writer created meanwhile, and one select of the
+inserted rows, all inside the caller's transaction, so a recipe write commits
+once however many tags it carries. Names are matched case-insensitively, like
+MySQL's default collation, so "Stew" reuses an existing "stew".
+
+Keyword search uses the database's full-text index over title, description
+and ingredients: a FULLTEXT index on MySQL, an FTS5 table kept in sync by
+triggers on SQLite. migrate_db.py creates it through create_fulltext_index();
+search_recipes() only checks whether it exists, once per database, and falls
+back to the substring match search used before, with the same limits, when it
+does not (or on other databases).
+"""
+import logging
+import re
+import threading
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, subqueryload
+
+import model_columns  # noqa: F401  (maps Recipe.favorite_count)
+import models
+
+logger = logging.getLogger(__name__)
+
+
+def _with_tags(query):
+    return query.options(subqueryload(models.Recipe.tags))
+
+
+def _page(rows: list, limit: Optional[int], key) -> Tuple[list, Optional[int]]:
+    """First limit rows and the cursor of the next page (None on the last page); rows holds limit + 1 at most"""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, key(rows[-1])
+
+
+def get_recipe(db: Session, recipe_id: int) -> Optional[models.Recipe]:
+    return _with_tags(db.query(models.Recipe)).filter(models.Recipe.id == recipe_id).first()
+
+
+def list_recipes(db: Session, limit: Optional[int] = 100, after: Optional[int] = None,
+                 skip: int = 0) -> Tuple[List[models.Recipe], Optional[int]]:
+    """Recipes in id order after the cursor (or skipping skip rows), and the next cursor"""
+    query = _with_tags(db.query(models.Recipe)).order_by(models.Recipe.id)
+    if after is not None:
+        query = query.filter(models.Recipe.id > after)
+    elif skip:
+        query = query.offset(skip)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return _page(query.all(), limit, lambda recipe: recipe.id)
+
+
+def favorite_recipes(db: Session, user_id: int, limit: Optional[int] = None,
+                     after: Optional[int] = None) -> Tuple[List[models.Recipe], Optional[int]]:
+    """A user's favorite recipes in the order they were added, and the next cursor (a favorite id)"""
+    query = _with_tags(
+        db.query(models.Favorite.id, models.Recipe)
+        .join(models.Recipe, models.Recipe.id == models.Favorite.recipe_id)
+        .filter(models.Favorite.user_id == user_id)
+        .order_by(models.Favorite.id)
+    )
+    if after is not None:
+        query = query.filter(models.Favorite.id > after)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows, cursor = _page(query.all(), limit, lambda row: row[0])
+    return [recipe for _, recipe in rows], cursor
+
+
+def recipes_by_tag(db: Session, tag_name: str, limit: Optional[int] = None,
+                   after: Optional[int] = None) -> Optional[Tuple[List[models.Recipe], Optional[int]]]:
+    """Recipes carrying a tag in id order and the next cursor, or None when the tag does not exist"""
+    query = _with_tags(
+        db.query(models.Recipe)
+        .join(models.Recipe.tags)
+        .filter(models.Tag.name == tag_name)
+        .order_by(models.Recipe.id)
+    )
+    if after is not None:
+        query = query.filter(models.Recipe.id > after)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    recipes = query.all()
+    if not recipes and after is None and db.query(models.Tag.id).filter(models.Tag.name == tag_name).first() is None:
+        return None
+    return _page(recipes, limit, lambda recipe: recipe.id)
+
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+FULLTEXT_COLUMNS = ("title", "description", "ingredients")
+# bm25() weights per FTS5 column: title matches count the most
+FTS5_WEIGHTS = (10.0, 2.0, 1.0)
+# InnoDB's default innodb_ft_min_token_size; shorter words are not indexed
+MYSQL_MIN_TOKEN = 3
+FULLTEXT_DIALECTS = ("sqlite", "mysql", "mariadb")
+# Whether each database (by engine) has the full-text index, checked once per process
+_fulltext_ready = weakref.WeakKeyDictionary()
+_fulltext_lock = threading.Lock()
+
+# Only edits to the indexed columns rewrite the FTS row, not favorite_count bumps
+_FTS5_UPDATE_TRIGGER = (
+    "CREATE TRIGGER recipes_fts_update AFTER UPDATE OF title, description, ingredients ON recipes BEGIN "
+    "INSERT INTO recipes_fts(recipes_fts, rowid, title, description, ingredients) "
+    "VALUES ('delete', old.id, old.title, old.description, old.ingredients); "
+    "INSERT INTO recipes_fts(rowid, title, description, ingredients) "
+    "VALUES (new.id, new.title, new.description, new.ingredients); END")
+_FTS5_DDL = [
+    "CREATE VIRTUAL TABLE recipes_fts USING fts5(title, description, ingredients, "
+    "content='recipes', content_rowid='id')",
+    "CREATE TRIGGER recipes_fts_insert AFTER INSERT ON recipes BEGIN "
+    "INSERT INTO recipes_fts(rowid, title, description, ingredients) "
+    "VALUES (new.id, new.title, new.description, new.ingredients); END",
+    "CREATE TRIGGER recipes_fts_delete AFTER DELETE ON recipes BEGIN "
+    "INSERT INTO recipes_fts(recipes_fts, rowid, title, description, ingredients) "
+    "VALUES ('delete', old.id, old.title, old.description, old.ingredients); END",
+    _FTS5_UPDATE_TRIGGER,
+    # Index the rows written before the table existed
+    "INSERT INTO recipes_fts(recipes_fts) VALUES ('rebuild')",
+]
+
+
+def search_terms(q: str, max_terms: int = 16) -> List[str]:
+    """Words of a search query, without the full-text query syntax characters"""
+    return _TERM.findall(q.lower())[:max_terms]
+
+
+def _fulltext_index_exists(connection) -> bool:
+    if connection.dialect.name == "sqlite":
+        return connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recipes_fts'")).first() is not None
+    return connection.execute(text(
+        "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+        "AND table_name = 'recipes' AND index_name = 'ft_recipes_text'")).first() is not None
+
+
+def fulltext_index_exists(bind) -> bool:
+    """Whether the database behind bind has the full-text index search_recipes() uses"""
+    if bind.dialect.name not in FULLTEXT_DIALECTS:
+        return False
+    with bind.connect() as connection:
+        return _fulltext_index_exists(connection)
+
+
+def create_fulltext_index(bind) -> bool:
+    """Create the full-text index if the database supports it and lacks it; True if it was created
+
+    Slow on large tables (the index is built over the existing rows), so it
+    runs from migrate_db.py rather than during requests.
+    """
+    if bind.dialect.name not in FULLTEXT_DIALECTS:
+        return False
+    try:
+        with bind.begin() as connection:
+            if _fulltext_index_exists(connection):
+                return False
+            if connection.dialect.name == "sqlite":
+                for statement in _FTS5_DDL:
+                    connection.execute(text(statement))
+            else:
+                # InnoDB keeps the index current from then on
+                connection.execute(text(
+                    f"ALTER TABLE recipes ADD FULLTEXT INDEX ft_recipes_text ({', '.join(FULLTEXT_COLUMNS)})"))
+    except DBAPIError:
+        # Another instance migrating at the same time may have created it first
+        if fulltext_index_exists(bind):
+            return False
+        raise
+    return True
+
+
+def update_fulltext_triggers(bind) -> bool:
+    """Replace an FTS5 update trigger that fires on every column; True if it was replaced"""
+    if bind.dialect.name != "sqlite":
+        return False
+    with bind.begin() as connection:
+        sql = connection.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'recipes_fts_update'")).scalar()
+        if sql is None or sql == _FTS5_UPDATE_TRIGGER:
+            return False
+        connection.execute(text("DROP TRIGGER recipes_fts_update"))
+        connection.execute(text(_FTS5_UPDATE_TRIGGER))
+    return True
+
+
+def _fulltext_available(db: Session) -> bool:
+    bind = db.get_bind()
+    key = bind.engine
+    if key not in _fulltext_ready:
+        with _fulltext_lock:
+            if key not in _fulltext_ready:
+                try:
+                    _fulltext_ready[key] = fulltext_index_exists(bind)
+                except DBAPIError as e:
+                    logger.warning("Could not check for the full-text index, using substring search: %s", e)
+                    _fulltext_ready[key] = False
+                if not _fulltext_ready[key]:
+                    logger.warning("No full-text index on recipes (run migrate_db.py); using substring search")
+    return _fulltext_ready[key]
+
+
+def _ranked_ids(db: Session, terms: List[str], limit: int, offset: int) -> Optional[List[int]]:
+    """Ids of the best matching recipes, best first, or None if the index cannot answer the query
+
+    Every term must match a word or word prefix.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        weights = ", ".join(map(str, FTS5_WEIGHTS))
+        rows = db.execute(text(
+            f"SELECT rowid FROM recipes_fts WHERE recipes_fts MATCH :match "
+            f"ORDER BY bm25(recipes_fts, {weights}), rowid LIMIT :limit OFFSET :offset"),
+            {"match": match, "limit": limit, "offset": offset})
+    else:
+        terms = [term for term in terms if len(term) >= MYSQL_MIN_TOKEN]
+        if not terms:
+            return None
+        match = " ".join(f"+{term}*" for term in terms)
+        columns = ", ".join(FULLTEXT_COLUMNS)
+        rows = db.execute(text(
+            f"SELECT id FROM recipes WHERE MATCH({columns}) AGAINST (:match IN BOOLEAN MODE) "
+            f"ORDER BY MATCH({columns}) AGAINST (:match IN BOOLEAN MODE) DESC, id LIMIT :limit OFFSET :offset"),
+            {"match": match, "limit": limit, "offset": offset})
+    return [row[0] for row in rows]
+
+
+def search_recipes(db: Session, q: str, limit: int = 20, offset: int = 0) -> List[models.Recipe]:
+    """One page of the recipes matching every word of q, most relevant first"""
+    terms = search_terms(q)
+    if not terms:
+        return []
+    if _fulltext_available(db):
+        ids = _ranked_ids(db, terms, limit, offset)
+        if ids is not None:
+            recipes = {recipe.id: recipe for recipe in
+                       _with_tags(db.query(models.Recipe)).filter(models.Recipe.id.in_(ids)).all()} if ids else {}
+            return [recipes[recipe_id] for recipe_id in ids if recipe_id in recipes]
+    pattern = f"%{q}%"
+    return (_with_tags(db.query(models.Recipe))
+            .filter(models.Recipe.title.ilike(pattern) |
+                    models.Recipe.description.ilike(pattern) |
+                    models.Recipe.ingredients.ilike(pattern))
+            .order_by(models.Recipe.id).offset(offset).limit(limit).all())
+
+
+def _insert_ignoring_duplicates(db: Session, table, rows: List[dict]):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        statement = sqlite.insert(table).on_conflict_do_nothing()
+    elif dialect == "postgresql":
+        statement = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect in ("mysql", "mariadb"):
+        statement = insert(table).prefix_with("IGNORE")
+    else:
+        statement = insert(table)
+    db.execute(statement, rows)
+
+
+def _tag_key(name: str) -> str:
+    # MySQL's default collation compares tag names case-insensitively, so "Stew" is the stored "stew"
+    return name.strip().casefold()
+
+
+def _upsert_tag_keys(db: Session, names: List[str]) -> Dict[str, models.Tag]:
+    """Tags for names keyed by _tag_key, inserting missing ones; the first spelling of a new name is stored"""
+    unique: Dict[str, str] = {}
+    for name in names:
+        if name and name.strip():
+            unique.setdefault(_tag_key(name), name.strip())
+    names = list(unique.values())
+    if not names:
+        return {}
+    spellings = set(names)
+
+    def keyed(found, tags):
+        for tag in found:
+            # A case-sensitive database may hold several spellings; prefer the requested one
+            if _tag_key(tag.name) not in tags or tag.name in spellings:
+                tags[_tag_key(tag.name)] = tag
+        return tags
+
+    tags = keyed(db.query(models.Tag).filter(models.Tag.name.in_(names)).all(), {})
+    missing = [name for name in names if _tag_key(name) not in tags]
+    if missing:
+        _insert_ignoring_duplicates(db, models.Tag.__table__, [{"name": name} for name in missing])
+        keyed(db.query(models.Tag).filter(models.Tag.name.in_(missing)).all(), tags)
+        for name in missing:
+            if _tag_key(name) not in tags:
+                # The collation matched a row this key does not (e.g. accents); look it up as the database sees it
+                tag = db.query(models.Tag).filter(models.Tag.name == name).first()
+                if tag is not None:
+                    tags[_tag_key(name)] = tag
+    return tags
+
+
+def upsert_tags(db: Session, names: List[str]) -> List[models.Tag]:
+    """Tags for names (stripped, case-insensitive duplicates dropped, in order), inserting missing ones; does not commit"""
+    tags = _upsert_tag_keys(db, names)
+    keys = dict.fromkeys(_tag_key(name) for name in names if name and name.strip())
+    return [tags[key] for key in keys if key in tags]
+
+
+def _new_recipe(recipe, user_id: int, tags: List[models.Tag]) -> models.Recipe:
+    return models.Recipe(
+        title=recipe.title,
+        description=recipe.description,
+        ingredients=recipe.ingredients,
+        instructions=recipe.instructions,
+        image_url=recipe.image_url,
+        user_id=user_id,
+        tags=tags,
+    )
+
+
+def create_recipes(db: Session, recipes: list, user_id: int) -> List[models.Recipe]:
+    """Insert recipes (schemas.RecipeCreate) with their tags in one transaction; returns them loaded, in order"""
+    tags = _upsert_tag_keys(db, [name for recipe in recipes for name in recipe.tags or []])
+    db_recipes = [_new_recipe(recipe, user_id,
+                              [tags[key] for key in dict.fromkeys(_tag_key(n) for n in recipe.tags or [] if n)
+                               if key in tags])
+                  for recipe in recipes]
+    db.add_all(db_recipes)
+    db.flush()
+    ids = [recipe.id for recipe in db_recipes]
+    db.commit()
+    # One query (plus one for tags) instead of refreshing each expired recipe
+    loaded = {recipe.id: recipe for recipe in
+              _with_tags(db.query(models.Recipe)).filter(models.Recipe.id.in_(ids)).all()}
+    return [loaded[recipe_id] for recipe_id in ids]
+
+
+def add_favorite(db: Session, user_id: int, recipe_id: int) -> models.Favorite:
+    """Insert a favorite and bump the recipe's counter in one transaction"""
+    favorite = models.Favorite(user_id=user_id, recipe_id=recipe_id)
+    db.add(favorite)
+    # Increment in SQL so concurrent favorites do not lose updates
+    db.execute(update(models.Recipe).where(models.Recipe.id == recipe_id)
+               .values(favorite_count=models.Recipe.favorite_count + 1)
+               .execution_options(synchronize_session=False))
+    db.commit()
+    db.refresh(favorite)
+    return favorite
+
+
+def remove_favorite(db: Session, favorite: models.Favorite):
+    recipe_id = favorite.recipe_id
+    db.delete(favorite)
+    db.execute(update(models.Recipe).where(models.Recipe.id == recipe_id, models.Recipe.favorite_count > 0)
+               .values(favorite_count=models.Recipe.favorite_count - 1)
+               .execution_options(synchronize_session=False))
+    db.commit()
+
+
+def backfill_favorite_counts(db: Session) -> int:
+    """Recompute every recipe's favorite_count from the favorites table; returns the rows updated"""
+    counts = (select(func.count(models.Favorite.id))
+              .where(models.Favorite.recipe_id == models.Recipe.id)
+              .scalar_subquery())
+    result = db.execute(update(models.Recipe).values(favorite_count=counts)
+                        .execution_options(synchronize_session=False))
+    db.commit()
+    return result.rowcount
@@ -1,10 +1,17 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List
-import requests, os
+import asyncio
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config  # Use absolute import instead of relative import
+import search_service
+from ingredient_index import IngredientIndex
+from spoonacular_client import SpoonacularError, SpoonacularQuotaExceeded, get_client
+
+# Local suggestions covering less of the requested ingredients than this are
+# left out, and Spoonacular fills the remaining places
+MIN_LOCAL_COVERAGE = float(os.getenv("CHATBOT_MIN_COVERAGE", "0.5"))
 
 class IngredientsRequest(BaseModel):
     ingredients: List[str]
@@ -16,6 +23,8 @@ class RecipeSuggestion(BaseModel):
     instructions: str
     ingredients: List[str]
     relevance_score: float
+    missing_ingredients: List[str] = []
+    source: str = "spoonacular"
 
 router = APIRouter(
     prefix="/api/chatbot",
@@ -23,29 +32,73 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+_ingredient_index = None
+
+
+def get_ingredient_index():
+    """Ingredient index over the running search engine, rebuilt when the engine is swapped"""
+    global _ingredient_index
+    engine = search_service.get_engine()
+    if engine is None or engine.word_index is None:
+        return None
+    if _ingredient_index is None or _ingredient_index.engine is not engine:
+        _ingredient_index = IngredientIndex(engine)
+    return _ingredient_index
+
+
+def local_suggestions(ingredients: List[str], number: int) -> List[RecipeSuggestion]:
+    index = get_ingredient_index()
+    if index is None:
+        return []
+    return [RecipeSuggestion(
+        title=card.get("Title", ""),
+        image=card.get("Image_Name", ""),
+        instructions=card.get("Snippet", ""),
+        ingredients=card["matched_ingredients"] + card["near_ingredients"],
+        relevance_score=card["relevance_score"],
+        missing_ingredients=card["missing_ingredients"],
+        source="local"
+    ) for card in index.suggest(ingredients, number, MIN_LOCAL_COVERAGE)]
+
+
 @router.post("/suggest-recipes", response_model=List[RecipeSuggestion])
 async def suggest_recipes_by_ingredients(req: IngredientsRequest):
     """
-    根据用户提供的食材列表，调用 Spoonacular API 推荐菜谱
+    根据用户提供的食材列表推荐菜谱：先查本地菜谱库，结果不足时再调用 Spoonacular API
     """
+    # Ranking a few thousand candidates takes milliseconds; keep it off the event loop anyway
+    suggestions = await asyncio.to_thread(local_suggestions, req.ingredients, req.number)
+    if len(suggestions) >= req.number:
+        return suggestions
+
     api_key = config.SPOONACULAR_API_KEY  # Use the config module
     if not api_key:
+        if suggestions:
+            return suggestions
         raise HTTPException(status_code=500, detail="Missing SPOONACULAR_API_KEY")
     
-    include = ",".join(req.ingredients)
-    url = "https://api.spoonacular.com/recipes/complexSearch"
-    params = {
-        "apiKey": api_key,
-        "includeIngredients": include,
-        "number": req.number,
-        "addRecipeInformation": True
-    }
-    resp = requests.get(url, params=params)
-    resp.raise_for_status()
-    data = resp.json()
+    # Same ingredients in any order or case share one cached response
+    include = ",".join(sorted({ing.strip().lower() for ing in req.ingredients if ing.strip()}))
+    try:
+        data = await get_client(api_key).search_recipes(
+            includeIngredients=include,
+            number=req.number,
+            addRecipeInformation=True
+        )
+    except SpoonacularError as e:
+        if suggestions:
+            return suggestions
+        if isinstance(e, SpoonacularQuotaExceeded):
+            raise HTTPException(status_code=503, detail="Recipe suggestions are unavailable until the API quota resets",
+                                headers={"Retry-After": str(int(e.retry_after) + 1)})
+        raise HTTPException(status_code=502, detail=f"Error fetching recipes from Spoonacular: {e}")
     
-    suggestions = []
+    titles = {suggestion.title.lower() for suggestion in suggestions}
     for item in data.get("results", []):
+        if len(suggestions) >= req.number:
+            break
+        if item["title"].lower() in titles:
+            continue
         suggestions.append(RecipeSuggestion(
             title=item["title"],
             image=item.get("image", ""),
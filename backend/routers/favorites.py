@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 import sys
 import os
@@ -9,6 +9,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import schemas
 import models
 import auth
+import recipe_queries
 from database import get_db
 
 router = APIRouter(
@@ -37,23 +38,20 @@ def create_favorite(
     if existing_favorite:
         raise HTTPException(status_code=400, detail="Recipe already favorited")
     
-    # Create favorite
-    db_favorite = models.Favorite(
-        user_id=current_user.id,
-        recipe_id=favorite.recipe_id
-    )
-    db.add(db_favorite)
-    db.commit()
-    db.refresh(db_favorite)
-    return db_favorite
+    # Create favorite (and count it on the recipe)
+    return recipe_queries.add_favorite(db, current_user.id, favorite.recipe_id)
 
 @router.get("/", response_model=List[schemas.Recipe])
 def read_user_favorites(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (default: all favorites)"),
+    after: Optional[int] = Query(None, description="X-Next-Cursor of the previous page"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    favorites = db.query(models.Favorite).filter(models.Favorite.user_id == current_user.id).all()
-    recipes = [db.query(models.Recipe).filter(models.Recipe.id == fav.recipe_id).first() for fav in favorites]
+    recipes, cursor = recipe_queries.favorite_recipes(db, current_user.id, limit, after)
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = str(cursor)
     return recipes
 
 @router.delete("/{recipe_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -71,8 +69,7 @@ def delete_favorite(
         raise HTTPException(status_code=404, detail="Favorite not found")
     
     # Delete favorite
-    db.delete(favorite)
-    db.commit()
+    recipe_queries.remove_favorite(db, favorite)
     return None
 
 @router.get("/check/{recipe_id}", response_model=bool)
@@ -1,7 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from sqlalchemy import func
+from typing import List, Optional
 
 import sys
 import os
@@ -10,8 +9,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import schemas
 import models
 import auth
+import recipe_queries
+import search_service
 from database import get_db
 
+# Recipes per /bulk request; larger imports are sent in several requests
+MAX_IMPORT_RECIPES = 1000
+
 router = APIRouter(
     prefix="/api/recipes",
     tags=["recipes"],
@@ -24,53 +28,46 @@ def create_recipe(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    # Create recipe
-    db_recipe = models.Recipe(
-        title=recipe.title,
-        description=recipe.description,
-        ingredients=recipe.ingredients,
-        instructions=recipe.instructions,
-        image_url=recipe.image_url,
-        user_id=current_user.id
-    )
-    db.add(db_recipe)
-    db.commit()
-    db.refresh(db_recipe)
-    
-    # Add tags
-    if recipe.tags:
-        for tag_name in recipe.tags:
-            # Check if tag exists
-            db_tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
-            if not db_tag:
-                # Create new tag
-                db_tag = models.Tag(name=tag_name)
-                db.add(db_tag)
-                db.commit()
-                db.refresh(db_tag)
-            # Add tag to recipe
-            db_recipe.tags.append(db_tag)
-        db.commit()
+    # Create recipe and its tags in one transaction
+    db_recipe = recipe_queries.create_recipes(db, [recipe], current_user.id)[0]
     
+    # Make the recipe searchable without rebuilding the search index
+    search_service.index_recipe(db_recipe)
     return db_recipe
 
+@router.post("/bulk", response_model=List[schemas.Recipe], status_code=status.HTTP_201_CREATED)
+def import_recipes(
+    recipes: List[schemas.RecipeCreate], 
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """Create up to MAX_IMPORT_RECIPES recipes in one transaction, e.g. for content imports"""
+    if len(recipes) > MAX_IMPORT_RECIPES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"At most {MAX_IMPORT_RECIPES} recipes per import")
+    db_recipes = recipe_queries.create_recipes(db, recipes, current_user.id)
+    for db_recipe in db_recipes:
+        search_service.index_recipe(db_recipe)
+    return db_recipes
+
 @router.get("/", response_model=List[schemas.Recipe])
-def read_recipes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    recipes = db.query(models.Recipe).offset(skip).limit(limit).all()
+def read_recipes(response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000),
+                 after: Optional[int] = Query(None, description="X-Next-Cursor of the previous page"),
+                 db: Session = Depends(get_db)):
+    recipes, cursor = recipe_queries.list_recipes(db, limit, after, skip)
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = str(cursor)
     return recipes
 
 @router.get("/{recipe_id}", response_model=schemas.RecipeDetail)
 def read_recipe(recipe_id: int, db: Session = Depends(get_db)):
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
+    recipe = recipe_queries.get_recipe(db, recipe_id)
     if recipe is None:
         raise HTTPException(status_code=404, detail="Recipe not found")
     
-    # Get favorite count
-    favorite_count = db.query(func.count(models.Favorite.id)).filter(models.Favorite.recipe_id == recipe_id).scalar()
-    
-    # Create response
+    # Create response (favorite_count is kept on the recipe row)
     recipe_detail = schemas.RecipeDetail.from_orm(recipe)
-    recipe_detail.favorite_count = favorite_count
+    recipe_detail.favorite_count = recipe.favorite_count
     
     return recipe_detail
 
@@ -98,22 +95,11 @@ def update_recipe(
         db_recipe.image_url = recipe.image_url
     
     # Update tags
-    db_recipe.tags = []
-    if recipe.tags:
-        for tag_name in recipe.tags:
-            # Check if tag exists
-            db_tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
-            if not db_tag:
-                # Create new tag
-                db_tag = models.Tag(name=tag_name)
-                db.add(db_tag)
-                db.commit()
-                db.refresh(db_tag)
-            # Add tag to recipe
-            db_recipe.tags.append(db_tag)
+    db_recipe.tags = recipe_queries.upsert_tags(db, recipe.tags or [])
     
     db.commit()
     db.refresh(db_recipe)
+    search_service.index_recipe(db_recipe)
     return db_recipe
 
 @router.delete("/{recipe_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -133,20 +119,25 @@ def delete_recipe(
     # Delete recipe
     db.delete(db_recipe)
     db.commit()
+    search_service.unindex_recipe(recipe_id)
     return None
 
 @router.get("/search/", response_model=List[schemas.Recipe])
-def search_recipes(q: str, db: Session = Depends(get_db)):
-    recipes = db.query(models.Recipe).filter(
-        models.Recipe.title.ilike(f"%{q}%") | 
-        models.Recipe.description.ilike(f"%{q}%") |
-        models.Recipe.ingredients.ilike(f"%{q}%")
-    ).all()
-    return recipes
+def search_recipes(q: str = Query(..., max_length=200),
+                   limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0, le=10000),
+                   db: Session = Depends(get_db)):
+    # Ranked full-text matches, one bounded page at a time
+    return recipe_queries.search_recipes(db, q, limit, offset)
 
 @router.get("/tags/{tag_name}", response_model=List[schemas.Recipe])
-def get_recipes_by_tag(tag_name: str, db: Session = Depends(get_db)):
-    tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
-    if not tag:
+def get_recipes_by_tag(response: Response, tag_name: str,
+                       limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (default: all recipes)"),
+                       after: Optional[int] = Query(None, description="X-Next-Cursor of the previous page"),
+                       db: Session = Depends(get_db)):
+    page = recipe_queries.recipes_by_tag(db, tag_name, limit, after)
+    if page is None:
         raise HTTPException(status_code=404, detail="Tag not found")
-    return tag.recipes 
\ No newline at end of file
+    recipes, cursor = page
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = str(cursor)
+    return recipes 
\ No newline at end of file
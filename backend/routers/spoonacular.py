@@ -4,8 +4,8 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import spoonacular
 from spoonacular import SpoonacularSearchResults, SpoonacularRecipe
+from spoonacular_client import SpoonacularQuotaExceeded, get_client
 from query_generator import QueryGenerator
 
 router = APIRouter(
@@ -36,23 +36,25 @@ async def search_recipes(
     Search for recipes using the Spoonacular API.
     """
     try:
-        results = await spoonacular.search_recipes(
+        results = await get_client().search_recipes(
             query=query,
             number=number,
             offset=offset,
-            max_fat=max_fat,
-            max_calories=max_calories,
-            max_carbs=max_carbs,
-            max_protein=max_protein,
+            maxFat=max_fat,
+            maxCalories=max_calories,
+            maxCarbs=max_carbs,
+            maxProtein=max_protein,
             cuisine=cuisine,
             diet=diet,
             intolerances=intolerances,
             sort=sort,
-            sort_direction=sort_direction,
-            include_ingredients=include_ingredients,
-            exclude_ingredients=exclude_ingredients,
+            sortDirection=sort_direction,
+            includeIngredients=include_ingredients,
+            excludeIngredients=exclude_ingredients,
         )
         return results
+    except SpoonacularQuotaExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -66,8 +68,10 @@ async def get_recipe_information(recipe_id: int):
     Get detailed information about a specific recipe by ID.
     """
     try:
-        recipe = await spoonacular.get_recipe_information(recipe_id)
+        recipe = await get_client().get_recipe_information(recipe_id)
         return recipe
+    except SpoonacularQuotaExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -1,56 +1,94 @@
+"""
+Clean the Kaggle recipe dump into the corpus used by the search engine.
+
+The input CSV is read in chunks, cleaned in a pool of worker processes and
+streamed to cleaned_recipe_data.csv (for Word2Vec training) and
+cleaned_recipe_data.npz (interned tokens read by build_index.py), so inputs
+larger than RAM are fine:
+
+    python save_recipes.py [--input dump.csv] [--chunk-size 2000] [--workers 8]
+"""
+import argparse
+import os
+import time
+from collections import deque
+from multiprocessing import Pool
+
 import pandas as pd
-import kagglehub
-import re
-from nltk.corpus import stopwords
-
-# Download the dataset
-path = kagglehub.dataset_download("pes12017000148/food-ingredients-and-recipe-dataset-with-images")
-print("Path to dataset files:", path)
-recipes = pd.read_csv(path+"/Food Ingredients and Recipe Dataset with Image Name Mapping.csv")
-
-# Clean the data (from block 3)
-null_recs = recipes.copy().drop(columns = 'Image_Name').T.isna().any()
-recipes = recipes.drop(index = recipes[null_recs].index).reset_index(drop = True)
-recipes["index"] = recipes['Unnamed: 0']
-recipes = recipes.drop(columns = ['Unnamed: 0', "Ingredients"])
-empty_instr_ind = [index for i, index in zip(recipes['Instructions'], recipes.index) if len(i) < 20]
-recipes = recipes.drop(index = empty_instr_ind).reset_index(drop=True)
-
-# Define stopwords (from block 4)
-stop_words = set(stopwords.words('english'))
-punctuations =  '"\'\\,<>./?@#$%^&*_~/!()-[]{};:'
-custom_stopwords = set(["cup", "cups", "minutes", "oil", "teaspoon", "tablespoon", "ounce", "ounces", "gram", "grams", "minute", "hour", "hours"])
-frequent_words = set(['tablespoons', 'large','salt','heat', 'chopped','Add','fresh','sugar','bowl','butter','flour','baking','mixture','f',
- 'pan','cream','large', 'chopped', 'Add', 'fresh', 'water', 'medium', 'skillet',  'sauce', 'cook', 'juice', 'cut',  'remaining', 'small','inch', 'finely', 'pot', 'oven', "new", "old", "previous",
-                      'pound','sliced','tender','ground','transfer','heavy','teaspoons', 'occasionally', 'leaves','let','add','cover']
-)
-colors = [
-    "red", "blue", "green", "yellow", "orange", "purple", "pink", "brown",
-    "black", "white", "gray", "grey", "beige", "cyan", "magenta", "teal",
-    "violet", "indigo", "maroon", "turquoise", "lavender", "gold", "silver"
-]
-
-stopwords = stop_words.union(custom_stopwords).union(frequent_words).union(colors)
-
-# Clean text function (from block 5)
-def clean_text(documents):
-    cleaned_text = []
-    for doc in documents:
-        doc = doc.lower()
-        doc = re.sub(r'\\d+', ' ', doc) # Remove Digits
-        line = ''.join(char for char in doc if char not in (punctuations) and (char.isalpha() or char == ' '))
-        words = line.split()
-        words = [word for word in words if word not in stopwords]
-        cleaned = ' '.join(words)
-        cleaned_text.append(cleaned)
-    return cleaned_text
-
-# Add combined_cleaned column (from block 6)
-recipes["combined_cleaned"] = clean_text(recipes["Title"] + recipes["Instructions"])
-
-# Split combined_cleaned into words (from block 8)
-recipes['combined_cleaned'] = recipes['combined_cleaned'].str.split()
-
-# Save to CSV
-recipes.to_csv('cleaned_recipe_data.csv', index=False)
-print("Data saved to cleaned_recipe_data.csv") 
\ No newline at end of file
+
+from recipe_loader import RecipeCorpusWriter, TOKEN_COLUMN
+from text_cleaning import clean_text
+
+DATASET = "pes12017000148/food-ingredients-and-recipe-dataset-with-images"
+DATASET_FILE = "Food Ingredients and Recipe Dataset with Image Name Mapping.csv"
+
+
+def read_chunks(path: str, chunk_size: int):
+    """Yield raw recipe rows chunk by chunk"""
+    yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def clean_chunk(recipes: pd.DataFrame) -> pd.DataFrame:
+    """Apply the row filters and text cleaning to one chunk (runs in a worker process)"""
+    # Clean the data (from block 3)
+    null_recs = recipes.drop(columns = 'Image_Name').isna().any(axis=1)
+    recipes = recipes[~null_recs].copy()
+    recipes["index"] = recipes['Unnamed: 0']
+    recipes = recipes.drop(columns = ['Unnamed: 0', "Ingredients"])
+    recipes = recipes[recipes['Instructions'].str.len() >= 20]
+
+    # Add combined_cleaned column (from block 6), as space-separated tokens
+    recipes[TOKEN_COLUMN] = clean_text(recipes["Title"] + recipes["Instructions"])
+    return recipes.reset_index(drop = True)
+
+
+def run_pipeline(input_path: str, csv_path: str, npz_path: str, chunk_size: int = 2000, workers: int = None):
+    workers = workers or os.cpu_count() or 1
+    writer = RecipeCorpusWriter(csv_path, npz_path)
+    start_time = time.time()
+    rows_in = 0
+    try:
+        with Pool(workers) as pool:
+            # At most 2 chunks per worker are in flight, so memory stays bounded
+            pending = deque()
+            for chunk in read_chunks(input_path, chunk_size):
+                rows_in += len(chunk)
+                pending.append(pool.apply_async(clean_chunk, (chunk,)))
+                if len(pending) >= 2 * workers:
+                    writer.write(pending.popleft().get())
+                    report_progress(rows_in, writer, start_time)
+            while pending:
+                writer.write(pending.popleft().get())
+                report_progress(rows_in, writer, start_time)
+    finally:
+        writer.close()
+    elapsed = time.time() - start_time
+    print(f"Cleaned {writer.num_recipes} of {rows_in} recipes ({writer.num_tokens} tokens, "
+          f"{len(writer.vocab)} distinct) in {elapsed:.2f} seconds")
+    print(f"Data saved to {', '.join(path for path in [csv_path, npz_path] if path)}")
+
+
+def report_progress(rows_in: int, writer: RecipeCorpusWriter, start_time: float):
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"  {rows_in} rows read, {writer.num_recipes} kept, "
+          f"{rows_in / elapsed:,.0f} rows/s, {writer.num_tokens / elapsed:,.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the recipe dataset for search")
+    parser.add_argument("--input", help="Raw recipe CSV (default: download the Kaggle dataset)")
+    parser.add_argument("--csv", default="cleaned_recipe_data.csv", help="Cleaned CSV output ('' to skip)")
+    parser.add_argument("--npz", default="cleaned_recipe_data.npz", help="Columnar output ('' to skip)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    input_path = args.input
+    if not input_path:
+        import kagglehub
+
+        # Download the dataset
+        path = kagglehub.dataset_download(DATASET)
+        print("Path to dataset files:", path)
+        input_path = os.path.join(path, DATASET_FILE)
+    run_pipeline(input_path, args.csv or None, args.npz or None, args.chunk_size, args.workers)
@@ -0,0 +1,233 @@
+"""
+Incremental updates for OptimizedSearchEngine.
+
+Recipes added after the index was built go to a small delta segment that every
+search scores in full next to the main index. Deleted (or replaced) recipes are
+tombstoned and masked out of results. A background DeltaMerger periodically
+folds the delta into the main CSR arrays so the delta stays small.
+
+Recipe ids are positions and never reused: delta recipes continue the main
+index numbering, and tombstoned recipes keep their slot (emptied at merge time)
+until the next full rebuild with build_index.py.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ReadWriteLock:
+    """Many concurrent readers (searches) or one writer (a merge swapping arrays)"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class DeltaSnapshot:
+    """Immutable view of the delta segment taken at the start of a search"""
+
+    def __init__(self, first_id: int, token_ids: np.ndarray, offsets: np.ndarray,
+                 live: np.ndarray, deleted: Optional[np.ndarray]):
+        # Delta recipe i has id first_id + i; dead slots have no tokens and live[i] False
+        self.first_id = first_id
+        self.token_ids = token_ids
+        self.offsets = offsets
+        self.live = live
+        self.doc_ids = np.arange(first_id, first_id + len(live), dtype=np.int64)
+        # Boolean mask over the main index ids, or None when nothing was ever deleted
+        self.deleted = deleted
+        self.num_deleted = int(deleted.sum()) if deleted is not None else 0
+        self._doc_vectors = None
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+    def doc_vectors(self, word_rows: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """Unit-normalized mean word vector of each delta recipe, as compared by the ANN index
+
+        word_rows(ids) returns the float32 word vectors at ids.
+        """
+        if self._doc_vectors is None:
+            token_vectors = word_rows(self.token_ids)
+            vectors = np.zeros((len(self), token_vectors.shape[1]), dtype=np.float32)
+            lengths = np.diff(self.offsets)
+            nonempty = lengths > 0
+            if nonempty.any():
+                sums = np.add.reduceat(token_vectors, self.offsets[:-1][nonempty], axis=0)
+                vectors[nonempty] = sums / np.linalg.norm(sums, axis=1, keepdims=True).clip(1e-12)
+            self._doc_vectors = vectors
+        return self._doc_vectors
+
+
+class DeltaSegment:
+    """Thread-safe append/tombstone log over the recipe ids of a loaded index"""
+
+    def __init__(self, first_id: int):
+        self.first_id = first_id
+        self._lock = threading.Lock()
+        self._token_ids: List[np.ndarray] = []
+        self._live: List[bool] = []
+        self._tombstones = set()
+        # External key (e.g. a database recipe id) -> live recipe id, kept across merges
+        self.keys: Dict[Hashable, int] = {}
+        # Display fields of every incrementally added recipe, by recipe id
+        self.metadata: Dict[int, Dict[str, Any]] = {}
+        self.pending_tombstones = 0
+        self._snapshot = None
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    @property
+    def num_docs(self) -> int:
+        """Recipe ids handed out so far (main index plus delta)"""
+        return self.first_id + len(self._live)
+
+    @property
+    def pending(self) -> int:
+        """Appends and deletes a merge would fold into the main index"""
+        return len(self._live) + self.pending_tombstones
+
+    def add(self, key: Hashable, token_ids: np.ndarray, metadata: Dict[str, Any] = None) -> int:
+        """Append a recipe (replacing any earlier version under key) and return its id"""
+        with self._lock:
+            self._remove_locked(key)
+            doc_id = self.first_id + len(self._live)
+            self._token_ids.append(np.asarray(token_ids, dtype=np.int32))
+            self._live.append(True)
+            self.keys[key] = doc_id
+            self.metadata[doc_id] = dict(metadata or {})
+            self._snapshot = None
+            return doc_id
+
+    def remove(self, key: Hashable) -> Optional[int]:
+        """Tombstone the recipe stored under key, returning its id"""
+        with self._lock:
+            return self._remove_locked(key)
+
+    def delete(self, doc_id: int):
+        """Tombstone a recipe by id, e.g. one that came from the main index"""
+        with self._lock:
+            self._delete_locked(doc_id)
+
+    def _remove_locked(self, key: Hashable) -> Optional[int]:
+        doc_id = self.keys.pop(key, None)
+        if doc_id is not None:
+            self._delete_locked(doc_id)
+            self.metadata.pop(doc_id, None)
+        return doc_id
+
+    def _delete_locked(self, doc_id: int):
+        if doc_id in self._tombstones or not 0 <= doc_id < self.num_docs:
+            return
+        self._tombstones.add(doc_id)
+        if doc_id >= self.first_id:
+            slot = doc_id - self.first_id
+            self._live[slot] = False
+            self._token_ids[slot] = np.zeros(0, dtype=np.int32)
+        else:
+            self.pending_tombstones += 1
+        self._snapshot = None
+
+    def is_deleted(self, doc_id: int) -> bool:
+        return doc_id in self._tombstones
+
+    def snapshot(self) -> DeltaSnapshot:
+        """Current state, rebuilt only after an update"""
+        with self._lock:
+            if self._snapshot is None:
+                lengths = [len(ids) for ids in self._token_ids]
+                offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+                np.cumsum(lengths, out=offsets[1:])
+                token_ids = np.concatenate(self._token_ids) if self._token_ids else np.zeros(0, dtype=np.int32)
+                deleted = None
+                base_tombstones = [doc_id for doc_id in self._tombstones if doc_id < self.first_id]
+                if base_tombstones:
+                    deleted = np.zeros(self.first_id, dtype=bool)
+                    deleted[base_tombstones] = True
+                self._snapshot = DeltaSnapshot(self.first_id, token_ids, offsets,
+                                               np.array(self._live, dtype=bool), deleted)
+            return self._snapshot
+
+    def merged(self, num_docs: int):
+        """Forget the first num_docs delta recipes once the main index holds them"""
+        with self._lock:
+            del self._token_ids[:num_docs]
+            del self._live[:num_docs]
+            self.first_id += num_docs
+            self.pending_tombstones = 0
+            self._snapshot = None
+
+
+class DeltaMerger:
+    """Background thread folding an engine's delta segment into its main index
+
+    A merge runs every interval seconds while anything is pending, or as soon as
+    the delta holds max_delta recipes.
+    """
+
+    def __init__(self, engine, interval: float = 30.0, max_delta: int = 1000):
+        self.engine = engine
+        self.interval = interval
+        self.max_delta = max_delta
+        self.merges = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="search-merge", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Called after each update; wakes the thread early once the delta is large"""
+        if len(self.engine.delta) >= self.max_delta:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                if self.engine.delta.pending:
+                    self.engine.merge_delta()
+                    self.merges += 1
+            except Exception as e:
+                logger.exception("Search index merge failed: %s", e)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
@@ -1,129 +1,759 @@
-import pandas as pd
 import numpy as np
-from gensim.models import Word2Vec
+from gensim import utils as gensim_utils
 from scipy.special import expit
-from Levenshtein import distance
+from scipy.sparse import csr_matrix
 import os
 from typing import List, Dict, Any
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ann_index import IVFIndex
+from search_index import SearchIndex, build_postings, read_index, write_index, index_from_engine
+from spell_index import SpellingIndex
+from recipe_loader import load_recipe_file
+from topk import top_k_indices, StreamingTopK
+from search_cache import QueryCache, WordScoreCache
+from search_delta import DeltaSegment, DeltaMerger, ReadWriteLock
+from recipe_cards import RecipeCardStore, SearchResults
+from quantized_vectors import VECTOR_DTYPES, dequantize, quantize, ranking_agreement, similarities, vector_dtype
+import orjson
+import logging
+from search_metrics import SEARCH_STAGE_SECONDS, SEARCH_SECONDS, SEARCHES_TOTAL
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ("exact", "ann", "ann_rerank")
+# Recipes per block when averaging token vectors into document vectors
+DOC_VECTOR_CHUNK = 1024
+# Target size of search_many's per-chunk similarity buffer (float32 elements)
+BATCH_BUFFER_ELEMENTS = 1 << 22
+# Corpora smaller than this per shard are scored on the calling thread
+MIN_SHARD_DOCS = 4096
 
 
 class OptimizedSearchEngine:
-    def __init__(self, model_path: str = None, recipes_path: str = None):
+    def __init__(self, model_path: str = None, recipes_path: str = None, index_path: str = None,
+                 prune_candidates: bool = True, candidate_neighbours: int = 10, min_candidates: int = 200,
+                 ann_n_probe: int = 8, ann_rerank_factor: int = 10, score_chunk_size: int = 50000,
+                 query_cache_size: int = 1024, query_cache_ttl: float = 300.0,
+                 word_cache_bytes: int = 64 * 1024 * 1024, num_shards: int = 1, batch_size: int = 256,
+                 merge_interval: float = 30.0, max_delta: int = 1000, vector_dtype: str = None,
+                 keep_model: bool = True):
+        # Candidate pruning: score only recipes whose tokens include a query word or one of
+        # its candidate_neighbours nearest words, falling back to a full scan below min_candidates
+        self.prune_candidates = prune_candidates
+        self.candidate_neighbours = candidate_neighbours
+        self.min_candidates = min_candidates
+        # ANN retrieval: IVF lists probed per query, and how many ANN hits ann_rerank rescores per result
+        self.ann_n_probe = ann_n_probe
+        self.ann_rerank_factor = ann_rerank_factor
+        self.ann_index = None
+        self._ann_lock = threading.Lock()
+        # Scans over more recipes than this are scored chunk by chunk into a bounded heap
+        self.score_chunk_size = score_chunk_size
+        # Results keyed on the corrected query, cleared whenever the model or recipes change
+        self.query_cache = QueryCache(query_cache_size, query_cache_ttl)
+        # Per-word sigmoid(max similarity) vectors over all recipes, shared across queries
+        self.word_cache = WordScoreCache(word_cache_bytes)
+        # Full scans are split into num_shards recipe ranges scored in parallel threads
+        self.num_shards = num_shards
+        self._shard_pool = None
+        self._shard_lock = threading.Lock()
+        # search_many scores this many queries per pass over the corpus
+        self.batch_size = batch_size
+        # Recipes added or deleted at runtime live in a delta segment until a merge;
+        # searches hold the read side of _segments, merges swap arrays under the write side
+        self.merge_interval = merge_interval
+        self.max_delta = max_delta
+        self.delta = DeltaSegment(0)
+        self.merger = None
+        self._segments = ReadWriteLock()
+        self._merge_lock = threading.Lock()
+        # Word vectors are stored as float32, float16 or per-row scaled int8 (see quantized_vectors.py);
+        # None keeps what a prebuilt index stores, and float32 for a gensim model
+        if vector_dtype is not None and vector_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype {vector_dtype!r}, expected one of {VECTOR_DTYPES}")
+        self.vector_dtype = vector_dtype
+        # gensim KeyedVectors of the loaded model; training state is never kept. Searches only use
+        # the normalized (possibly quantized) copy, so servers drop it with keep_model=False
+        self.keep_model = keep_model
         self.model = None
         self.recipes = None
+        self.recipe_tokens = None
         self.vocabulary = None
+        self.word_index = None
+        self.word_vectors = None
+        self.word_scales = None
+        self.word_counts = None
+        self.spelling = None
+        self.doc_token_ids = None
+        self.doc_offsets = None
+        self.term_doc_ids = None
+        self.term_offsets = None
+        self.recipe_metadata = None
+        # Dataset ids of the recipes in a loaded index
+        self.recipe_ids = None
+        # Pre-encoded display fields returned with search results
+        self.cards = None
+        # Set when serving a prebuilt index, so process workers can open the same files
+        self.index_path = None
         
+        # A prebuilt index (see build_index.py) replaces both the model and the CSV
+        if index_path and os.path.exists(index_path):
+            self.load_index(index_path)
+            return
         if model_path and os.path.exists(model_path):
             self.load_model(model_path)
         if recipes_path and os.path.exists(recipes_path):
             self.load_recipes(recipes_path)
             
     def load_model(self, model_path: str):
-        """Load a pre-trained Word2Vec model"""
-        self.model = Word2Vec.load(model_path)
-        self.vocabulary = set(self.model.wv.index_to_key)
+        """Load the word vectors of a saved Word2Vec model (or KeyedVectors)
+
+        Arrays gensim saved to separate .npy files are memory-mapped, so the
+        training weights (syn1neg etc.) of a large model are never read in.
+        """
+        loaded = gensim_utils.SaveLoad.load(model_path, mmap="r")
+        self.model = getattr(loaded, "wv", loaded)
+        del loaded
+        self.vocabulary = set(self.model.index_to_key)
+        self._build_word_matrix()
+        if not self.keep_model:
+            # Otherwise the float32 vectors stay referenced next to their quantized copy
+            self.model = None
+        if self.recipes is not None:
+            self._build_doc_index()
+        self._invalidate_caches()
         
     def load_recipes(self, recipes_path: str):
-        """Load recipes from CSV"""
-        self.recipes = pd.read_csv(recipes_path)
-        # Convert combined_cleaned from string to list if needed
-        if isinstance(self.recipes['combined_cleaned'].iloc[0], str):
-            try:
-                # Try to evaluate the string as a Python list
-                self.recipes['combined_cleaned'] = self.recipes['combined_cleaned'].apply(eval)
-            except:
-                # If that fails, split the string into words
-                self.recipes['combined_cleaned'] = self.recipes['combined_cleaned'].apply(lambda x: x.split())
-        
+        """Load recipes from the cleaned CSV (or .npz), interning the combined_cleaned tokens"""
+        self.recipes, self.recipe_tokens = load_recipe_file(recipes_path)
+        self.cards = RecipeCardStore.from_columns(
+            *[self.recipes[column].fillna("").astype(str).tolist() if column in self.recipes.columns
+              else [""] * len(self.recipes) for column in ("Title", "Image_Name", "Instructions")],
+            self.recipes["index"].to_numpy(dtype=np.int64) if "index" in self.recipes.columns
+            else np.arange(len(self.recipes), dtype=np.int64))
+        if self.word_index is not None:
+            self._build_doc_index()
+        self._invalidate_caches()
+
+    def load_index(self, index_path: str):
+        """Load a prebuilt search index, memory-mapping its arrays read-only"""
+        self.use_index(read_index(index_path))
+        self.index_path = index_path
+
+    def use_index(self, index: SearchIndex):
+        """Serve searches from an already opened (or in-memory) SearchIndex"""
+        self.index_path = None
+        self.model = None
+        self.recipes = None
+        self.recipe_tokens = None
+        self.vocabulary = set(index.vocab)
+        self.word_index = {word: i for i, word in enumerate(index.vocab)}
+        self.word_vectors, self.word_scales = index.word_vectors, index.word_scales
+        if self.vector_dtype is not None and self.vector_dtype != vector_dtype(self.word_vectors):
+            self.word_vectors, self.word_scales = quantize(
+                dequantize(self.word_vectors, self.word_scales), self.vector_dtype)
+        self.word_counts = index.word_counts
+        self.spelling = SpellingIndex(index.vocab, index.word_counts, index.spell_hashes, index.spell_word_ids)
+        self.doc_token_ids = index.doc_token_ids
+        self.doc_offsets = index.doc_offsets
+        if index.term_doc_ids is not None:
+            # Memory-mapped like the rest of the index instead of rebuilt in every worker
+            self.term_doc_ids, self.term_offsets = index.term_doc_ids, index.term_offsets
+        else:
+            self._build_postings()
+        self.delta = DeltaSegment(index.num_docs)
+        self.recipe_metadata = index.metadata
+        self.recipe_ids = index.recipe_ids
+        self.cards = RecipeCardStore.from_metadata(index.metadata, index.recipe_ids)
+        self._invalidate_caches()
+
+    def _invalidate_caches(self):
+        """Forget everything derived from the previously loaded model or recipes"""
+        self.ann_index = None
+        self.query_cache.clear()
+        self.word_cache.clear()
+
+    def save_index(self, index_path: str):
+        """Write the loaded model and recipes (merging any runtime updates first) as a search index"""
+        if self.delta.pending:
+            self.merge_delta()
+        write_index(index_path, index_from_engine(self))
+
+    def add_recipe(self, key, tokens: List[str], metadata: Dict[str, Any] = None) -> int:
+        """Make a recipe searchable right away via the delta segment, replacing any earlier version under key"""
+        word_ids = np.unique([self.word_index[token] for token in tokens if token in self.word_index])
+        doc_id = self.delta.add(key, word_ids.astype(np.int32), metadata)
+        if self.cards is not None:
+            self.cards.add(doc_id, metadata or {})
+        self.query_cache.clear()
+        if self.merger is not None:
+            self.merger.notify()
+        return doc_id
+
+    def remove_recipe(self, key) -> bool:
+        """Drop the recipe added under key from search results"""
+        removed = self.delta.remove(key) is not None
+        if removed:
+            self.query_cache.clear()
+        return removed
+
+    def delete_recipe(self, doc_id: int):
+        """Tombstone a recipe by search id, e.g. one loaded from the CSV or index"""
+        self.delta.delete(doc_id)
+        self.query_cache.clear()
+
+    def merge_delta(self) -> int:
+        """Fold the delta segment into the main CSR arrays and empty tombstoned recipes
+
+        The new arrays are built while searches keep running; only the swap waits
+        for in-flight searches. Returns the number of delta recipes merged.
+        """
+        with self._merge_lock:
+            start_time = time.time()
+            delta = self.delta.snapshot()
+            lengths = np.diff(self.doc_offsets)
+            if delta.deleted is not None:
+                lengths[delta.deleted] = 0
+            num_main = len(lengths)
+            offsets = np.zeros(num_main + len(delta) + 1, dtype=np.int64)
+            np.cumsum(np.concatenate([lengths, np.diff(delta.offsets)]), out=offsets[1:])
+            positions = np.arange(offsets[num_main]) + np.repeat(self.doc_offsets[:-1] - offsets[:num_main], lengths)
+            token_ids = np.concatenate([self.doc_token_ids[positions], delta.token_ids]).astype(np.int32)
+            term_doc_ids, term_offsets = self._postings(token_ids, offsets)
+            # An IVF index in use is rebuilt here (on the merge thread) rather than by the next ANN search
+            ann_index = IVFIndex(self._document_vectors(token_ids, offsets)) if self.ann_index is not None else None
+            with self._segments.write():
+                self.doc_token_ids, self.doc_offsets = token_ids, offsets
+                self.term_doc_ids, self.term_offsets = term_doc_ids, term_offsets
+                self.delta.merged(len(delta))
+                self._invalidate_caches()
+                self.ann_index = ann_index
+            logger.info("Merged %d recipes into the search index in %.2f seconds", len(delta), time.time() - start_time)
+            return len(delta)
+
+    def start_merger(self):
+        """Merge the delta segment in a background thread (see DeltaMerger)"""
+        if self.merger is None:
+            self.merger = DeltaMerger(self, self.merge_interval, self.max_delta)
+
+    def stop_merger(self):
+        if self.merger is not None:
+            self.merger.stop()
+            self.merger = None
+
+    def _build_word_matrix(self):
+        """Build a contiguous matrix of unit-normalized word vectors in vector_dtype"""
+        vectors = np.asarray(self.model.vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.word_index = self.model.key_to_index
+        self.word_vectors, self.word_scales = quantize(np.ascontiguousarray(vectors / norms),
+                                                       self.vector_dtype or "float32")
+        wv = self.model
+        self.word_counts = np.array([wv.get_vecattr(word, "count") for word in wv.index_to_key], dtype=np.int64)
+        self.spelling = SpellingIndex(wv.index_to_key, self.word_counts)
+
+    def quantize_vectors(self, dtype: str):
+        """Convert the loaded word vectors to dtype (float32, float16 or int8) in place"""
+        self.word_vectors, self.word_scales = quantize(dequantize(self.word_vectors, self.word_scales), dtype)
+        self.vector_dtype = dtype
+        self._invalidate_caches()
+
+    def _word_rows(self, ids) -> np.ndarray:
+        """float32 unit word vectors at ids"""
+        return dequantize(self.word_vectors, self.word_scales, ids)
+
+    def _build_doc_index(self):
+        """Build the CSR layout of per-recipe vocabulary ids (doc_offsets[i]:doc_offsets[i+1])"""
+        # Duplicate tokens never change a max similarity, so each id is kept once
+        self.doc_token_ids, self.doc_offsets = self.recipe_tokens.to_word_ids(self.word_index)
+        self._build_postings()
+        self.delta = DeltaSegment(len(self.doc_offsets) - 1)
+
     def _get_document_vector(self, doc: List[str]):
-        """Get the average vector for a document"""
-        vectors = []
-        for word in doc:
-            if word in self.vocabulary:
-                vectors.append(self.model.wv[word])
-        if vectors:
-            return np.mean(vectors, axis=0)
-        return np.zeros(self.model.vector_size)
+        """Get the average (unit-normalized) word vector for a document"""
+        ids = [self.word_index[word] for word in doc if word in self.word_index]
+        if ids:
+            return self._word_rows(ids).mean(axis=0)
+        return np.zeros(self.word_vectors.shape[1], dtype=np.float32)
+
+    def _document_vectors(self, doc_token_ids: np.ndarray = None, doc_offsets: np.ndarray = None) -> np.ndarray:
+        """Mean unit word vector of every recipe's distinct tokens, shape (n, d); the loaded recipes by default"""
+        if doc_token_ids is None:
+            doc_token_ids, doc_offsets = self.doc_token_ids, self.doc_offsets
+        num_docs = len(doc_offsets) - 1
+        doc_vectors = np.zeros((num_docs, self.word_vectors.shape[1]), dtype=np.float32)
+        lengths = np.diff(doc_offsets)
+        for start in range(0, num_docs, DOC_VECTOR_CHUNK):
+            stop = min(start + DOC_VECTOR_CHUNK, num_docs)
+            chunk_lengths = lengths[start:stop]
+            nonempty = chunk_lengths > 0
+            if not nonempty.any():
+                continue
+            tokens = doc_token_ids[doc_offsets[start]:doc_offsets[stop]]
+            local_offsets = doc_offsets[start:stop] - doc_offsets[start]
+            sums = np.add.reduceat(self._word_rows(tokens), local_offsets[nonempty], axis=0)
+            doc_vectors[start:stop][nonempty] = sums / chunk_lengths[nonempty, None]
+        return doc_vectors
+
+    def _ensure_ann_index(self) -> IVFIndex:
+        """Build the IVF index over document vectors on first use"""
+        with self._ann_lock:
+            if self.ann_index is None:
+                self.ann_index = IVFIndex(self._document_vectors())
+            return self.ann_index
         
     def correct_word(self, word: str) -> str:
-        """Correct typos in words using Levenshtein distance"""
-        if word in self.vocabulary:
+        """Correct typos in words using the SymSpell index (Levenshtein distance <= 2)"""
+        if word in self.word_index:
             return word
-        closest_word = min(self.vocabulary, key=lambda x: distance(word, x))
-        return closest_word if distance(word, closest_word) <= 2 else word
+        closest_word = self.spelling.lookup(word)
+        return closest_word if closest_word is not None else word
         
     def preprocess_query(self, query: str) -> str:
         """Preprocess and correct query words"""
         corrected_words = []
         for word in query.split():
-            if word in self.model.wv.index_to_key:  # If word exists in vocabulary, keep it
+            if word in self.word_index:  # If word exists in vocabulary, keep it
                 corrected_words.append(word)
             else:  # Otherwise, attempt to correct it
                 corrected_words.append(self.correct_word(word))
         return ' '.join(corrected_words)
     
     def compute_avg_log_likelihood(self,query, doc, epsilon=1e-10):
+        if self.model is None:
+            raise RuntimeError("compute_avg_log_likelihood needs the gensim model (keep_model=True)")
         similarity_scores = []
         def sigmoid(x):
             return expit(x)
 
         for query_word in query.split():
-            if query_word in self.model.wv:
-                similarities = [self.model.wv.similarity(query_word, doc_word) for doc_word in doc.split() if doc_word in self.model.wv]
-                similarity = sigmoid(max(similarities))
+            if query_word in self.model:
+                word_similarities = [self.model.similarity(query_word, doc_word) for doc_word in doc.split() if doc_word in self.model]
+                similarity = sigmoid(max(word_similarities))
                 similarity_scores.append(similarity)
         avg_similarity = np.mean(similarity_scores)
         avg_similarity = max(avg_similarity, epsilon)
         log_likelihood = np.log(avg_similarity)
         return log_likelihood
 
-    def execute_search_Word2Vec(self, query):
-        relevances = np.zeros(self.recipes.shape[0])
-        for index, row in self.recipes.iterrows():
-            doc_text = ' '.join(row['combined_cleaned'])
-            relevances[index] = self.compute_avg_log_likelihood(query, doc_text)
-        return relevances
+    def _query_token_ids(self, query: str) -> np.ndarray:
+        """Vocabulary ids of the query words, keeping repeats like compute_avg_log_likelihood"""
+        return np.array([self.word_index[word] for word in query.split() if word in self.word_index], dtype=np.int64)
+
+    def _build_postings(self):
+        """Build the inverted index (term_offsets[t]:term_offsets[t+1] into term_doc_ids)"""
+        self.term_doc_ids, self.term_offsets = self._postings(self.doc_token_ids, self.doc_offsets)
+
+    def _postings(self, token_ids: np.ndarray, offsets: np.ndarray):
+        return build_postings(token_ids, offsets, len(self.word_vectors))
+
+    def _candidate_docs(self, query_ids: np.ndarray, query_sims: np.ndarray):
+        """Recipes containing a query word or one of its nearest neighbours, or None to scan everything"""
+        num_words = query_sims.shape[1]
+        terms = [query_ids]
+        if self.candidate_neighbours > 0:
+            n = min(self.candidate_neighbours + 1, num_words)
+            terms.append(np.argpartition(-query_sims, n - 1, axis=1)[:, :n].ravel())
+        terms = np.unique(np.concatenate(terms))
+        postings = [self.term_doc_ids[self.term_offsets[t]:self.term_offsets[t + 1]] for t in terms]
+        doc_ids = np.unique(np.concatenate(postings)) if postings else np.zeros(0, dtype=np.int32)
+        if len(doc_ids) < self.min_candidates:
+            return None
+        return doc_ids
+
+    def _gather_docs(self, doc_ids: np.ndarray):
+        """CSR token layout restricted to doc_ids"""
+        starts = self.doc_offsets[doc_ids]
+        lengths = self.doc_offsets[doc_ids + 1] - starts
+        offsets = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1], lengths)
+        return self.doc_token_ids[positions], offsets
+
+    def _doc_range(self, start: int, stop: int):
+        """CSR token layout of the contiguous recipes start:stop"""
+        token_ids = self.doc_token_ids[self.doc_offsets[start]:self.doc_offsets[stop]]
+        return token_ids, self.doc_offsets[start:stop + 1] - self.doc_offsets[start]
+
+    def _max_similarities(self, query_sims: np.ndarray, token_ids: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Max cosine similarity of each query word against each recipe's tokens, shape (m, n)"""
+        # Recipes without any in-vocabulary token score sigmoid(-inf) = 0
+        max_sims = np.full((len(query_sims), len(offsets) - 1), -np.inf, dtype=np.float32)
+        if len(token_ids) == 0:
+            return max_sims
+        token_sims = query_sims[:, token_ids]
+        nonempty = np.diff(offsets) > 0
+        max_sims[:, nonempty] = np.maximum.reduceat(token_sims, offsets[:-1][nonempty], axis=1)
+        return max_sims
+
+    def _query_similarities(self, query_ids: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query word against the whole vocabulary, shape (m, V)"""
+        return similarities(self.word_vectors, self.word_scales, self._word_rows(query_ids))
+
+    def _score_layout(self, query_sims: np.ndarray, token_ids: np.ndarray, offsets: np.ndarray,
+                      epsilon=1e-10) -> np.ndarray:
+        """Average log-likelihood of the query against recipes in a CSR token layout"""
+        avg_similarity = expit(self._max_similarities(query_sims, token_ids, offsets)).mean(axis=0)
+        return np.log(np.maximum(avg_similarity, epsilon))
+
+    def _score_docs(self, query_sims: np.ndarray, doc_ids: np.ndarray = None, epsilon=1e-10) -> np.ndarray:
+        """Average log-likelihood of the query against doc_ids (default: every recipe)"""
+        if doc_ids is None:
+            token_ids, offsets = self.doc_token_ids, self.doc_offsets
+        else:
+            token_ids, offsets = self._gather_docs(doc_ids)
+        return self._score_layout(query_sims, token_ids, offsets, epsilon)
+
+    def _shard_ranges(self, num_docs: int) -> List[tuple]:
+        """Contiguous (start, stop) recipe ranges, one per shard"""
+        num_shards = max(1, min(self.num_shards, num_docs // MIN_SHARD_DOCS))
+        bounds = np.linspace(0, num_docs, num_shards + 1).astype(np.int64)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _map_shards(self, fn, ranges: List[tuple]) -> list:
+        """fn(start, stop) for every range, in parallel when there is more than one"""
+        if len(ranges) == 1:
+            return [fn(*ranges[0])]
+        with self._shard_lock:
+            if self._shard_pool is None:
+                self._shard_pool = ThreadPoolExecutor(self.num_shards, thread_name_prefix="search-shard")
+        return list(self._shard_pool.map(lambda bounds: fn(*bounds), ranges))
+
+    @staticmethod
+    def _mask_deleted(scores: np.ndarray, deleted: np.ndarray, doc_ids) -> np.ndarray:
+        """Score tombstoned recipes -inf so they rank after (and are dropped from) live results"""
+        if deleted is not None:
+            scores[deleted[doc_ids]] = -np.inf
+        return scores
+
+    def _range_top(self, query_sims: np.ndarray, start: int, stop: int, size: int, deleted: np.ndarray = None):
+        """Best size recipes of start:stop, scored in chunks of score_chunk_size"""
+        chunk_size = self.score_chunk_size or max(stop - start, 1)
+        heap = StreamingTopK(size)
+        for chunk_start in range(start, stop, chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, stop)
+            token_ids, offsets = self._doc_range(chunk_start, chunk_stop)
+            scores = self._mask_deleted(self._score_layout(query_sims, token_ids, offsets),
+                                        deleted, slice(chunk_start, chunk_stop))
+            heap.push(scores, np.arange(chunk_start, chunk_stop))
+        return heap.result()
+
+    def _word_likelihoods(self, word_ids: np.ndarray, word_sims: np.ndarray, doc_ids: np.ndarray = None) -> np.ndarray:
+        """sigmoid(max similarity) of each distinct query word against doc_ids (default: every recipe)
+
+        Full-corpus vectors come from, and are added to, the per-word cache; candidate
+        subsets only slice cached vectors and compute the missing words on the subset.
+        """
+        num_docs = len(self.doc_offsets) - 1 if doc_ids is None else len(doc_ids)
+        likelihoods = np.empty((len(word_ids), num_docs), dtype=np.float32)
+        missing = []
+        for row, word_id in enumerate(word_ids):
+            cached = self.word_cache.get(int(word_id))
+            if cached is None:
+                missing.append(row)
+            else:
+                likelihoods[row] = cached if doc_ids is None else cached[doc_ids]
+        if not missing:
+            return likelihoods
+
+        missing_sims = word_sims[missing]
+        if doc_ids is not None:
+            token_ids, offsets = self._gather_docs(doc_ids)
+            likelihoods[missing] = expit(self._max_similarities(missing_sims, token_ids, offsets))
+            return likelihoods
+        chunk_size = self.score_chunk_size or max(num_docs, 1)
+
+        def fill(shard_start, shard_stop):
+            # Shards write disjoint column ranges of likelihoods
+            for start in range(shard_start, shard_stop, chunk_size):
+                stop = min(start + chunk_size, shard_stop)
+                token_ids, offsets = self._doc_range(start, stop)
+                likelihoods[missing, start:stop] = expit(self._max_similarities(missing_sims, token_ids, offsets))
+
+        self._map_shards(fill, self._shard_ranges(num_docs))
+        for row in missing:
+            self.word_cache.put(int(word_ids[row]), likelihoods[row].copy())
+        return likelihoods
+
+    def _top_docs(self, query_ids: np.ndarray, query_sims: np.ndarray, doc_ids: np.ndarray,
+                  top_k: int, offset: int = 0, deleted: np.ndarray = None, epsilon=1e-10):
+        """Recipe ids and scores of the requested page among doc_ids (default: every recipe)
+
+        doc_ids must be sorted so that ties fall back to the lower recipe index.
+        Recipes flagged in deleted score -inf.
+        """
+        if self.word_cache.enabled:
+            # Assemble the query from per-word vectors; repeated words keep their weight
+            word_ids, first_rows, inverse = np.unique(query_ids, return_index=True, return_inverse=True)
+            weights = (np.bincount(inverse, minlength=len(word_ids)) / len(query_ids)).astype(np.float32)
+            likelihoods = self._word_likelihoods(word_ids, query_sims[first_rows], doc_ids)
+            scores = np.log(np.maximum(weights @ likelihoods, epsilon))
+            self._mask_deleted(scores, deleted, slice(None) if doc_ids is None else doc_ids)
+            top = top_k_indices(scores, top_k, offset)
+            return (top if doc_ids is None else doc_ids[top]), scores[top]
+
+        num_docs = len(self.doc_offsets) - 1 if doc_ids is None else len(doc_ids)
+        if doc_ids is None:
+            # Each shard keeps its own best offset + top_k; the merge picks the page
+            heap = StreamingTopK(top_k, offset)
+            for shard_ids, shard_scores in self._map_shards(
+                    lambda start, stop: self._range_top(query_sims, start, stop, offset + top_k, deleted),
+                    self._shard_ranges(num_docs)):
+                heap.push(shard_scores, shard_ids)
+            return heap.result()
+
+        if not self.score_chunk_size or num_docs <= self.score_chunk_size:
+            scores = self._mask_deleted(self._score_docs(query_sims, doc_ids), deleted, doc_ids)
+            top = top_k_indices(scores, top_k, offset)
+            return doc_ids[top], scores[top]
+
+        # Score in chunks so the (query words x tokens) buffer stays bounded
+        heap = StreamingTopK(top_k, offset)
+        for start in range(0, num_docs, self.score_chunk_size):
+            chunk_ids = doc_ids[start:start + self.score_chunk_size]
+            token_ids, offsets = self._gather_docs(chunk_ids)
+            heap.push(self._mask_deleted(self._score_layout(query_sims, token_ids, offsets), deleted, chunk_ids),
+                      chunk_ids)
+        return heap.result()
+
+    def execute_search_Word2Vec(self, query, doc_ids: np.ndarray = None, epsilon=1e-10):
+        """Vectorized compute_avg_log_likelihood of the query against doc_ids (default: every recipe)"""
+        query_ids = self._query_token_ids(query)
+        if len(query_ids) == 0:
+            num_docs = len(self.doc_offsets) - 1 if doc_ids is None else len(doc_ids)
+            return np.full(num_docs, np.log(epsilon))
+        return self._score_docs(self._query_similarities(query_ids), doc_ids, epsilon)
         
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Execute search and return top k results"""
-        start_time = time.time()
+    def _ann_candidates(self, query_ids: np.ndarray, k: int, delta) -> np.ndarray:
+        """Live recipe ids of the approximate top k document vectors for the query"""
+        query_vector = self._word_rows(query_ids).mean(axis=0)
+        # Over-fetch by the tombstone count so deletions do not shorten the candidate set
+        doc_ids, _ = self._ensure_ann_index().search(query_vector, k + delta.num_deleted, self.ann_n_probe)
+        if delta.deleted is not None:
+            doc_ids = doc_ids[~delta.deleted[doc_ids]]
+        return doc_ids[:k]
+
+    def _ann_search(self, query_ids: np.ndarray, k: int, delta) -> np.ndarray:
+        """Live recipe ids of the approximate top k document vectors, delta segment included"""
+        query_vector = self._word_rows(query_ids).mean(axis=0)
+        doc_ids, scores = self._ensure_ann_index().search(query_vector, k + delta.num_deleted, self.ann_n_probe)
+        if delta.deleted is not None:
+            live = ~delta.deleted[doc_ids]
+            doc_ids, scores = doc_ids[live], scores[live]
+        if len(delta):
+            # The delta is small enough to compare every document vector exactly
+            delta_scores = delta.doc_vectors(self._word_rows) @ (query_vector / (np.linalg.norm(query_vector) or 1.0))
+            doc_ids = np.concatenate([doc_ids, delta.doc_ids[delta.live]])
+            scores = np.concatenate([scores, delta_scores[delta.live]])
+        top = top_k_indices(scores, k)
+        return doc_ids[top], scores[top]
+
+    def _delta_scores(self, delta, query_sims: np.ndarray = None, epsilon=1e-10):
+        """Recipe ids and scores of the delta segment, -inf for deleted slots"""
+        if query_sims is None or len(delta) == 0:
+            scores = np.full(len(delta), np.log(epsilon))
+        else:
+            scores = self._score_layout(query_sims, delta.token_ids, delta.offsets, epsilon)
+        scores[~delta.live] = -np.inf
+        return delta.doc_ids, scores
+
+    @staticmethod
+    def _page(main, extra, top_k: int, offset: int) -> SearchResults:
+        """Requested page of live recipes from ranked main-index results plus delta results"""
+        doc_ids = np.concatenate([main[0], extra[0]]).astype(np.int64)
+        scores = np.concatenate([main[1], extra[1]])
+        live = scores > -np.inf
+        top = top_k_indices(scores[live], top_k, offset)
+        return SearchResults(doc_ids[live][top], scores[live][top])
+
+    def search(self, query: str, top_k: int = 5, mode: str = "exact", offset: int = 0) -> List[int]:
+        """Execute search and return the recipe ids of the top k results after skipping offset"""
+        return self.search_results(query, top_k, mode, offset).doc_ids.tolist()
+
+    def search_json(self, query: str, top_k: int = 5, mode: str = "exact", offset: int = 0) -> bytes:
+        """Search response body: {"result": [ids], "recipes": [cards with relevance scores]}"""
+        results = self.search_results(query, top_k, mode, offset)
+        with SEARCH_STAGE_SECONDS.time(stage="serialization"):
+            cards = self.cards.encode(results) if self.cards is not None else b"[]"
+            return b'{"result":' + orjson.dumps(results.doc_ids.tolist()) + b',"recipes":' + cards + b"}"
+
+    def search_results(self, query: str, top_k: int = 5, mode: str = "exact", offset: int = 0) -> SearchResults:
+        """Recipe ids and relevance scores of the top k results after skipping offset
+
+        mode is "exact" (log-likelihood scoring), "ann" (document-vector IVF lookup, scored
+        by cosine similarity) or "ann_rerank" (IVF lookup of ann_rerank_factor * top_k
+        recipes rescored exactly).
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        start_time = time.perf_counter()
         
         # Preprocess query
-        query = self.preprocess_query(query)
-        print(query)
-        # query_vector = self._get_document_vector(query.split())
-        # query = preprocess_query(query)
-        
-        relevance_scores = self.execute_search_Word2Vec(query)
-        print(relevance_scores)
-            
-        # similarities = np.array(similarities)
-        # similarities = expit(similarities)  # Apply sigmoid
-        
-        # Get top k results
-        # top_indices = np.argsort(similarities)[-top_k:][::-1]
-        sorted_indices = np.argsort(relevance_scores)[::-1][:top_k]
-        print(sorted_indices)
-        return sorted_indices.tolist()
+        with SEARCH_STAGE_SECONDS.time(stage="typo_correction"):
+            query = self.preprocess_query(query)
+        logger.debug("Searching for %r (mode=%s, top_k=%d, offset=%d)", query, mode, top_k, offset)
 
+        cache_key = (query, top_k, mode, offset)
+        # Read before searching: a recipe update clearing the cache meanwhile makes this result stale
+        generation = self.query_cache.generation
+        results = self.query_cache.get(cache_key)
+        SEARCHES_TOTAL.inc(mode=mode, cache="miss" if results is None else "hit")
+        if results is None:
+            results = self._run_search(query, top_k, mode, offset)
+            self.query_cache.put(cache_key, results, generation)
+        SEARCH_SECONDS.observe(time.perf_counter() - start_time, mode=mode)
+        return results
+
+    def _run_search(self, query: str, top_k: int, mode: str, offset: int) -> SearchResults:
+        """Search for an already preprocessed query, bypassing the result cache"""
+        with self._segments.read():
+            delta = self.delta.snapshot()
+            query_ids = self._query_token_ids(query)
+
+            if mode == "ann" and len(query_ids) > 0:
+                with SEARCH_STAGE_SECONDS.time(stage="candidate_generation"):
+                    doc_ids, scores = self._ann_search(query_ids, offset + top_k, delta)
+                return SearchResults(doc_ids[offset:], scores[offset:])
+
+            if len(query_ids) == 0:
+                # Nothing to score against: every live recipe ties at log(epsilon)
+                with SEARCH_STAGE_SECONDS.time(stage="scoring"):
+                    relevance_scores = self._mask_deleted(self.execute_search_Word2Vec(query), delta.deleted, slice(None))
+                with SEARCH_STAGE_SECONDS.time(stage="top_k"):
+                    top = top_k_indices(relevance_scores, offset + top_k)
+                    return self._page((top, relevance_scores[top]), self._delta_scores(delta), top_k, offset)
+
+            # Only score recipes sharing a word (or a close neighbour) with the query
+            with SEARCH_STAGE_SECONDS.time(stage="candidate_generation"):
+                doc_ids = None
+                query_sims = self._query_similarities(query_ids)
+                if mode == "ann_rerank":
+                    num_candidates = (offset + top_k) * self.ann_rerank_factor
+                    doc_ids = np.sort(self._ann_candidates(query_ids, num_candidates, delta))
+                elif self.prune_candidates:
+                    doc_ids = self._candidate_docs(query_ids, query_sims)
+                    if doc_ids is not None and len(doc_ids) < offset + top_k + delta.num_deleted:
+                        doc_ids = None
+
+            # Score the main index (chunked scans keep their best hits in a heap as they go),
+            # then pick the page from those hits and the delta segment
+            with SEARCH_STAGE_SECONDS.time(stage="scoring"):
+                main = self._top_docs(query_ids, query_sims, doc_ids, offset + top_k, 0, delta.deleted)
+                extra = self._delta_scores(delta, query_sims)
+            with SEARCH_STAGE_SECONDS.time(stage="top_k"):
+                results = self._page(main, extra, top_k, offset)
+            logger.debug("Top recipes: %s", results.doc_ids)
+            return results
         
-        # results = []
-        # for idx in top_indices:
-        #     recipe = self.recipes.iloc[idx]
-        #     results.append({
-        #         'Title': recipe['Title'],
-        #         'Image_Name': recipe['Image_Name'],
-        #         'Instructions': recipe['Instructions'],
-        #         'index': recipe['index'],
-        #         'relevance_score': float(similarities[idx])
-        #     })
-            
-        # print(f"Search completed in {time.time() - start_time:.2f} seconds")
-        # return results
-        return top_indices
-        
+    def search_many(self, queries: List[str], top_k: int = 5, offset: int = 0, epsilon=1e-10) -> List[List[int]]:
+        """Exact top k recipes for many queries, scoring each group of queries in one corpus pass
+
+        The distinct words of a group of batch_size queries are scored against every
+        recipe together, and each query's scores are a weighted sum of those rows.
+        Unlike search(), there is no candidate pruning or result caching.
+        """
+        with SEARCH_SECONDS.time(mode="batch"):
+            with SEARCH_STAGE_SECONDS.time(stage="typo_correction"):
+                processed = [self.preprocess_query(query) for query in queries]
+            with self._segments.read():
+                return self._search_groups(processed, top_k, offset, epsilon)
+
+    def _search_groups(self, processed: List[str], top_k: int, offset: int, epsilon=1e-10) -> List[List[int]]:
+        delta = self.delta.snapshot()
+        num_docs = len(self.doc_offsets) - 1
+        results = []
+        for group_start in range(0, len(processed), self.batch_size):
+            group = [self._query_token_ids(query) for query in processed[group_start:group_start + self.batch_size]]
+            known = [ids for ids in group if len(ids) > 0]
+            word_ids = np.unique(np.concatenate(known)) if known else np.zeros(0, dtype=np.int64)
+            # weights[q, w]: share of query q's words that are word_ids[w], so weights @ likelihoods is the mean
+            rows = np.repeat(np.arange(len(group)), [len(ids) for ids in group])
+            columns = np.searchsorted(word_ids, np.concatenate(group)) if known else np.zeros(0, dtype=np.int64)
+            shares = np.concatenate([np.full(len(ids), 1.0 / len(ids), dtype=np.float32) for ids in group if len(ids) > 0]) \
+                if known else np.zeros(0, dtype=np.float32)
+            weights = csr_matrix((shares, (rows, columns)), shape=(len(group), len(word_ids)))
+            word_sims = self._query_similarities(word_ids)
+            # Keep the (distinct words x chunk tokens) similarity buffer around BATCH_BUFFER_ELEMENTS
+            tokens_per_doc = max(len(self.doc_token_ids) / max(num_docs, 1), 1.0)
+            chunk_size = int(max(1, BATCH_BUFFER_ELEMENTS // (max(len(word_ids), 1) * tokens_per_doc)))
+            if self.score_chunk_size:
+                chunk_size = min(chunk_size, self.score_chunk_size)
+
+            # Scores are buffered over spans of several chunks before being offered to the heaps
+            span_size = max(chunk_size, BATCH_BUFFER_ELEMENTS // len(group))
+
+            def shard_top(shard_start, shard_stop):
+                heaps = [StreamingTopK(offset + top_k) for _ in group]
+                for span_start in range(shard_start, shard_stop, span_size):
+                    span_stop = min(span_start + span_size, shard_stop)
+                    scores = np.empty((len(group), span_stop - span_start), dtype=np.float32)
+                    for start in range(span_start, span_stop, chunk_size):
+                        stop = min(start + chunk_size, span_stop)
+                        token_ids, offsets = self._doc_range(start, stop)
+                        likelihoods = expit(self._max_similarities(word_sims, token_ids, offsets))
+                        scores[:, start - span_start:stop - span_start] = np.log(
+                            np.maximum(np.asarray(weights @ likelihoods), epsilon))
+                    if delta.deleted is not None:
+                        scores[:, delta.deleted[span_start:span_stop]] = -np.inf
+                    span_ids = np.arange(span_start, span_stop)
+                    for heap, query_scores in zip(heaps, scores):
+                        heap.push(query_scores, span_ids)
+                return [heap.result() for heap in heaps]
+
+            shard_results = self._map_shards(shard_top, self._shard_ranges(num_docs))
+            delta_scores = None
+            if len(delta):
+                likelihoods = expit(self._max_similarities(word_sims, delta.token_ids, delta.offsets))
+                delta_scores = np.log(np.maximum(np.asarray(weights @ likelihoods), epsilon))
+                delta_scores[:, ~delta.live] = -np.inf
+            for row in range(len(group)):
+                heap = StreamingTopK(top_k, offset)
+                for shard in shard_results:
+                    heap.push(shard[row][1], shard[row][0])
+                if delta_scores is not None:
+                    heap.push(delta_scores[row], delta.doc_ids)
+                doc_ids, scores = heap.result()
+                results.append(doc_ids[scores > -np.inf].tolist())
+        return results
+
+    def ann_recall_at_k(self, queries: List[str], top_k: int = 10) -> Dict[str, float]:
+        """Mean recall@k of the ANN modes against exact scoring without candidate pruning"""
+        queries = [self.preprocess_query(query) for query in queries]
+        prune_candidates = self.prune_candidates
+        self.prune_candidates = False
+        try:
+            exact = [set(self._run_search(query, top_k, "exact", 0).doc_ids.tolist()) for query in queries]
+        finally:
+            self.prune_candidates = prune_candidates
+        report = {}
+        for mode in ("ann", "ann_rerank"):
+            recalls = [len(expected & set(self._run_search(query, top_k, mode, 0).doc_ids.tolist())) / max(len(expected), 1)
+                       for query, expected in zip(queries, exact)]
+            report[mode] = float(np.mean(recalls)) if recalls else 0.0
+        return report
+
+    def vector_agreement(self, queries: List[str], dtype: str, top_k: int = 10) -> Dict[str, float]:
+        """Ranking agreement of exact search with word vectors in dtype against the current vectors
+
+        The engine is left with its current vectors; the query cache is bypassed.
+        """
+        queries = [self.preprocess_query(query) for query in queries]
+        reference = [self._run_search(query, top_k, "exact", 0).doc_ids.tolist() for query in queries]
+        stored = self.word_vectors, self.word_scales, self.vector_dtype
+        with self._segments.write():
+            self.quantize_vectors(dtype)
+        try:
+            results = [self._run_search(query, top_k, "exact", 0).doc_ids.tolist() for query in queries]
+        finally:
+            with self._segments.write():
+                self.word_vectors, self.word_scales, self.vector_dtype = stored
+                self._invalidate_caches()
+        return ranking_agreement(reference, results)
+
     def save_model(self, model_path: str):
-        """Save the model"""
+        """Save the word vectors (gensim KeyedVectors, readable by load_model)"""
         if self.model:
             self.model.save(model_path) 
\ No newline at end of file
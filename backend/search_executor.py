@@ -0,0 +1,138 @@
+"""
+Runs blocking OptimizedSearchEngine calls off the asyncio event loop.
+
+A thread pool suits the NumPy scoring path, which releases the GIL inside its
+kernels. A process pool sidesteps the GIL entirely; each worker opens the
+memory-mapped search index, so the arrays are shared through the page cache.
+Requests beyond max_workers + max_queue are rejected instead of queued.
+swap_engine() moves new requests to a replacement engine (or worker pool)
+while requests already running finish on the old one.
+"""
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from search_engine import OptimizedSearchEngine
+from search_reload import EngineSlot
+
+EXECUTOR_KINDS = ("thread", "process")
+
+# Engine owned by a process-pool worker
+_worker_engine = None
+
+
+class SearchOverloadedError(Exception):
+    """Raised when every worker is busy and the request queue is full"""
+
+
+class SearchTimeoutError(Exception):
+    """Raised when a search does not finish within the per-request timeout"""
+
+
+def _init_worker(index_path: str):
+    global _worker_engine
+    _worker_engine = OptimizedSearchEngine(index_path=index_path)
+
+
+def _call_worker_engine(method: str, args: tuple):
+    return getattr(_worker_engine, method)(*args)
+
+
+class SearchExecutor:
+    """Bounded pool running engine methods for async request handlers"""
+
+    def __init__(self, engine: OptimizedSearchEngine, kind: str = "thread", max_workers: int = 4,
+                 max_queue: int = 32, timeout: float = 10.0, index_path: str = None):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind {kind!r}, expected one of {EXECUTOR_KINDS}")
+        if kind == "process" and not index_path:
+            raise ValueError("The process executor needs a prebuilt search index (index_path)")
+        self.slot = EngineSlot(engine)
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.index_path = index_path
+        if kind == "process":
+            self._pool = self._process_pool(index_path)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="search")
+        # Counts work until the pool finishes it, even if the caller already timed out
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.timeouts = 0
+
+    @property
+    def engine(self) -> OptimizedSearchEngine:
+        return self.slot.engine
+
+    def _process_pool(self, index_path: str) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.max_workers, initializer=_init_worker, initargs=(index_path,))
+
+    def _call_engine(self, method: str, args: tuple):
+        with self.slot.lease() as engine:
+            return getattr(engine, method)(*args)
+
+    def swap_engine(self, engine: OptimizedSearchEngine, index_path: str = None) -> OptimizedSearchEngine:
+        """Route new requests to engine and return the previous one
+
+        The process kind starts a fresh worker pool on index_path; the old pool
+        finishes the searches it already accepted and then exits.
+        """
+        if self.kind == "process":
+            if not index_path:
+                raise ValueError("The process executor needs a prebuilt search index (index_path)")
+            pool = self._process_pool(index_path)
+            # Start every worker (and load its index) before it takes traffic
+            for future in [pool.submit(_call_worker_engine, "preprocess_query", ("",))
+                           for _ in range(self.max_workers)]:
+                future.result()
+            old_pool, self._pool = self._pool, pool
+            self.index_path = index_path
+            old_pool.shutdown(wait=False)
+        return self.slot.swap(engine)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+
+    async def submit(self, method: str, *args):
+        """Run engine.<method>(*args) on the pool and await its result"""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise SearchOverloadedError(f"{self._in_flight} searches already in flight")
+            self._in_flight += 1
+        try:
+            if self.kind == "process":
+                future = self._pool.submit(_call_worker_engine, method, args)
+            else:
+                future = self._pool.submit(self._call_engine, method, args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise SearchTimeoutError(f"Search did not finish within {self.timeout} seconds")
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,251 @@
+"""
+On-disk search index for OptimizedSearchEngine.
+
+An index is a directory holding a JSON manifest plus flat binary arrays
+(vocabulary table, unit-normalized word vectors, per-recipe token offsets,
+the inverted index, the typo-correction delete table and recipe metadata). Word vectors are
+float32, float16, or int8 with a word_scales array (see quantized_vectors.py). Arrays are opened with
+np.memmap in read-only mode so every uvicorn worker shares the same pages
+through the OS page cache. Indexes written before the inverted index was
+stored have it rebuilt at load time.
+
+The index path is a symlink to a versioned directory (search_index ->
+search_index.v<ns>). write_index fills a new version and then repoints the
+link with os.replace, so readers see either the old or the new index, never a
+missing one. The previous version is kept for readers that resolved the link
+just before the swap; older ones are removed.
+"""
+import glob
+import json
+import os
+import shutil
+import time
+from typing import Dict, List
+
+import numpy as np
+
+FORMAT_VERSION = 3
+# Version 2 indexes are version 3 indexes with float32 vectors
+READABLE_FORMAT_VERSIONS = (2, 3)
+MANIFEST_FILE = "manifest.json"
+VOCAB_FILE = "vocab.txt"
+# Recipe columns kept for display; everything else in the CSV is dropped
+METADATA_COLUMNS = ["Title", "Image_Name", "Instructions"]
+# Pre-encoded JSON result cards (see recipe_cards.py)
+CARD_COLUMN = "Card"
+
+
+class StringColumn:
+    """Read-only column of UTF-8 strings stored as one byte blob plus offsets"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        return [self[i] for i in range(len(self))]
+
+
+class SearchIndex:
+    """Arrays needed to serve searches, as loaded from (or written to) disk"""
+
+    def __init__(self, vocab: List[str], word_vectors: np.ndarray, word_counts: np.ndarray,
+                 doc_token_ids: np.ndarray, doc_offsets: np.ndarray,
+                 metadata: Dict[str, StringColumn], recipe_ids: np.ndarray,
+                 spell_hashes: np.ndarray, spell_word_ids: np.ndarray, word_scales: np.ndarray = None,
+                 term_doc_ids: np.ndarray = None, term_offsets: np.ndarray = None):
+        self.vocab = vocab
+        self.word_vectors = word_vectors
+        # Per-row scales of int8 word vectors, None otherwise
+        self.word_scales = word_scales
+        self.word_counts = word_counts
+        self.doc_token_ids = doc_token_ids
+        self.doc_offsets = doc_offsets
+        self.metadata = metadata
+        self.recipe_ids = recipe_ids
+        self.spell_hashes = spell_hashes
+        self.spell_word_ids = spell_word_ids
+        # Inverted index (see build_postings), None when not stored
+        self.term_doc_ids = term_doc_ids
+        self.term_offsets = term_offsets
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_offsets) - 1
+
+
+def build_postings(doc_token_ids: np.ndarray, doc_offsets: np.ndarray, num_words: int):
+    """Inverted index of a CSR token layout: term_offsets[t]:term_offsets[t+1] into term_doc_ids"""
+    doc_ids = np.repeat(np.arange(len(doc_offsets) - 1, dtype=np.int32), np.diff(doc_offsets))
+    order = np.argsort(doc_token_ids, kind="stable")
+    counts = np.bincount(doc_token_ids, minlength=num_words)
+    term_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=term_offsets[1:])
+    return doc_ids[order], term_offsets
+
+
+def _write_array(directory: str, name: str, array: np.ndarray) -> Dict[str, object]:
+    array = np.ascontiguousarray(array)
+    array.tofile(os.path.join(directory, name + ".bin"))
+    return {"dtype": array.dtype.str, "shape": list(array.shape)}
+
+
+def _open_array(directory: str, name: str, spec: Dict[str, object]) -> np.ndarray:
+    shape = tuple(spec["shape"])
+    if 0 in shape:
+        # np.memmap refuses zero-length files
+        return np.zeros(shape, dtype=np.dtype(spec["dtype"]))
+    return np.memmap(os.path.join(directory, name + ".bin"), dtype=np.dtype(spec["dtype"]), mode="r", shape=shape)
+
+
+def encode_strings(values: List[str]):
+    """UTF-8 byte blob plus int64 offsets, the layout read back by StringColumn"""
+    encoded = [str(value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def write_index(path: str, index: SearchIndex):
+    """Write the index to a new version directory and atomically point path at it"""
+    path = os.path.abspath(path)
+    tmp_path = f"{path}.v{time.time_ns()}"
+    os.makedirs(tmp_path)
+
+    with open(os.path.join(tmp_path, VOCAB_FILE), "w", encoding="utf-8") as f:
+        f.write("\n".join(index.vocab))
+
+    arrays = {
+        "word_vectors": _write_array(tmp_path, "word_vectors", index.word_vectors),
+        "word_counts": _write_array(tmp_path, "word_counts", index.word_counts.astype(np.int64)),
+        "doc_token_ids": _write_array(tmp_path, "doc_token_ids", index.doc_token_ids.astype(np.int32)),
+        "doc_offsets": _write_array(tmp_path, "doc_offsets", index.doc_offsets.astype(np.int64)),
+        "recipe_ids": _write_array(tmp_path, "recipe_ids", index.recipe_ids.astype(np.int64)),
+        "spell_hashes": _write_array(tmp_path, "spell_hashes", index.spell_hashes.astype(np.uint32)),
+        "spell_word_ids": _write_array(tmp_path, "spell_word_ids", index.spell_word_ids.astype(np.int32)),
+    }
+    term_doc_ids, term_offsets = index.term_doc_ids, index.term_offsets
+    if term_doc_ids is None:
+        term_doc_ids, term_offsets = build_postings(index.doc_token_ids, index.doc_offsets, len(index.vocab))
+    arrays["term_doc_ids"] = _write_array(tmp_path, "term_doc_ids", term_doc_ids.astype(np.int32))
+    arrays["term_offsets"] = _write_array(tmp_path, "term_offsets", term_offsets.astype(np.int64))
+    if index.word_scales is not None:
+        arrays["word_scales"] = _write_array(tmp_path, "word_scales", index.word_scales.astype(np.float32))
+    for column, values in index.metadata.items():
+        data, offsets = encode_strings(values.tolist() if isinstance(values, StringColumn) else values)
+        arrays[f"meta_{column}"] = _write_array(tmp_path, f"meta_{column}", data)
+        arrays[f"meta_{column}_offsets"] = _write_array(tmp_path, f"meta_{column}_offsets", offsets)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "num_words": len(index.vocab),
+        "num_docs": index.num_docs,
+        "vector_size": int(index.word_vectors.shape[1]) if index.word_vectors.ndim == 2 else 0,
+        "vector_dtype": np.dtype(index.word_vectors.dtype).name,
+        "metadata_columns": list(index.metadata),
+        "arrays": arrays,
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    _publish(path, tmp_path)
+
+
+def _publish(path: str, version_path: str):
+    """Point the path symlink at version_path, keeping only the version it replaces"""
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and previous is None:
+        # A plain directory written before indexes were versioned; only this first swap leaves a gap
+        os.rename(path, f"{path}.v0")
+        previous = f"{path}.v0"
+    link_path = f"{path}.link"
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    os.symlink(os.path.basename(version_path), link_path)
+    os.replace(link_path, path)
+    keep = {version_path, previous}
+    for stale in glob.glob(glob.escape(path) + ".v*"):
+        if stale not in keep:
+            shutil.rmtree(stale, ignore_errors=True)
+
+
+def read_index(path: str) -> SearchIndex:
+    """Open an index directory with every array memory-mapped read-only"""
+    # Resolve the version once, so a concurrent write_index cannot mix two versions
+    path = os.path.realpath(path)
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") not in READABLE_FORMAT_VERSIONS:
+        raise ValueError(
+            f"Search index at {path} has format version {manifest.get('format_version')}, "
+            f"expected {FORMAT_VERSION}; rebuild it with build_index.py"
+        )
+
+    with open(os.path.join(path, VOCAB_FILE), encoding="utf-8") as f:
+        vocab = f.read().split("\n") if manifest["num_words"] else []
+
+    arrays = manifest["arrays"]
+    metadata = {
+        column: StringColumn(
+            _open_array(path, f"meta_{column}", arrays[f"meta_{column}"]),
+            _open_array(path, f"meta_{column}_offsets", arrays[f"meta_{column}_offsets"]),
+        )
+        for column in manifest["metadata_columns"]
+    }
+    return SearchIndex(
+        vocab=vocab,
+        word_vectors=_open_array(path, "word_vectors", arrays["word_vectors"]),
+        word_counts=_open_array(path, "word_counts", arrays["word_counts"]),
+        doc_token_ids=_open_array(path, "doc_token_ids", arrays["doc_token_ids"]),
+        doc_offsets=_open_array(path, "doc_offsets", arrays["doc_offsets"]),
+        metadata=metadata,
+        recipe_ids=_open_array(path, "recipe_ids", arrays["recipe_ids"]),
+        spell_hashes=_open_array(path, "spell_hashes", arrays["spell_hashes"]),
+        spell_word_ids=_open_array(path, "spell_word_ids", arrays["spell_word_ids"]),
+        word_scales=_open_array(path, "word_scales", arrays["word_scales"]) if "word_scales" in arrays else None,
+        term_doc_ids=_open_array(path, "term_doc_ids", arrays["term_doc_ids"]) if "term_doc_ids" in arrays else None,
+        term_offsets=_open_array(path, "term_offsets", arrays["term_offsets"]) if "term_offsets" in arrays else None,
+    )
+
+
+def index_from_engine(engine) -> SearchIndex:
+    """Snapshot the arrays of a loaded engine, whether it was built from the model and CSV or an index"""
+    word_index = engine.word_index
+    num_docs = len(engine.doc_offsets) - 1
+    if engine.recipes is not None:
+        recipes = engine.recipes
+        base = {column: recipes[column].fillna("").astype(str).tolist()
+                for column in METADATA_COLUMNS if column in recipes.columns}
+        recipe_ids = (recipes["index"].to_numpy(dtype=np.int64) if "index" in recipes.columns
+                      else np.arange(len(recipes), dtype=np.int64))
+    else:
+        base = {column: engine.recipe_metadata[column].tolist()
+                for column in METADATA_COLUMNS if column in engine.recipe_metadata}
+        recipe_ids = np.asarray(engine.recipe_ids, dtype=np.int64)
+    # Recipes added at runtime and already merged follow the loaded ones
+    added = [engine.delta.metadata.get(doc_id, {}) for doc_id in range(len(recipe_ids), num_docs)]
+    metadata = {column: values + [str(info.get(column, "")) for info in added] for column, values in base.items()}
+    # Database recipes have no dataset index; their primary key stays in their stored card
+    recipe_ids = np.concatenate([recipe_ids, np.array([info.get("index", -1) for info in added], dtype=np.int64)])
+    if engine.cards is not None:
+        metadata[CARD_COLUMN] = engine.cards.column(num_docs)
+    return SearchIndex(
+        vocab=sorted(word_index, key=word_index.get),
+        word_vectors=engine.word_vectors,
+        word_counts=engine.word_counts,
+        doc_token_ids=engine.doc_token_ids,
+        doc_offsets=engine.doc_offsets,
+        metadata=metadata,
+        recipe_ids=recipe_ids,
+        spell_hashes=engine.spelling.hashes,
+        spell_word_ids=engine.spelling.word_ids,
+        word_scales=engine.word_scales,
+        term_doc_ids=engine.term_doc_ids,
+        term_offsets=engine.term_offsets,
+    )
@@ -0,0 +1,215 @@
+"""
+Zero-downtime replacement of the search engine.
+
+SearchReloader builds a new OptimizedSearchEngine in a background thread while
+the current one keeps serving, warms it up, swaps it into the SearchExecutor
+and then waits for searches still running on the old engine before letting it
+go. Reloads can be triggered explicitly (the admin endpoint in main.py) or by
+watching the model, recipe and index files for changes.
+
+A prebuilt index takes precedence over the model and recipes it was built
+from, so a reload naming a model or recipes file (or triggered by a change to
+one) builds from those files without the index; see engine_sources.
+"""
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EngineSlot:
+    """Reference to the engine serving searches, with per-engine in-flight counts"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._condition = threading.Condition()
+        self._in_flight: Dict[int, int] = {}
+
+    @contextmanager
+    def lease(self):
+        """The current engine, counted as busy until the block exits"""
+        with self._condition:
+            engine = self.engine
+            self._in_flight[id(engine)] = self._in_flight.get(id(engine), 0) + 1
+        try:
+            yield engine
+        finally:
+            with self._condition:
+                self._in_flight[id(engine)] -= 1
+                if self._in_flight[id(engine)] == 0:
+                    del self._in_flight[id(engine)]
+                    self._condition.notify_all()
+
+    def in_flight(self, engine) -> int:
+        with self._condition:
+            return self._in_flight.get(id(engine), 0)
+
+    def swap(self, engine):
+        """Send new searches to engine and return the previous one"""
+        with self._condition:
+            previous, self.engine = self.engine, engine
+            return previous
+
+    def drain(self, engine, timeout: float = None) -> bool:
+        """Wait until no search is running on engine; False if timeout passed first"""
+        with self._condition:
+            return self._condition.wait_for(lambda: id(engine) not in self._in_flight, timeout)
+
+
+def engine_sources(model_path: str = None, recipes_path: str = None, index_path: str = None, *,
+                   default_model: str, default_recipes: str, default_index: str) -> Dict[str, Optional[str]]:
+    """model_path, recipes_path and index_path arguments for OptimizedSearchEngine
+
+    With no paths the defaults are used, the index first. A model or recipes
+    path drops the index (which would otherwise shadow it) and takes the
+    default for the other source file. Paths given explicitly must exist.
+    """
+    if index_path and (model_path or recipes_path):
+        raise ValueError("Reload from either index_path or model_path/recipes_path, not both")
+    for path in (model_path, recipes_path, index_path):
+        if path and not os.path.exists(path):
+            raise FileNotFoundError(f"No such search file: {path}")
+    if model_path or recipes_path:
+        return {"model_path": model_path or default_model, "recipes_path": recipes_path or default_recipes,
+                "index_path": None}
+    if index_path:
+        return {"model_path": None, "recipes_path": None, "index_path": index_path}
+    return {"model_path": default_model, "recipes_path": default_recipes, "index_path": default_index}
+
+
+class SearchReloader:
+    """Builds replacement engines with factory() and swaps them into executor
+
+    replace_engine(engine, swap), e.g. search_service.replace_engine, brings a
+    new engine up to date with runtime recipe updates before calling swap(engine);
+    without it new engines are swapped in as built.
+    """
+
+    def __init__(self, executor, factory: Callable[..., Any], drain_timeout: float = 30.0,
+                 warmup_queries: List[str] = None,
+                 replace_engine: Callable[[Any, Callable[[Any], Any]], Any] = None):
+        self.executor = executor
+        self.factory = factory
+        self.replace_engine = replace_engine
+        self.drain_timeout = drain_timeout
+        self.warmup_queries = warmup_queries or []
+        self.reloads = 0
+        self.last_reload: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watcher = None
+        self._stop_watching = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def reload(self, **factory_args) -> Dict[str, Any]:
+        """Build, warm up and swap in a new engine; blocks until the old one is drained"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A search reload is already running")
+        try:
+            start_time = time.time()
+            logger.info("Building replacement search engine")
+            engine = self.factory(**factory_args)
+            build_seconds = time.time() - start_time
+            for query in self.warmup_queries:
+                engine.search(query, 10)
+
+            if self.replace_engine is not None:
+                # Recipes added at runtime are replayed into the new engine before it goes live
+                old = self.replace_engine(engine, self._swap)
+            else:
+                old = self._swap(engine)
+            swap_time = time.time()
+            drained = self.executor.slot.drain(old, self.drain_timeout)
+            if getattr(old, "merger", None) is not None:
+                old.stop_merger()
+                engine.start_merger()
+            del old
+            gc.collect()
+
+            self.reloads += 1
+            self.last_reload = {
+                "finished_at": time.time(),
+                "build_seconds": build_seconds,
+                "drain_seconds": time.time() - swap_time,
+                "drained": drained,
+                "args": {key: str(value) for key, value in factory_args.items()},
+            }
+            logger.info("Search engine reloaded in %.2f seconds", time.time() - start_time)
+            return self.last_reload
+        finally:
+            self._lock.release()
+
+    def _swap(self, engine):
+        return self.executor.swap_engine(engine, getattr(engine, "index_path", None))
+
+    def reload_in_background(self, **factory_args) -> bool:
+        """Start reload() in a thread; False if a reload is already running"""
+        if self.running:
+            return False
+        self._thread = threading.Thread(target=self._reload_logged, kwargs=factory_args,
+                                        name="search-reload", daemon=True)
+        self._thread.start()
+        return True
+
+    def _reload_logged(self, **factory_args):
+        try:
+            self.reload(**factory_args)
+        except Exception as e:
+            self.last_reload = {"finished_at": time.time(), "error": str(e)}
+            logger.exception("Search reload failed: %s", e)
+
+    def watch(self, paths: Dict[str, str], interval: float = 10.0):
+        """Reload whenever a watched file changes and then stays unchanged for interval seconds
+
+        paths maps factory arguments (model_path, recipes_path, index_path) to
+        files. Changed files are passed to the factory, so a new model or CSV
+        is loaded from source; a changed index wins when it changed as well.
+        """
+
+        def signature():
+            # Index directories are replaced as a whole, so their own mtime is enough
+            return {key: os.stat(path).st_mtime_ns if os.path.exists(path) else None
+                    for key, path in paths.items()}
+
+        # Taken before the thread starts, so changes made right after watch() returns are seen
+        baseline = signature()
+
+        def run():
+            current = baseline
+            while not self._stop_watching.wait(interval):
+                seen = signature()
+                if seen == current:
+                    continue
+                # Wait for writers to finish before reloading
+                if self._stop_watching.wait(interval) or signature() != seen:
+                    continue
+                changed = {key: paths[key] for key in paths if seen[key] != current[key] and seen[key] is not None}
+                current = seen
+                if not changed:
+                    continue
+                if "index_path" in changed:
+                    changed = {"index_path": changed["index_path"]}
+                logger.info("Search files changed, reloading: %s", ", ".join(changed.values()))
+                self._reload_logged(**changed)
+
+        self._watcher = threading.Thread(target=run, name="search-watch", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop_watching.set()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "reloads": self.reloads,
+            "last_reload": self.last_reload,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+        }
@@ -0,0 +1,91 @@
+"""
+Shared handle on the running search engine for code outside main.py.
+
+main.py registers its engine here; the recipe routers call index_recipe and
+unindex_recipe after each database write so new or edited recipes are
+searchable within seconds, through the engine's delta segment, without a
+rebuild. Updates reach the in-process engine only, so they are not visible to
+SEARCH_EXECUTOR=process workers until the next build_index.py run.
+
+Runtime updates are also kept here so replace_engine can replay them into a
+freshly loaded engine during a hot reload (see search_reload.py).
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Same cleaning as the corpus built by save_recipes.py
+from text_cleaning import clean_text
+
+logger = logging.getLogger(__name__)
+
+_engine = None
+_lock = threading.Lock()
+# Delta key -> (tokens, metadata) of every recipe added since the index was built
+_updates: Dict[str, Tuple[List[str], Dict[str, Any]]] = {}
+
+
+def set_engine(engine):
+    global _engine
+    with _lock:
+        _engine = engine
+
+
+def get_engine():
+    return _engine
+
+
+def replace_engine(engine, swap: Callable[[Any], Any] = None):
+    """Replay runtime updates into engine and make it current; returns the previous engine
+
+    swap(engine) switches searches over and runs while updates are held back,
+    so no update lands only on the engine being replaced.
+    """
+    global _engine
+    with _lock:
+        for key, (tokens, metadata) in _updates.items():
+            engine.add_recipe(key, tokens, metadata)
+        previous = swap(engine) if swap is not None else _engine
+        _engine = engine
+        return previous
+
+
+def recipe_key(recipe_id: int) -> str:
+    """Delta segment key of a database recipe, distinct from the CSV recipe ids"""
+    return f"db:{recipe_id}"
+
+
+def index_recipe(recipe) -> Optional[int]:
+    """Add (or replace) a database recipe in the search index and return its search id"""
+    if _engine is None:
+        return None
+    try:
+        text = " ".join(part for part in [recipe.title, recipe.description, recipe.ingredients,
+                                          recipe.instructions] if part)
+        tokens = clean_text([text])[0].split()
+        metadata = {
+            "Title": recipe.title,
+            "Image_Name": recipe.image_url or "",
+            "Instructions": recipe.instructions or "",
+            "recipe_id": recipe.id,
+        }
+        key = recipe_key(recipe.id)
+        with _lock:
+            _updates[key] = (tokens, metadata)
+            if _engine.word_index is None:
+                return None
+            return _engine.add_recipe(key, tokens, metadata)
+    except Exception as e:
+        # The database write already succeeded; the next index build picks the recipe up
+        logger.exception("Could not index recipe %s: %s", recipe.id, e)
+        return None
+
+
+def unindex_recipe(recipe_id: int) -> bool:
+    """Remove a database recipe from search results"""
+    if _engine is None:
+        return False
+    key = recipe_key(recipe_id)
+    with _lock:
+        _updates.pop(key, None)
+        return _engine.remove_recipe(key)
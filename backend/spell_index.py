@@ -0,0 +1,90 @@
+"""
+SymSpell-style typo correction for the search vocabulary.
+
+Every vocabulary word is expanded into the strings reachable by deleting up to
+max_distance characters. Two words within Levenshtein distance k always share
+such a delete, so a lookup only has to verify the handful of words whose deletes
+collide with the query's. Deletes are stored as sorted crc32 hashes next to the
+word id they came from, which keeps the table compact, deterministic across
+processes and cheap to persist in the search index.
+"""
+import zlib
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+from Levenshtein import distance
+
+MAX_EDIT_DISTANCE = 2
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """All strings obtained from word by deleting up to max_distance characters"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+
+def _hash(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def build_delete_table(vocab: List[str], max_distance: int = MAX_EDIT_DISTANCE) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted delete hashes and the vocabulary id each one belongs to"""
+    hashes = []
+    word_ids = []
+    for word_id, word in enumerate(vocab):
+        for delete in _deletes(word, max_distance):
+            hashes.append(_hash(delete))
+            word_ids.append(word_id)
+    hashes = np.array(hashes, dtype=np.uint32)
+    word_ids = np.array(word_ids, dtype=np.int32)
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], word_ids[order]
+
+
+class SpellingIndex:
+    """Deletion dictionary over the vocabulary with frequency-ranked corrections"""
+
+    def __init__(self, vocab: List[str], word_counts: np.ndarray, hashes: np.ndarray = None,
+                 word_ids: np.ndarray = None, max_distance: int = MAX_EDIT_DISTANCE):
+        self.vocab = vocab
+        self.word_counts = word_counts
+        self.max_distance = max_distance
+        if hashes is None or word_ids is None:
+            hashes, word_ids = build_delete_table(vocab, max_distance)
+        self.hashes = hashes
+        self.word_ids = word_ids
+
+    def candidates(self, word: str) -> np.ndarray:
+        """Vocabulary ids sharing at least one delete with word"""
+        query_hashes = np.array(sorted({_hash(d) for d in _deletes(word, self.max_distance)}), dtype=np.uint32)
+        starts = np.searchsorted(self.hashes, query_hashes, side="left")
+        ends = np.searchsorted(self.hashes, query_hashes, side="right")
+        hits = [self.word_ids[start:end] for start, end in zip(starts, ends) if end > start]
+        if not hits:
+            return np.zeros(0, dtype=np.int32)
+        return np.unique(np.concatenate(hits))
+
+    def lookup(self, word: str) -> Optional[str]:
+        """Closest vocabulary word within max_distance, or None
+
+        Ties on edit distance go to the more frequent word, then the lower
+        vocabulary id, so the result never depends on iteration order.
+        """
+        best_key = None
+        best_word = None
+        for word_id in self.candidates(word):
+            candidate = self.vocab[word_id]
+            if abs(len(candidate) - len(word)) > self.max_distance:
+                continue
+            edit_distance = distance(word, candidate, score_cutoff=self.max_distance)
+            if edit_distance > self.max_distance:
+                continue
+            key = (edit_distance, -int(self.word_counts[word_id]), int(word_id))
+            if best_key is None or key < best_key:
+                best_key = key
+                best_word = candidate
+        return best_word
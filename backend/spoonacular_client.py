@@ -0,0 +1,354 @@
+"""
+Shared async client for the Spoonacular API.
+
+One httpx.AsyncClient keeps a pool of keep-alive connections, so requests
+reuse TCP/TLS sessions instead of opening one each. Before a request is sent:
+
+- responses are served from an LRU cache with a TTL, optionally backed by a
+  SQLite file so cached responses survive restarts and are shared by workers
+- identical requests already in flight are coalesced: concurrent callers
+  await the same upstream call
+- a token bucket spaces out requests, and the daily point quota reported in
+  the X-API-Quota-* response headers is tracked so calls stop (raising
+  SpoonacularQuotaExceeded) once it is used up, until the quota resets at
+  midnight UTC
+
+Spoonacular allows caching responses for up to an hour, hence the default TTL.
+base_url can point the client at a local stub server for tests.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from search_cache import QueryCache
+from search_metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SPOONACULAR_BASE_URL = "https://api.spoonacular.com"
+
+SPOONACULAR_REQUESTS_TOTAL = REGISTRY.counter(
+    "spoonacular_requests_total",
+    "Spoonacular lookups by how they were served: cache, store, coalesced, api, error or quota",
+    ("outcome",))
+SPOONACULAR_REQUEST_SECONDS = REGISTRY.histogram(
+    "spoonacular_request_seconds", "Upstream Spoonacular request latency")
+
+
+class SpoonacularError(Exception):
+    """Raised when Spoonacular cannot be reached or answers with an error"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SpoonacularQuotaExceeded(SpoonacularError):
+    """Raised instead of calling Spoonacular once the daily quota is used up"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Spoonacular quota exhausted, retry in {retry_after:.0f}s", 402)
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Async token bucket allowing rate requests per second in bursts of up to burst
+
+    rate <= 0 disables limiting. pause() holds every request back, e.g. after a 429.
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 5, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.waits = 0
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    async def acquire(self):
+        # Single event loop: nothing runs between the check and taking a token
+        while True:
+            now = self.clock()
+            if now < self.paused_until:
+                self.waits += 1
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if self.rate <= 0:
+                return
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            self.waits += 1
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _next_quota_reset(now: float) -> float:
+    """Unix time of the next midnight UTC, when Spoonacular resets daily quotas"""
+    today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).date()
+    midnight = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time(),
+                                         datetime.timezone.utc)
+    return midnight.timestamp()
+
+
+class QuotaTracker:
+    """Daily point quota as last reported by Spoonacular
+
+    Calls stop once fewer than reserve points are left (or after a 402) and
+    resume after the next midnight UTC.
+    """
+
+    def __init__(self, reserve: float = 0.0, clock: Callable[[], float] = time.time):
+        self.reserve = reserve
+        self.clock = clock
+        self.used: Optional[float] = None
+        self.left: Optional[float] = None
+        self.exhausted_until = 0.0
+
+    def update(self, headers: httpx.Headers):
+        try:
+            if "X-API-Quota-Used" in headers:
+                self.used = float(headers["X-API-Quota-Used"])
+            if "X-API-Quota-Left" in headers:
+                self.left = float(headers["X-API-Quota-Left"])
+        except ValueError:
+            return
+        if self.left is not None and self.left <= self.reserve:
+            self.exhaust()
+
+    def exhaust(self):
+        self.exhausted_until = _next_quota_reset(self.clock())
+        logger.warning("Spoonacular quota exhausted until %s",
+                       time.strftime("%Y-%m-%d %H:%M:%SZ", time.gmtime(self.exhausted_until)))
+
+    def check(self):
+        now = self.clock()
+        if now < self.exhausted_until:
+            raise SpoonacularQuotaExceeded(self.exhausted_until - now)
+
+
+class SQLiteResponseStore:
+    """Response bodies in a local SQLite file, keyed like the memory cache, with a wall-clock expiry"""
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._connection:
+            # Several workers may share one file
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body FROM responses WHERE key = ? AND expires_at > ?", (key, self.clock())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Any, ttl_seconds: float):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, body, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), self.clock() + ttl_seconds))
+
+    def prune(self) -> int:
+        """Delete expired responses; returns how many"""
+        with self._lock, self._connection:
+            return self._connection.execute("DELETE FROM responses WHERE expires_at <= ?", (self.clock(),)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class SpoonacularClient:
+    """Pooled, cached, coalescing and rate-limited GET requests to Spoonacular
+
+    Returned JSON may be shared with other callers and the cache, so treat it as read-only.
+    """
+
+    def __init__(self, api_key: str, base_url: str = SPOONACULAR_BASE_URL, timeout: float = 10.0,
+                 max_connections: int = 20, max_keepalive: int = 10, cache_size: int = 1024,
+                 cache_ttl: float = 3600.0, cache_path: str = None, rate: float = 5.0, burst: int = 5,
+                 quota_reserve: float = 0.0, max_retries: int = 2,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.transport = transport
+        self.cache = QueryCache(cache_size, cache_ttl)
+        self.store = SQLiteResponseStore(cache_path) if cache_path and cache_ttl > 0 else None
+        self.limiter = RateLimiter(rate, burst)
+        self.quota = QuotaTracker(quota_reserve)
+        self.max_retries = max_retries
+        self._http: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.api_calls = 0
+        self.coalesced = 0
+        self.store_hits = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, api_key: str = None) -> "SpoonacularClient":
+        return cls(
+            api_key=api_key or os.getenv("SPOONACULAR_API_KEY", ""),
+            base_url=os.getenv("SPOONACULAR_BASE_URL", SPOONACULAR_BASE_URL),
+            timeout=float(os.getenv("SPOONACULAR_TIMEOUT_SECONDS", "10")),
+            max_connections=int(os.getenv("SPOONACULAR_MAX_CONNECTIONS", "20")),
+            cache_size=int(os.getenv("SPOONACULAR_CACHE_SIZE", "1024")),
+            cache_ttl=float(os.getenv("SPOONACULAR_CACHE_TTL_SECONDS", "3600")),
+            cache_path=os.getenv("SPOONACULAR_CACHE_PATH") or None,
+            rate=float(os.getenv("SPOONACULAR_RATE_PER_SECOND", "5")),
+            quota_reserve=float(os.getenv("SPOONACULAR_QUOTA_RESERVE", "0")),
+        )
+
+    @staticmethod
+    def cache_key(path: str, params: Dict[str, Any]) -> str:
+        return json.dumps([path, sorted((key, str(value)) for key, value in params.items())])
+
+    def http(self) -> httpx.AsyncClient:
+        # Created on first use so the pool belongs to the serving event loop
+        if self._http is None:
+            self._http = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits,
+                                           transport=self.transport)
+        return self._http
+
+    async def get(self, path: str, params: Dict[str, Any] = None) -> Any:
+        """JSON response of GET path with params (None values dropped); the API key is added here"""
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        key = self.cache_key(path, params)
+        value = self.cache.get(key)
+        if value is not None:
+            SPOONACULAR_REQUESTS_TOTAL.inc(outcome="cache")
+            return value
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, path, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+            SPOONACULAR_REQUESTS_TOTAL.inc(outcome="coalesced")
+        # A cancelled caller must not cancel the request others are waiting on
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller was cancelled
+
+    async def _fetch(self, key: str, path: str, params: Dict[str, Any]) -> Any:
+        if self.store is not None:
+            value = await asyncio.to_thread(self.store.get, key)
+            if value is not None:
+                self.store_hits += 1
+                SPOONACULAR_REQUESTS_TOTAL.inc(outcome="store")
+                self.cache.put(key, value)
+                return value
+        value = await self._request(path, params)
+        self.cache.put(key, value)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.put, key, value, self.cache.ttl_seconds)
+        return value
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> Any:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.quota.check()
+            except SpoonacularQuotaExceeded:
+                SPOONACULAR_REQUESTS_TOTAL.inc(outcome="quota")
+                raise
+            await self.limiter.acquire()
+            self.api_calls += 1
+            start = time.perf_counter()
+            try:
+                response = await self.http().get(path, params={**params, "apiKey": self.api_key})
+            except httpx.HTTPError as e:
+                self.errors += 1
+                SPOONACULAR_REQUESTS_TOTAL.inc(outcome="error")
+                raise SpoonacularError(f"Spoonacular request failed: {type(e).__name__}: {e}") from e
+            finally:
+                SPOONACULAR_REQUEST_SECONDS.observe(time.perf_counter() - start)
+            self.quota.update(response.headers)
+            if response.status_code == 429 and attempt < self.max_retries:
+                try:
+                    retry_after = float(response.headers.get("Retry-After", "1"))
+                except ValueError:
+                    retry_after = 1.0
+                self.limiter.pause(retry_after)
+                continue
+            if response.status_code == 402:
+                self.quota.exhaust()
+                SPOONACULAR_REQUESTS_TOTAL.inc(outcome="quota")
+                raise SpoonacularQuotaExceeded(self.quota.exhausted_until - self.quota.clock())
+            if response.status_code >= 400:
+                self.errors += 1
+                SPOONACULAR_REQUESTS_TOTAL.inc(outcome="error")
+                raise SpoonacularError(f"Spoonacular returned {response.status_code}: {response.text[:200]}",
+                                       response.status_code)
+            SPOONACULAR_REQUESTS_TOTAL.inc(outcome="api")
+            return response.json()
+
+    async def search_recipes(self, **params) -> Dict[str, Any]:
+        """GET /recipes/complexSearch with Spoonacular's own (camelCase) parameter names"""
+        return await self.get("/recipes/complexSearch", params)
+
+    async def get_recipe_information(self, recipe_id: int, **params) -> Dict[str, Any]:
+        return await self.get(f"/recipes/{recipe_id}/information", params)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "api_calls": self.api_calls,
+            "coalesced": self.coalesced,
+            "store_hits": self.store_hits,
+            "errors": self.errors,
+            "in_flight": len(self._inflight),
+            "rate_limit_waits": self.limiter.waits,
+            "quota_used": self.quota.used,
+            "quota_left": self.quota.left,
+            "quota_exhausted": self.quota.clock() < self.quota.exhausted_until,
+            "cache": self.cache.stats(),
+        }
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+
+# Shared by every router in the process
+_client: Optional[SpoonacularClient] = None
+
+
+def get_client(api_key: str = None) -> SpoonacularClient:
+    """The process-wide client, configured from SPOONACULAR_* environment variables on first use"""
+    global _client
+    if _client is None:
+        _client = SpoonacularClient.from_env(api_key)
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
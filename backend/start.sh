@@ -9,6 +9,10 @@ python create_mysql_db.py
 echo "Initializing databases..."
 python init_db.py
 
+# Add columns and indexes introduced since the tables were created
+echo "Migrating database schema..."
+python migrate_db.py
+
 # Start the application
 echo "Starting FastAPI application..."
 exec uvicorn main:app --host 0.0.0.0 --port 8000 
\ No newline at end of file
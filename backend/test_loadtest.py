@@ -0,0 +1,83 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.loadtest import fill, load_scenarios, run_load
+from benchmarks.memory_mongo import MemoryCollection, ObjectId
+
+
+def test_memory_collection():
+    """Test the in-memory Mongo stand-in on the operations routers/chat.py uses"""
+    chats = MemoryCollection("group_chats")
+    alice, bob = ObjectId(), ObjectId()
+
+    async def scenario():
+        result = await chats.insert_one({"group_name": "Dinner", "members": [alice]})
+        chat = await chats.find_one({"_id": result.inserted_id, "members": alice})
+        assert chat["group_name"] == "Dinner"
+        chat["group_name"] = "changed"
+        assert (await chats.find_one({"_id": result.inserted_id}))["group_name"] == "Dinner", \
+            "Returned documents should be copies"
+        assert await chats.find_one({"members": bob}) is None
+
+        await chats.update_one({"_id": result.inserted_id}, {"$push": {"members": bob}})
+        assert len(await chats.find({"members": bob}).to_list(length=100)) == 1
+        await chats.update_one({"_id": result.inserted_id}, {"$pull": {"members": alice}})
+        assert (await chats.find_one({"_id": result.inserted_id}))["members"] == [bob]
+
+        await chats.insert_one({"group_name": "Brunch", "members": [bob]})
+        names = [chat["group_name"] for chat in await chats.find({"members": bob}).sort("group_name", 1).to_list(10)]
+        assert names == ["Brunch", "Dinner"]
+
+    asyncio.run(scenario())
+    print("memory collection test passed!")
+
+
+def test_fill_placeholders():
+    """Test that scenario placeholders keep the type of whole-value substitutions"""
+    values = {"recipe_id": 7, "title": "Cake"}
+    assert fill({"recipe_id": "{recipe_id}", "title": "{title} {recipe_id}"}, values) == {"recipe_id": 7, "title": "Cake 7"}
+    assert fill("/api/recipes/{recipe_id}", values) == "/api/recipes/7"
+    with pytest.raises(KeyError):
+        fill("/api/chat/groups/{chat_id}", values)
+    print("fill placeholders test passed!")
+
+
+def test_search_scenario_in_process(tmp_path):
+    """Test a short in-process load run of the search scenario"""
+    from benchmarks.loadtest_app import build_app
+
+    app, skipped, variables = build_app([], str(tmp_path), num_recipes=500)
+    scenarios = load_scenarios(["search"])
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest") as client:
+            return await run_load(client, scenarios, concurrency=4, duration=None, iterations=3, variables=variables)
+
+    report = asyncio.run(scenario())
+    assert skipped == {}
+    assert report["total"]["requests"] == 4 * 3 * len(scenarios[0]["steps"])
+    assert report["total"]["error_rate"] == 0, report["total"]["error_samples"]
+    assert report["steps"]["search/search exact"]["p50_ms"] > 0
+    print("search load test passed!")
+
+
+def test_search_page_validation(tmp_path):
+    """Test that /search and /search/batch reject page sizes and offsets out of range"""
+    from benchmarks.loadtest_app import build_app
+
+    app, _, _ = build_app([], str(tmp_path), num_recipes=200)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest") as client:
+            page = await client.get("/search", params={"query": "chicken", "number": 2, "offset": 1})
+            rejected = [(await client.get("/search", params={"query": "chicken", **params})).status_code
+                        for params in [{"number": 2, "offset": -1}, {"number": 0}, {"number": 1001}]]
+            batch = await client.post("/search/batch", json={"queries": ["chicken"], "number": 2, "offset": -1})
+            return page, rejected, batch.status_code
+
+    page, rejected, batch = asyncio.run(scenario())
+    assert page.status_code == 200 and len(page.json()["result"]) == 2, page.text
+    assert rejected == [422, 422, 422] and batch == 422
+    print("search page validation test passed!")
@@ -0,0 +1,251 @@
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import migrate_db
+import models
+import recipe_queries
+
+NUM_FAVORITES = 2000
+
+
+class QueryCounter:
+    """Counts the SQL statements and commits sent through an engine"""
+
+    def __init__(self, engine):
+        self.count = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+        event.listen(engine, "commit", self._commit)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def _commit(self, *args):
+        self.commits += 1
+
+    def __enter__(self):
+        self.count = 0
+        self.commits = 0
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    user = models.User(email="fan@example.com", username="fan", hashed_password="x")
+    tags = [models.Tag(name=f"tag{i}") for i in range(5)]
+    session.add_all([user, *tags])
+    session.flush()
+    recipes = [models.Recipe(title=f"Recipe {i}", description="", ingredients="", instructions="",
+                             user_id=user.id, tags=[tags[i % 5], tags[(i + 1) % 5]])
+               for i in range(NUM_FAVORITES)]
+    session.add_all(recipes)
+    session.flush()
+    # Favorited in reverse order, so favorite order differs from recipe order
+    session.add_all([models.Favorite(user_id=user.id, recipe_id=recipe.id) for recipe in reversed(recipes)])
+    session.commit()
+    migrate_db.migrate(engine)
+    recipe_queries.backfill_favorite_counts(session)
+    session.queries = QueryCounter(engine)
+    session.user_id = user.id
+    yield session
+    session.close()
+
+
+def test_favorites_in_constant_queries(db):
+    """Test that listing 2,000 favorites with their tags takes the same few queries as listing one"""
+    with db.queries as queries:
+        recipes, cursor = recipe_queries.favorite_recipes(db, db.user_id)
+        titles = [(recipe.title, [tag.name for tag in recipe.tags]) for recipe in recipes]
+    assert len(titles) == NUM_FAVORITES and cursor is None
+    assert titles[0][0] == f"Recipe {NUM_FAVORITES - 1}" and len(titles[0][1]) == 2, "Favorites keep their order"
+    assert queries.count == 2, "One query for the recipes and one for all their tags"
+
+    pages = []
+    cursor = None
+    while True:
+        with db.queries as queries:
+            recipes, cursor = recipe_queries.favorite_recipes(db, db.user_id, limit=700, after=cursor)
+            pages.append([recipe.id for recipe in recipes])
+            [recipe.tags for recipe in recipes]
+        assert queries.count == 2
+        if cursor is None:
+            break
+    assert [len(page) for page in pages] == [700, 700, 600]
+    assert sum(pages, []) == [recipe.id for recipe in recipe_queries.favorite_recipes(db, db.user_id)[0]]
+    print("favorites query count test passed!")
+
+
+def test_tags_and_favorite_counter(db):
+    """Test tag listing queries, keyset pages and the denormalized favorite counter"""
+    with db.queries as queries:
+        recipes, cursor = recipe_queries.recipes_by_tag(db, "tag0", limit=300)
+        [recipe.tags for recipe in recipes]
+    assert queries.count == 2 and len(recipes) == 300 and cursor == recipes[-1].id
+    rest, cursor = recipe_queries.recipes_by_tag(db, "tag0", after=cursor)
+    assert cursor is None and len(recipes) + len(rest) == 2 * NUM_FAVORITES // 5
+    assert all(any(tag.name == "tag0" for tag in recipe.tags) for recipe in recipes + rest)
+    assert recipe_queries.recipes_by_tag(db, "missing") is None
+
+    with db.queries as queries:
+        recipe = recipe_queries.get_recipe(db, 1)
+        assert recipe.favorite_count == 1 and len(recipe.tags) == 2
+    assert queries.count == 2, "No separate favorite count query"
+
+    other = models.User(email="other@example.com", username="other", hashed_password="x")
+    db.add(other)
+    db.commit()
+    favorite = recipe_queries.add_favorite(db, other.id, 1)
+    assert recipe_queries.get_recipe(db, 1).favorite_count == 2
+    recipe_queries.remove_favorite(db, favorite)
+    assert recipe_queries.get_recipe(db, 1).favorite_count == 1
+
+    page, cursor = recipe_queries.list_recipes(db, limit=10, after=5)
+    assert [recipe.id for recipe in page] == list(range(6, 16)) and cursor == 15
+    print("tags and favorite counter test passed!")
+
+
+def test_migrate_adds_favorite_count():
+    """Test that migrate_db adds and backfills favorite_count on a database created without it"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE recipes DROP COLUMN favorite_count"))
+        connection.execute(text("INSERT INTO users (id, email, username) VALUES (1, 'a@example.com', 'a'), "
+                                "(2, 'b@example.com', 'b')"))
+        connection.execute(text("INSERT INTO recipes (id, title, user_id) VALUES (1, 'Soup', 1), (2, 'Cake', 1)"))
+        connection.execute(text("INSERT INTO favorites (user_id, recipe_id) VALUES (1, 2), (2, 2)"))
+
+    assert migrate_db.migrate(engine) == ["recipes.favorite_count", "recipes full-text index"]
+    column = {column["name"]: column for column in inspect(engine).get_columns("recipes")}["favorite_count"]
+    assert not column["nullable"] and str(column["type"]) == "INTEGER", "The DDL should follow model_columns.py"
+    session = sessionmaker(bind=engine)()
+    assert [recipe_queries.get_recipe(session, i).favorite_count for i in (1, 2)] == [0, 2]
+    session.close()
+    assert migrate_db.migrate(engine) == [], "Already migrated databases are left alone"
+    print("favorite count migration test passed!")
+
+
+def test_fulltext_search(db):
+    """Test FTS5 ranking, prefixes, paging and that the index follows recipe writes"""
+    user_id = db.user_id
+    db.add_all([
+        models.Recipe(title="Lemon Cake", description="A bright cake", ingredients="lemon, flour, sugar",
+                      instructions="", user_id=user_id),
+        models.Recipe(title="Sponge", description="Light cake with lemon zest", ingredients="flour, eggs",
+                      instructions="", user_id=user_id),
+        models.Recipe(title="Lemonade", description="", ingredients="lemons, water, sugar",
+                      instructions="", user_id=user_id),
+    ])
+    db.commit()
+    titles = lambda recipes: [recipe.title for recipe in recipes]
+
+    assert titles(recipe_queries.search_recipes(db, "lemon cake")) == ["Lemon Cake", "Sponge"], \
+        "Every word must match, title matches rank first"
+    ranked = titles(recipe_queries.search_recipes(db, "LEMON"))
+    assert sorted(ranked[:2]) == ["Lemon Cake", "Lemonade"] and ranked[2] == "Sponge", "Words match by prefix"
+    assert titles(recipe_queries.search_recipes(db, "lemon", limit=1, offset=1)) == ranked[1:2]
+    assert recipe_queries.search_recipes(db, 'cake" (*') != [], "Query syntax characters are ignored"
+    assert recipe_queries.search_recipes(db, "!!") == []
+    with db.queries as queries:
+        recipe_queries.search_recipes(db, "recipe", limit=50)
+    assert queries.count == 3, "Ranked ids, then the recipes and their tags"
+
+    lemonade = db.query(models.Recipe).filter(models.Recipe.title == "Lemonade").one()
+    lemonade.title = "Limeade"
+    lemonade.ingredients = "limes, water"
+    db.commit()
+    assert titles(recipe_queries.search_recipes(db, "limeade")) == ["Limeade"]
+    assert "Limeade" not in titles(recipe_queries.search_recipes(db, "lemon"))
+    db.delete(lemonade)
+    db.commit()
+    assert recipe_queries.search_recipes(db, "limeade") == []
+    print("full-text search test passed!")
+
+
+def test_favorites_leave_fulltext_index_alone(db):
+    """Test that favorite counter bumps do not rewrite FTS rows, also after migrating an older trigger"""
+    engine = db.get_bind()
+    with engine.begin() as connection:
+        connection.execute(text("DROP TRIGGER recipes_fts_update"))
+        # The trigger as first created, firing on every column
+        connection.execute(text(recipe_queries._FTS5_UPDATE_TRIGGER.replace(
+            "AFTER UPDATE OF title, description, ingredients ON", "AFTER UPDATE ON")))
+    assert migrate_db.migrate(engine) == ["recipes_fts update trigger"]
+    assert migrate_db.migrate(engine) == []
+
+    recipe_id = db.query(models.Recipe.id).first()[0]
+    changes = lambda: db.execute(text("SELECT total_changes()")).scalar()
+    before = changes()
+    recipe_queries.add_favorite(db, db.user_id, recipe_id)
+    assert changes() - before == 2, "Only the favorite row and the counter are written"
+    print("full-text trigger test passed!")
+
+
+def test_search_without_fulltext_index():
+    """Test that searches on a database without the index fall back to substring matching and never add it"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    user = models.User(email="cook@example.com", username="cook", hashed_password="x")
+    session.add(user)
+    session.flush()
+    session.add_all([models.Recipe(title=title, description="", ingredients="", instructions="", user_id=user.id)
+                     for title in ["Lemon Cake", "Lemonade", "Sponge"]])
+    session.commit()
+
+    counter = QueryCounter(engine)
+    assert [r.title for r in recipe_queries.search_recipes(session, "lemon")] == ["Lemon Cake", "Lemonade"]
+    with counter as queries:
+        assert [r.title for r in recipe_queries.search_recipes(session, "cake")] == ["Lemon Cake"]
+    assert queries.count == 2, "The missing index is remembered, not checked again"
+    assert not recipe_queries.fulltext_index_exists(engine), "Searches must not create the index"
+    assert recipe_queries.create_fulltext_index(engine) and not recipe_queries.create_fulltext_index(engine)
+    session.close()
+    print("search fallback test passed!")
+
+
+class RecipeIn:
+    """The fields of schemas.RecipeCreate that create_recipes reads"""
+
+    def __init__(self, title, tags):
+        self.title = title
+        self.description = self.ingredients = self.instructions = ""
+        self.image_url = None
+        self.tags = tags
+
+
+def test_bulk_tag_upsert_and_import(db):
+    """Test that recipe writes cost a fixed number of statements and one commit however many tags they carry"""
+    new_tags = [f"new{i}" for i in range(20)]
+    with db.queries as queries:
+        [recipe] = recipe_queries.create_recipes(db, [RecipeIn("Tagged", ["tag0", " tag1 ", "tag0"] + new_tags)],
+                                                 db.user_id)
+    assert sorted(tag.name for tag in recipe.tags) == sorted(["tag0", "tag1"] + new_tags)
+    assert queries.commits == 1
+    few_tags = queries.count
+    with db.queries as queries:
+        recipe_queries.create_recipes(db, [RecipeIn("One tag", ["new99"])], db.user_id)
+    assert queries.count == few_tags, "Statement count should not grow with the number of tags"
+
+    # A tag created by a concurrent writer between the select and the insert is skipped, not an error
+    recipe_queries._insert_ignoring_duplicates(db, models.Tag.__table__, [{"name": "new0"}, {"name": "late"}])
+    db.commit()
+    assert db.query(models.Tag).filter(models.Tag.name.in_(["new0", "late"])).count() == 2
+
+    batch = [RecipeIn(f"Imported {i}", [f"import{i % 7}", "imported"]) for i in range(500)]
+    with db.queries as queries:
+        imported = recipe_queries.create_recipes(db, batch, db.user_id)
+        names = [sorted(tag.name for tag in recipe.tags) for recipe in imported]
+    assert [recipe.title for recipe in imported] == [recipe.title for recipe in batch]
+    assert names[8] == ["import1", "imported"]
+    assert queries.commits == 1
+    assert recipe_queries.recipes_by_tag(db, "imported")[0][-1].title == "Imported 499"
+    print("bulk tag upsert test passed!")
@@ -0,0 +1,136 @@
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import auth
+import database
+import migrate_db
+import models
+import search_service
+from routers import favorites, recipes
+from search_engine import OptimizedSearchEngine
+from test_search_engine import synthetic_paths  # noqa: F401  (fixture)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Recipe and favorites routers on an in-memory SQLite database, signed in as one user"""
+    # Writes would otherwise reach (and be replayed from) an engine another test module registered
+    monkeypatch.setattr(search_service, "_updates", {})
+    monkeypatch.setattr(search_service, "_engine", None)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    migrate_db.migrate(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as db:
+        user = models.User(email="cook@example.com", username="cook", hashed_password="x")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(recipes.router)
+    app.include_router(favorites.router)
+    app.dependency_overrides[database.get_db] = get_db
+    app.dependency_overrides[auth.get_current_active_user] = lambda: user
+    with TestClient(app) as client:
+        yield client
+
+
+def create(client, title, tags=()):
+    response = client.post("/api/recipes/", json={"title": title, "instructions": "Simmer slowly.",
+                                                  "tags": list(tags)})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_recipe_list_paging(client):
+    """Test keyset pages, the favorite counter and that out-of-range page sizes are rejected"""
+    ids = [create(client, f"Stew {i}", ["stew"])["id"] for i in range(5)]
+    response = client.get("/api/recipes/", params={"limit": 2})
+    assert [recipe["id"] for recipe in response.json()] == ids[:2]
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get("/api/recipes/", params={"limit": 10, "after": cursor})
+    assert [recipe["id"] for recipe in response.json()] == ids[2:]
+    assert "X-Next-Cursor" not in response.headers
+
+    for params in [{"limit": 0}, {"limit": -1}, {"limit": 1001}, {"skip": -1}]:
+        assert client.get("/api/recipes/", params=params).status_code == 422, params
+
+    assert client.post("/api/favorites/", json={"recipe_id": ids[0]}).status_code == 201
+    assert client.get(f"/api/recipes/{ids[0]}").json()["favorite_count"] == 1
+    assert client.delete(f"/api/favorites/{ids[0]}").status_code == 204
+    assert client.get(f"/api/recipes/{ids[0]}").json()["favorite_count"] == 0
+    print("recipe list paging test passed!")
+
+
+def test_bulk_import_and_tag_updates(client):
+    """Test POST /bulk, its size limit and that edits reuse existing tags instead of duplicating them"""
+    batch = [{"title": f"Imported {i}", "tags": [f"batch{i % 3}", "imported", " imported "]} for i in range(50)]
+    response = client.post("/api/recipes/bulk", json=batch)
+    assert response.status_code == 201, response.text
+    imported = response.json()
+    assert [recipe["title"] for recipe in imported] == [recipe["title"] for recipe in batch]
+    assert sorted(tag["name"] for tag in imported[4]["tags"]) == ["batch1", "imported"]
+    assert len(client.get("/api/recipes/tags/imported").json()) == 50
+    assert client.post("/api/recipes/bulk", json=[{"title": "x"}] * (recipes.MAX_IMPORT_RECIPES + 1)).status_code == 413
+
+    recipe_id = imported[0]["id"]
+    response = client.put(f"/api/recipes/{recipe_id}", json={"title": "Edited", "tags": ["imported", "fresh"]})
+    assert response.status_code == 200
+    assert sorted(tag["name"] for tag in response.json()["tags"]) == ["fresh", "imported"]
+    tags = {(tag["name"], tag["id"]) for recipe in client.get("/api/recipes/", params={"limit": 1000}).json()
+            for tag in recipe["tags"]}
+    assert sorted(name for name, _ in tags) == ["batch0", "batch1", "batch2", "fresh", "imported"], \
+        "Each tag name should map to a single row"
+    print("bulk import route test passed!")
+
+
+def test_tags_match_case_insensitively(client):
+    """Test that tag names differing only in case reuse one row, on create, bulk import and edit"""
+    stew = create(client, "Beef Stew", ["stew"])["tags"][0]
+    recipe = create(client, "Lamb Stew", ["Stew", " STEW ", "Winter", "winter"])
+    assert [(tag["id"], tag["name"]) for tag in recipe["tags"]] == [(stew["id"], "stew"), (recipe["tags"][1]["id"], "Winter")]
+
+    imported = client.post("/api/recipes/bulk", json=[{"title": "Pork Stew", "tags": ["sTeW", "WINTER"]},
+                                                      {"title": "Hot Pot", "tags": ["Winter"]}]).json()
+    assert [[tag["name"] for tag in recipe["tags"]] for recipe in imported] == [["stew", "Winter"], ["Winter"]]
+    response = client.put(f"/api/recipes/{imported[1]['id']}", json={"title": "Hot Pot", "tags": ["STEW"]})
+    assert [tag["id"] for tag in response.json()["tags"]] == [stew["id"]]
+    assert len(client.get("/api/recipes/tags/stew").json()) == 4
+    print("case-insensitive tags test passed!")
+
+
+def test_recipe_writes_update_search(client, synthetic_paths, monkeypatch):
+    """Test that creating, editing and deleting recipes through the router updates search right away"""
+    engine = OptimizedSearchEngine(*synthetic_paths)
+    search_service.set_engine(engine)
+    # (recipe_id, Title) of the top database recipes; dataset recipes have an index instead
+    found = lambda query: {(card.get("recipe_id"), card["Title"]) for card in
+                           orjson.loads(engine.search_json(query, top_k=20))["recipes"]}
+
+    recipe = create(client, "Garlic Chicken Soup")
+    assert (recipe["id"], "Garlic Chicken Soup") in found("garlic chicken soup")
+    response = client.put(f"/api/recipes/{recipe['id']}", json={"title": "Chocolate Cake",
+                                                                "instructions": "Bake with cocoa."})
+    assert response.status_code == 200
+    assert (recipe["id"], "Chocolate Cake") in found("chocolate cocoa cake")
+    assert (recipe["id"], "Garlic Chicken Soup") not in found("garlic chicken soup")
+
+    imported = client.post("/api/recipes/bulk", json=[{"title": "Lemon Biscuits"}]).json()
+    assert (imported[0]["id"], "Lemon Biscuits") in found("lemon biscuits")
+    assert client.delete(f"/api/recipes/{recipe['id']}").status_code == 204
+    assert (recipe["id"], "Chocolate Cake") not in found("chocolate cocoa cake")
+    print("recipe search hooks test passed!")
@@ -0,0 +1,60 @@
+import os
+import re
+
+import pandas as pd
+
+import text_cleaning
+from recipe_loader import load_recipes_csv, load_recipes_npz
+from save_recipes import run_pipeline
+from text_cleaning import clean_text
+
+RAW_RECIPES = [
+    # Unnamed: 0, Title, Ingredients, Instructions, Image_Name
+    (0, "Crème Brûlée 2", "['eggs']", "Heat 2 cups of cream to 80°C; whisk in the yolks, then bake!", "creme"),
+    (1, "Toast", "['bread']", "Toast it.", "toast"),  # instructions too short
+    (2, "Mystery", None, "Combine everything you have and hope for the best.", "mystery"),  # missing field
+    (3, "Garlic Bread", "['garlic']", "Spread garlic butter on bread and bake for 10 minutes.", None),
+    (4, "Tea (Chai)", "['tea']", "Simmer tea leaves with spices & milk for \\d 5 minutes.", "chai"),
+    (5, "Soup", "['water']", None, "soup"),  # missing field
+    (6, "Lemon Cake", "['lemon']", "Beat the butter, sugar and lemon zest; fold in the flour.", "lemon-cake"),
+    (7, "Phở", "['noodles']", "Simmer the broth—star anise, cinnamon—for 3 hours. “Serve” hot…", "pho"),
+]
+
+
+def old_clean_text(documents):
+    """The cleaning save_recipes.py used before it was split into chunks"""
+    punctuations = '"\'\\,<>./?@#$%^&*_~/!()-[]{};:'
+    cleaned_text = []
+    for doc in documents:
+        doc = doc.lower()
+        doc = re.sub(r'\\d+', ' ', doc)
+        line = ''.join(char for char in doc if char not in punctuations and (char.isalpha() or char == ' '))
+        cleaned_text.append(' '.join(word for word in line.split() if word not in text_cleaning.stopwords))
+    return cleaned_text
+
+
+def test_pipeline_matches_original_cleaning(tmp_path, monkeypatch):
+    """Test the chunked, multi-process pipeline against the original single-pass cleaning"""
+    monkeypatch.chdir(tmp_path)
+    raw = pd.DataFrame(RAW_RECIPES, columns=["Unnamed: 0", "Title", "Ingredients", "Instructions", "Image_Name"])
+    raw.to_csv("raw.csv", index=False)
+
+    # The original filters, applied to the whole dataset at once
+    kept = raw[~raw.drop(columns="Image_Name").isna().any(axis=1)]
+    kept = kept[kept["Instructions"].str.len() >= 20]
+    expected_tokens = [doc.split() for doc in old_clean_text(kept["Title"] + kept["Instructions"])]
+    assert clean_text(kept["Title"] + kept["Instructions"]) == old_clean_text(kept["Title"] + kept["Instructions"])
+    assert kept["Unnamed: 0"].tolist() == [0, 3, 4, 6, 7]
+
+    run_pipeline("raw.csv", "cleaned.csv", "cleaned.npz", chunk_size=3, workers=2)
+    for frame, tokens in [load_recipes_csv("cleaned.csv"), load_recipes_npz("cleaned.npz")]:
+        assert frame["index"].tolist() == [0, 3, 4, 6, 7]
+        assert frame["Title"].tolist() == kept["Title"].tolist()
+        assert [tokens.doc(i) for i in range(len(tokens))] == expected_tokens
+    assert sorted(os.listdir(tmp_path)) == ["cleaned.csv", "cleaned.npz", "raw.csv"], "Scratch files should be removed"
+
+    # CSV only
+    run_pipeline("raw.csv", "only.csv", None, chunk_size=2, workers=2)
+    assert load_recipes_csv("only.csv")[0]["index"].tolist() == [0, 3, 4, 6, 7]
+    assert sorted(os.listdir(tmp_path)) == ["cleaned.csv", "cleaned.npz", "only.csv", "raw.csv"]
+    print("save recipes pipeline test passed!")
@@ -1,37 +1,84 @@
 import pytest
 import os
+import time
+from types import SimpleNamespace
 import numpy as np
 import pandas as pd
-from gensim.models import Word2Vec
-from scipy.special import expit
+import orjson
+from gensim.models import KeyedVectors, Word2Vec
 from Levenshtein import distance
 from search_engine import OptimizedSearchEngine  # Assuming your class is in this file
+from ann_index import IVFIndex
+from quantized_vectors import dequantize, quantize, similarities
+from topk import top_k_indices, StreamingTopK
+from search_cache import QueryCache
+import search_service
+from ingredient_index import IngredientIndex
+from search_executor import SearchExecutor
+from search_reload import SearchReloader, engine_sources
+from search_metrics import REGISTRY, SEARCH_STAGE_SECONDS, SEARCHES_TOTAL
+from recipe_loader import RecipeCorpusWriter, load_recipes_csv, load_recipes_npz, parse_token_column, save_recipes_npz
 
-# Dummy paths (replace with actual model and data paths)
-MODEL_PATH = "word2vec_model"
-RECIPES_PATH = "cleaned_recipe_data.csv"
+SYNTHETIC_RECIPES = [
+    ("Chocolate Cake", ["chocolate", "cake", "cocoa", "eggs", "bake", "frosting"]),
+    ("Lemon Cheddar Biscuits", ["lemon", "cheddar", "cheese", "biscuits", "bake", "dough"]),
+    ("Roast Chicken", ["roast", "chicken", "garlic", "thyme", "lemon", "roast"]),
+    ("Chicken Noodle Soup", ["chicken", "noodle", "soup", "carrots", "celery", "broth"]),
+    ("Garlic Bread", ["garlic", "bread", "parsley", "toast", "bread"]),
+    ("Vanilla Cupcakes", ["vanilla", "cupcakes", "cake", "frosting", "eggs", "bake"]),
+    ("Tomato Basil Pasta", ["tomato", "basil", "pasta", "garlic", "parmesan"]),
+    ("Cheese Omelette", ["cheese", "eggs", "omelette", "chives", "cheddar"]),
+]
 
 
 @pytest.fixture
-def search_engine():
+def synthetic_paths(tmp_path):
+    """Small Word2Vec model and recipe CSV built on the fly, as (model_path, recipes_path)"""
+    sentences = [tokens for _, tokens in SYNTHETIC_RECIPES] * 20 + [["recipe", "cheese", "cheddar", "chocolate"]] * 5
+    model = Word2Vec(sentences, vector_size=16, min_count=1, seed=1, workers=1, epochs=5)
+    model_path = str(tmp_path / "word2vec_model")
+    model.save(model_path)
+    recipes = pd.DataFrame({
+        "Title": [title for title, _ in SYNTHETIC_RECIPES],
+        "Instructions": ["Mix and cook. " * 3] * len(SYNTHETIC_RECIPES),
+        "Image_Name": [f"image-{i}" for i in range(len(SYNTHETIC_RECIPES))],
+        "index": list(range(len(SYNTHETIC_RECIPES))),
+        "combined_cleaned": [tokens for _, tokens in SYNTHETIC_RECIPES],
+    })
+    recipes_path = str(tmp_path / "cleaned_recipe_data.csv")
+    recipes.to_csv(recipes_path, index=False)
+    return model_path, recipes_path
+
+
+@pytest.fixture
+def synthetic_engine(synthetic_paths):
+    """Engine backed by the synthetic model and recipes"""
+    model_path, recipes_path = synthetic_paths
+    return OptimizedSearchEngine(model_path=model_path, recipes_path=recipes_path)
+
+
+@pytest.fixture
+def search_engine(synthetic_paths):
     """Fixture to create and return an instance of OptimizedSearchEngine"""
-    search = OptimizedSearchEngine(model_path=MODEL_PATH, recipes_path=RECIPES_PATH)
+    model_path, recipes_path = synthetic_paths
+    search = OptimizedSearchEngine(model_path=model_path, recipes_path=recipes_path)
     return search
 
 
-def test_load_model(search_engine):
+def test_load_model(search_engine, synthetic_paths):
     """Test if the model loads correctly"""
-    search_engine.load_model(MODEL_PATH)
+    search_engine.load_model(synthetic_paths[0])
     assert search_engine.model is not None, "Model should be loaded"
     assert len(search_engine.vocabulary) > 0, "Vocabulary should be non-empty"
     print("load_model test passed!")
 
 
-def test_load_recipes(search_engine):
-    """Test if the recipes load correctly and vectors are precomputed"""
-    search_engine.load_recipes(RECIPES_PATH)
+def test_load_recipes(search_engine, synthetic_paths):
+    """Test if the recipes load correctly and the token index is precomputed"""
+    search_engine.load_recipes(synthetic_paths[1])
     assert search_engine.recipes is not None, "Recipes should be loaded"
-    assert len(search_engine.document_vectors) > 0, "Document vectors should be precomputed"
+    assert len(search_engine.doc_offsets) == len(search_engine.recipes) + 1, "Recipe token index should be precomputed"
+    assert len(search_engine.doc_token_ids) > 0, "Recipe token ids should be precomputed"
     print("load_recipes test passed!")
 
 
@@ -58,21 +105,583 @@ def test_search(search_engine):
     """Test the search functionality"""
     query = "chocolate cake"
     results = search_engine.search(query)
+    cards = search_engine.cards.cards(search_engine.search_results(query))
     
     assert len(results) > 0, "Search should return results"
-    assert 'relevance_score' in results[0], "Results should contain relevance scores"
+    assert [card["id"] for card in cards] == results, "Cards should follow the result order"
+    assert 'relevance_score' in cards[0], "Results should contain relevance scores"
     print("search test passed!")
 
 
-def test_save_model(search_engine):
-    """Test if the model and vectors are saved correctly"""
-    search_engine.save_model("test_model_path")
+def test_save_model(search_engine, tmp_path):
+    """Test if the model is saved correctly"""
+    model_path = str(tmp_path / "test_model_path")
+    search_engine.save_model(model_path)
     
-    # Check if model and vectors are saved
-    assert os.path.exists("test_model_path"), "Model file should exist"
-    assert os.path.exists("test_model_path_vectors.npy"), "Document vectors file should exist"
+    # Check if the model is saved (recipe vectors live in the search index, see save_index)
+    assert os.path.exists(model_path), "Model file should exist"
+    assert KeyedVectors.load(model_path).index_to_key == search_engine.model.index_to_key
     print("save_model test passed!")
 
 
+def test_vectorized_scores_match_reference(synthetic_engine):
+    """Test that the batched scoring reproduces compute_avg_log_likelihood for every recipe"""
+    for query in ["chocolate cake", "chicken lemon", "cheese cheese eggs", "garlic unknownword"]:
+        expected = np.array([
+            synthetic_engine.compute_avg_log_likelihood(query, ' '.join(tokens))
+            for _, tokens in SYNTHETIC_RECIPES
+        ])
+        scores = synthetic_engine.execute_search_Word2Vec(query)
+        assert np.allclose(scores, expected, atol=1e-5), f"Scores diverge for {query!r}"
+        assert list(np.argsort(-scores, kind="stable")[:3]) == list(np.argsort(-expected, kind="stable")[:3])
+    print("vectorized scoring test passed!")
+
+
+def test_index_round_trip(synthetic_engine, tmp_path):
+    """Test that an engine loaded from the memory-mapped index scores like the original"""
+    index_path = str(tmp_path / "search_index")
+    synthetic_engine.save_index(index_path)
+    loaded = OptimizedSearchEngine(index_path=index_path)
+
+    assert loaded.model is None, "Index load should not need the gensim model"
+    assert isinstance(loaded.word_vectors, np.memmap), "Word vectors should be memory-mapped"
+    assert isinstance(loaded.term_doc_ids, np.memmap), "The inverted index should be stored, not rebuilt"
+    assert np.array_equal(loaded.term_doc_ids, synthetic_engine.term_doc_ids)
+    assert np.array_equal(loaded.term_offsets, synthetic_engine.term_offsets)
+    assert loaded.recipe_metadata["Title"][0] == "Chocolate Cake"
+    for query in ["chocolate cake", "chicken soup"]:
+        assert np.allclose(loaded.execute_search_Word2Vec(query), synthetic_engine.execute_search_Word2Vec(query))
+    assert loaded.preprocess_query("chocolat cake") == synthetic_engine.preprocess_query("chocolat cake")
+
+    # Indexes are versioned directories behind a symlink that each write repoints
+    first_version = os.path.realpath(index_path)
+    assert os.path.islink(index_path) and first_version != index_path
+    # An engine loaded from an index (no model or CSV) can be saved again, with its runtime additions
+    added = loaded.add_recipe("db:5", ["chicken", "soup", "garlic"], {"Title": "Garlic Soup", "recipe_id": 5})
+    expected = loaded.search_json("garlic chicken soup", top_k=4)
+    before = loaded.search("chicken soup", top_k=3)
+    loaded.save_index(index_path)
+    second_version = os.path.realpath(index_path)
+    assert second_version != first_version and os.path.exists(first_version), "The previous version is kept"
+    assert loaded.search("chicken soup", top_k=3) == before
+    reloaded = OptimizedSearchEngine(index_path=index_path)
+    assert len(reloaded.doc_offsets) - 1 == len(SYNTHETIC_RECIPES) + 1
+    assert reloaded.search_json("garlic chicken soup", top_k=4) == expected
+    assert reloaded.recipe_metadata["Title"][added] == "Garlic Soup" and reloaded.recipe_ids[added] == -1
+    assert orjson.loads(reloaded.cards.fragment(added) + b"}")["recipe_id"] == 5
+    reloaded.save_index(index_path)
+    assert not os.path.exists(first_version) and os.path.exists(second_version), "Older versions are removed"
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("search_index")) == sorted(
+        ["search_index", os.path.basename(second_version), os.path.basename(os.path.realpath(index_path))])
+
+    # Indexes written before the inverted index was stored rebuild it at load time
+    manifest_path = os.path.join(os.path.realpath(index_path), "manifest.json")
+    with open(manifest_path) as f:
+        manifest = orjson.loads(f.read())
+    del manifest["arrays"]["term_doc_ids"], manifest["arrays"]["term_offsets"]
+    with open(manifest_path, "wb") as f:
+        f.write(orjson.dumps(manifest))
+    legacy = OptimizedSearchEngine(index_path=index_path)
+    assert not isinstance(legacy.term_doc_ids, np.memmap)
+    assert np.array_equal(legacy.term_doc_ids, reloaded.term_doc_ids)
+    print("index round trip test passed!")
+
+
+def test_spelling_index_matches_linear_scan(synthetic_engine):
+    """Test that SymSpell lookups find a word at the same distance as a full Levenshtein scan"""
+    vocab = list(synthetic_engine.word_index)
+    for word in ["chedder", "recpie", "chiken", "tomatto", "omlette", "bsil", "xyzzyq"]:
+        corrected = synthetic_engine.correct_word(word)
+        best = min(distance(word, v) for v in vocab)
+        if best <= 2:
+            assert distance(word, corrected) == best, f"{word!r} corrected to {corrected!r}"
+        else:
+            assert corrected == word, "Words too far from the vocabulary should be left alone"
+    assert synthetic_engine.preprocess_query("recpie chedder cheese") == "recipe cheddar cheese"
+    print("spelling index test passed!")
+
+
+def test_candidate_pruning(synthetic_engine):
+    """Test that scoring a candidate subset matches the full scan on those recipes"""
+    engine = synthetic_engine
+    engine.min_candidates = 1
+    engine.candidate_neighbours = 0
+    query_ids = engine._query_token_ids("chicken soup")
+    doc_ids = engine._candidate_docs(query_ids, engine._query_similarities(query_ids))
+    titles = set(engine.recipes['Title'].iloc[doc_ids])
+    assert titles == {"Roast Chicken", "Chicken Noodle Soup"}, f"Unexpected candidates {titles}"
+
+    full_scores = engine.execute_search_Word2Vec("chicken soup")
+    assert np.allclose(engine.execute_search_Word2Vec("chicken soup", doc_ids), full_scores[doc_ids])
+    assert engine.search("chicken soup", top_k=2) == list(doc_ids[np.argsort(-full_scores[doc_ids])])
+
+    # Too few candidates falls back to scoring every recipe
+    engine.min_candidates = 100
+    assert engine._candidate_docs(query_ids, engine._query_similarities(query_ids)) is None
+    assert len(engine.search("chicken soup", top_k=8)) == 8
+    print("candidate pruning test passed!")
+
+
+def test_ann_modes(synthetic_engine):
+    """Test the IVF retrieval modes against exact scoring"""
+    engine = synthetic_engine
+    engine.ann_n_probe = engine._ensure_ann_index().n_lists  # probing every list makes ANN exhaustive
+    for mode in ("ann", "ann_rerank"):
+        results = engine.search("chocolate cake", top_k=3, mode=mode)
+        assert len(results) == 3 and len(set(results)) == 3, f"{mode} should return 3 distinct recipes"
+    assert engine.search("chocolate cake", top_k=8, mode="ann_rerank") == engine.search("chocolate cake", top_k=8)
+
+    report = engine.ann_recall_at_k(["chocolate cake", "chicken soup", "garlic bread"], top_k=3)
+    assert report["ann_rerank"] == 1.0, f"Exhaustive rerank should have full recall, got {report}"
+    with pytest.raises(ValueError):
+        engine.search("chocolate cake", mode="fuzzy")
+    print("ann modes test passed!")
+
+
+def test_ann_with_deletions(synthetic_engine):
+    """Test that tombstoned recipes do not shorten ann_rerank pages and that an empty corpus has an index"""
+    engine = synthetic_engine
+    engine.ann_n_probe = engine._ensure_ann_index().n_lists
+    engine.ann_rerank_factor = 1  # the candidate set is exactly one page
+    for doc_id in engine.search("chicken soup", top_k=2, mode="ann"):
+        engine.delete_recipe(doc_id)
+    results = engine.search("chicken soup", top_k=3, mode="ann_rerank")
+    assert len(results) == 3, f"Deleted candidates should be replaced, got {results}"
+
+    # Merging rebuilds the IVF index on the merging thread, so the next ANN search does not
+    added = engine.add_recipe("db:9", ["chicken", "soup", "lemon"], {"Title": "Lemon Chicken Soup"})
+    engine.merge_delta()
+    assert engine.ann_index is not None and len(engine.ann_index.vectors) == len(engine.doc_offsets) - 1
+    assert added in engine.search("lemon chicken soup", top_k=3, mode="ann")
+
+    index = IVFIndex(np.zeros((0, 4), dtype=np.float32))
+    ids, scores = index.search(np.ones(4, dtype=np.float32), 5)
+    assert index.n_lists == 0 and len(ids) == 0 and len(scores) == 0
+    print("ann deletions test passed!")
+
+
+def test_top_k_selection():
+    """Test argpartition and heap top-k against a full stable sort, including ties and NaN"""
+    rng = np.random.default_rng(0)
+    scores = np.round(rng.normal(size=500), 1)
+    scores[[3, 77]] = np.nan
+    ranked = np.lexsort((np.arange(len(scores)), -np.nan_to_num(scores, nan=-np.inf)))
+    for k, offset in [(5, 0), (10, 20), (50, 480), (1, 499), (0, 0)]:
+        expected = list(ranked[offset:offset + k])
+        assert list(top_k_indices(scores, k, offset)) == expected
+
+        heap = StreamingTopK(k, offset)
+        for start in range(0, len(scores), 64):
+            heap.push(scores[start:start + 64], np.arange(start, min(start + 64, len(scores))))
+        assert list(heap.result()[0]) == expected
+    print("top k selection test passed!")
+
+
+def test_chunked_search_and_pagination(synthetic_engine):
+    """Test that chunked scoring and offset pages agree with a single dense pass"""
+    engine = synthetic_engine
+    engine.query_cache.max_entries = 0
+    dense = engine.search("cheese eggs", top_k=8)
+    engine.score_chunk_size = 3
+    # Both the per-word cache path and the streaming heap path
+    for word_cache_bytes in (64 * 1024 * 1024, 0):
+        engine.word_cache.clear()
+        engine.word_cache.max_bytes = word_cache_bytes
+        assert engine.search("cheese eggs", top_k=8) == dense
+        assert engine.search("cheese eggs", top_k=3, offset=2) == dense[2:5]
+    print("chunked search test passed!")
+
+
+def test_query_cache_lru_and_ttl():
+    """Test LRU eviction, TTL expiry and counters of the result cache"""
+    now = [0.0]
+    cache = QueryCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.put("a", (1,))
+    cache.put("b", (2,))
+    assert cache.get("a") == (1,)
+    cache.put("c", (3,))  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    now[0] = 11.0
+    assert cache.get("a") is None, "Entries should expire after the TTL"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (1, 2, 1, 1)
+    print("query cache test passed!")
+
+
+def test_search_results_are_cached(synthetic_engine):
+    """Test that corrected queries share cache entries and reloads invalidate them"""
+    engine = synthetic_engine
+    first = engine.search("chocolat cake", top_k=3)
+    assert engine.search("chocolate cake", top_k=3) == first
+    assert engine.query_cache.stats()["hits"] == 1
+    engine._invalidate_caches()
+    assert engine.query_cache.stats()["size"] == 0
+
+    # A search overtaken by a recipe update must not cache its now stale result
+    run_search = engine._run_search
+
+    def overtaken(*args):
+        results = run_search(*args)
+        engine.add_recipe("db:9", ["chocolate", "cake", "cocoa"], {"Title": "New Cake"})
+        return results
+
+    engine._run_search = overtaken
+    stale = engine.search("chocolate cake", top_k=3)
+    engine._run_search = run_search
+    assert engine.query_cache.stats()["size"] == 0 and engine.query_cache.stats()["stale_puts"] == 1
+    fresh = engine.search("chocolate cake", top_k=3)
+    assert fresh != stale and len(SYNTHETIC_RECIPES) in fresh
+    print("search cache test passed!")
+
+
+def test_word_score_cache(synthetic_engine):
+    """Test that queries assembled from cached per-word vectors score like the direct computation"""
+    engine = synthetic_engine
+    engine.query_cache.max_entries = 0
+    engine.prune_candidates = False
+    query = "cheese cheese chicken"
+    query_ids = engine._query_token_ids(query)
+    query_sims = engine._query_similarities(query_ids)
+    expected = engine.execute_search_Word2Vec(query)
+
+    ids, scores = engine._top_docs(query_ids, query_sims, None, top_k=8)
+    assert np.allclose(scores, expected[ids], atol=1e-6)
+    assert engine.word_cache.stats()["words"] == 2
+    ids_cached, scores_cached = engine._top_docs(query_ids, query_sims, None, top_k=8)
+    assert list(ids_cached) == list(ids) and engine.word_cache.stats()["hits"] == 2
+
+    # Candidate subsets slice the cached vectors
+    doc_ids = np.array([1, 3, 7])
+    _, subset_scores = engine._top_docs(query_ids, query_sims, doc_ids, top_k=3)
+    assert np.allclose(np.sort(subset_scores), np.sort(expected[doc_ids]), atol=1e-6)
+
+    # A budget smaller than two vectors keeps only the most recent word
+    engine.word_cache.clear()
+    engine.word_cache.max_bytes = len(expected) * 4
+    engine._top_docs(query_ids, query_sims, None, top_k=8)
+    assert engine.word_cache.stats()["words"] == 1 and engine.word_cache.stats()["evictions"] == 1
+    print("word score cache test passed!")
+
+
+def test_sharded_scoring(synthetic_engine, monkeypatch):
+    """Test that merging per-shard top-k lists reproduces the single-shard ranking"""
+    import search_engine
+    monkeypatch.setattr(search_engine, "MIN_SHARD_DOCS", 1)
+    engine = synthetic_engine
+    engine.query_cache.max_entries = 0
+    engine.prune_candidates = False
+    expected = {query: engine.search(query, top_k=6) for query in ["chicken lemon", "cake frosting"]}
+    engine.num_shards = 3
+    assert len(engine._shard_ranges(8)) == 3
+    for word_cache_bytes in (0, 64 * 1024 * 1024):
+        engine.word_cache.max_bytes = word_cache_bytes
+        for query, ranking in expected.items():
+            assert engine.search(query, top_k=6) == ranking
+            assert engine.search(query, top_k=2, offset=3) == ranking[3:5]
+    print("sharded scoring test passed!")
+
+
+def test_search_many_matches_search(synthetic_engine):
+    """Test that the batched pass ranks every query like a full-scan search"""
+    engine = synthetic_engine
+    engine.prune_candidates = False
+    queries = ["chocolate cake", "chiken soup", "cheese cheese eggs", "unknownword", "garlic"]
+    expected = [engine.search(query, top_k=4, offset=1) for query in queries]
+    engine.batch_size = 2
+    engine.score_chunk_size = 3
+    assert engine.search_many(queries, top_k=4, offset=1) == expected
+    print("search_many test passed!")
+
+
+def test_token_column_parsing():
+    """Test that the vectorized parser agrees with eval and whitespace splitting"""
+    cells = pd.Series(["['chocolate', 'cake', 'cake']", "[]", None, "['lemon']"])
+    tokens = parse_token_column(cells)
+    assert [tokens.doc(i) for i in range(len(tokens))] == [["chocolate", "cake", "cake"], [], [], ["lemon"]]
+    assert tokens.codes.dtype == np.int32 and len(tokens.vocab) == 3
+
+    plain = parse_token_column(pd.Series(["garlic bread", "  toast "]))
+    assert [plain.doc(i) for i in range(len(plain))] == [["garlic", "bread"], ["toast"]]
+    print("token column parsing test passed!")
+
+
+def test_npz_recipes_match_csv(synthetic_engine, tmp_path):
+    """Test that recipes saved as .npz load into the same search layout as the CSV"""
+    npz_path = str(tmp_path / "cleaned_recipe_data.npz")
+    save_recipes_npz(npz_path, synthetic_engine.recipes, synthetic_engine.recipe_tokens)
+    engine = OptimizedSearchEngine(recipes_path=npz_path)
+    engine.model = synthetic_engine.model
+    engine._build_word_matrix()
+    engine._build_doc_index()
+    assert "combined_cleaned" not in synthetic_engine.recipes.columns, "Token column should not stay in the frame"
+    assert engine.recipes["Title"].tolist() == synthetic_engine.recipes["Title"].tolist()
+    assert np.array_equal(engine.doc_token_ids, synthetic_engine.doc_token_ids)
+    assert np.array_equal(engine.doc_offsets, synthetic_engine.doc_offsets)
+    print("npz recipes test passed!")
+
+
+def test_streamed_corpus_matches_batch(synthetic_engine, tmp_path, monkeypatch):
+    """Test that recipes written chunk by chunk match the CSV and the one-shot .npz"""
+    recipes = synthetic_engine.recipes.assign(combined_cleaned=[
+        " ".join(synthetic_engine.recipe_tokens.doc(i)) for i in range(len(synthetic_engine.recipes))])
+    csv_path, npz_path = str(tmp_path / "streamed.csv"), str(tmp_path / "streamed.npz")
+    writer = RecipeCorpusWriter(csv_path, npz_path)
+    for start in range(0, len(recipes), 3):
+        writer.write(recipes.iloc[start:start + 3])
+    writer.close()
+    assert writer.num_recipes == len(recipes)
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("recipes-")], "Scratch files should be removed"
+
+    for frame, tokens in [load_recipes_csv(csv_path), load_recipes_npz(npz_path)]:
+        assert frame["Title"].tolist() == recipes["Title"].tolist()
+        assert frame["index"].tolist() == recipes["index"].tolist()
+        assert [tokens.doc(i) for i in range(len(tokens))] == \
+            [synthetic_engine.recipe_tokens.doc(i) for i in range(len(recipes))]
+
+    # CSV only (save_recipes.py --npz ''): nothing is spooled, in the working directory or its parent
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    writer = RecipeCorpusWriter("csv_only.csv", None)
+    writer.write(recipes)
+    assert writer._scratch is None
+    writer.close()
+    assert os.listdir(workdir) == ["csv_only.csv"]
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("recipes-")]
+    assert load_recipes_csv("csv_only.csv")[0]["Title"].tolist() == recipes["Title"].tolist()
+    print("streamed corpus test passed!")
+
+
+def test_incremental_updates(synthetic_engine):
+    """Test that added, replaced and deleted recipes show up in search before and after a merge"""
+    engine = synthetic_engine
+    engine.prune_candidates = False
+    num_docs = len(engine.recipes)
+    queries = ["chicken soup", "chocolate cake", "unknownword", "garlic bread"]
+
+    added = engine.add_recipe("db:1", ["chicken", "soup", "noodle", "broth", "celery"], {"Title": "Soup 2"})
+    assert added == num_docs, "New recipes continue the recipe id sequence"
+    assert added in engine.search("chicken soup", top_k=2)
+    assert engine.add_recipe("db:1", ["chocolate", "cake", "cocoa"]) == num_docs + 1
+    assert added not in engine.search("chicken soup", top_k=num_docs + 2), "Replaced recipes should be dropped"
+    assert num_docs + 1 in engine.search("chocolate cake", top_k=2)
+    engine.delete_recipe(3)  # Chicken Noodle Soup from the CSV
+    assert 3 not in engine.search("chicken soup", top_k=num_docs + 2)
+    assert 3 not in engine.search("chicken soup", top_k=3, mode="ann")
+
+    before = {query: engine.search(query, top_k=3, offset=1) for query in queries}
+    assert engine.search_many(queries, top_k=3, offset=1) == list(before.values())
+    engine.word_cache.max_bytes = 0
+    engine.score_chunk_size = 3
+    assert [engine.search(query, top_k=3, offset=1) for query in queries] == list(before.values())
+    assert engine.merge_delta() == 2
+    assert len(engine.delta) == 0 and len(engine.doc_offsets) - 1 == num_docs + 2
+    for query, expected in before.items():
+        assert engine.search(query, top_k=3, offset=1) == expected, "Merging should not change results"
+        assert engine.search_many([query], top_k=3, offset=1) == [expected]
+
+    assert engine.remove_recipe("db:1")
+    assert num_docs + 1 not in engine.search("chocolate cake", top_k=num_docs + 2)
+    print("incremental updates test passed!")
+
+
+def test_search_json_cards(synthetic_engine, tmp_path):
+    """Test that search responses carry recipe cards and scores matching the ranking"""
+    engine = synthetic_engine
+    payload = orjson.loads(engine.search_json("chicken soup", top_k=3))
+    results = engine.search_results("chicken soup", top_k=3)
+    assert payload["result"] == results.doc_ids.tolist() == engine.search("chicken soup", top_k=3)
+    first = payload["recipes"][0]
+    assert first["id"] == payload["result"][0]
+    assert first["Title"] == engine.recipes["Title"].iloc[first["id"]]
+    assert first["Image_Name"] == f"image-{first['id']}"
+    assert first["Snippet"] and len(first["Snippet"]) <= 163
+    assert [card["relevance_score"] for card in payload["recipes"]] == pytest.approx(results.scores.tolist())
+
+    # Cards survive the round trip through a prebuilt index, and runtime additions get one too
+    index_path = str(tmp_path / "search_index")
+    engine.save_index(index_path)
+    loaded = OptimizedSearchEngine(index_path=index_path)
+    assert orjson.loads(loaded.search_json("chicken soup", top_k=3)) == payload
+    added = loaded.add_recipe("db:7", ["chicken", "soup"], {"Title": "New Soup", "recipe_id": 7})
+    cards = orjson.loads(loaded.search_json("chicken soup", top_k=10))["recipes"]
+    card = next(card for card in cards if card["id"] == added)
+    assert {"id": added, "recipe_id": 7, "Title": "New Soup"}.items() <= card.items() and "index" not in card, \
+        "Database recipes are told apart from dataset rows"
+    print("search json test passed!")
+
+
+def test_search_stage_metrics(synthetic_engine):
+    """Test that searches record per-stage timings and cache outcomes for /metrics"""
+    engine = synthetic_engine
+    before = {stage: SEARCH_STAGE_SECONDS.count(stage=stage)
+              for stage in ["typo_correction", "candidate_generation", "scoring", "top_k", "serialization"]}
+    misses = SEARCHES_TOTAL.value(mode="exact", cache="miss")
+    hits = SEARCHES_TOTAL.value(mode="exact", cache="hit")
+    engine.search_json("chiken soup", top_k=3)
+    engine.search_json("chiken soup", top_k=3)
+    after = {stage: SEARCH_STAGE_SECONDS.count(stage=stage) for stage in before}
+    assert after["typo_correction"] - before["typo_correction"] == 2
+    assert after["serialization"] - before["serialization"] == 2
+    # The second search is a cache hit and skips candidate generation, scoring and top-k
+    for stage in ["candidate_generation", "scoring", "top_k"]:
+        assert after[stage] - before[stage] == 1, stage
+    assert SEARCHES_TOTAL.value(mode="exact", cache="miss") == misses + 1
+    assert SEARCHES_TOTAL.value(mode="exact", cache="hit") == hits + 1
+
+    text = REGISTRY.render()
+    assert 'search_stage_seconds_bucket{stage="scoring",le="+Inf"}' in text
+    assert 'searches_total{mode="exact",cache="hit"}' in text
+    print("search metrics test passed!")
+
+
+def test_reload_from_new_corpus(synthetic_engine, synthetic_paths, tmp_path):
+    """Test that reloading with a new model or CSV rebuilds from it instead of the prebuilt index"""
+    model_path, recipes_path = synthetic_paths
+    index_path = str(tmp_path / "search_index")
+    synthetic_engine.save_index(index_path)
+    defaults = {"default_model": model_path, "default_recipes": recipes_path, "default_index": index_path}
+    factory = lambda **paths: OptimizedSearchEngine(**engine_sources(**paths, **defaults))
+    num_docs = lambda engine: len(engine.doc_offsets) - 1
+
+    executor = SearchExecutor(factory(), max_workers=1)
+    reloader = SearchReloader(executor, factory, drain_timeout=5)
+    assert executor.engine.index_path == index_path and num_docs(executor.engine) == len(SYNTHETIC_RECIPES)
+
+    smaller_path = str(tmp_path / "smaller.csv")
+    pd.read_csv(recipes_path).head(3).to_csv(smaller_path, index=False)
+    reloader.reload(recipes_path=smaller_path)
+    assert num_docs(executor.engine) == 3 and executor.engine.model is not None
+    assert executor.engine.index_path is None
+    with pytest.raises(ValueError):
+        reloader.reload(recipes_path=smaller_path, index_path=index_path)
+    with pytest.raises(FileNotFoundError):
+        reloader.reload(model_path=str(tmp_path / "missing_model"))
+    reloader.reload()
+    assert num_docs(executor.engine) == len(SYNTHETIC_RECIPES), "No paths means the default index again"
+
+    # A changed CSV is picked up by the watcher the same way
+    reloader.watch({"model_path": model_path, "recipes_path": smaller_path, "index_path": index_path}, 0.05)
+    pd.read_csv(recipes_path).head(5).to_csv(smaller_path, index=False)
+    for _ in range(100):
+        if reloader.reloads == 3:
+            break
+        time.sleep(0.05)
+    reloader.stop()
+    executor.shutdown()
+    assert reloader.reloads == 3 and num_docs(executor.engine) == 5, reloader.last_reload
+    print("reload from new corpus test passed!")
+
+
+def test_index_recipe_service(synthetic_engine, monkeypatch):
+    """Test that database recipes are cleaned, indexed, replaced and removed through search_service"""
+    monkeypatch.setattr(search_service, "_updates", {})
+    monkeypatch.setattr(search_service, "_engine", None)
+    recipe = SimpleNamespace(id=41, title="Chicken Noodle Soup", description="Soup with 2 cups of broth",
+                             ingredients="chicken, noodle, carrots", instructions="Simmer the chicken.",
+                             image_url=None)
+    assert search_service.index_recipe(recipe) is None, "Nothing to index into before set_engine"
+    search_service.set_engine(synthetic_engine)
+    doc_id = search_service.index_recipe(recipe)
+    assert doc_id == len(SYNTHETIC_RECIPES)
+    tokens, metadata = search_service._updates["db:41"]
+    assert "cups" not in tokens and "with" not in tokens and {"chicken", "noodle", "soup", "broth"} <= set(tokens)
+    assert metadata == {"Title": "Chicken Noodle Soup", "Image_Name": "", "Instructions": "Simmer the chicken.",
+                        "recipe_id": 41}
+    assert doc_id in synthetic_engine.search("chicken noodle soup", top_k=3)
+
+    recipe.title, recipe.description, recipe.ingredients = "Chocolate Cake", "", "cocoa, eggs"
+    replaced = search_service.index_recipe(recipe)
+    assert replaced != doc_id and replaced in synthetic_engine.search("chocolate cake", top_k=3)
+    assert doc_id not in synthetic_engine.search("chicken noodle soup", top_k=len(SYNTHETIC_RECIPES) + 2)
+    assert search_service.unindex_recipe(41) and "db:41" not in search_service._updates
+    assert replaced not in synthetic_engine.search("chocolate cake", top_k=len(SYNTHETIC_RECIPES) + 2)
+    assert not search_service.unindex_recipe(41)
+    print("index recipe service test passed!")
+
+
+def test_benchmark_report(tmp_path):
+    """Test that the search benchmark generates a corpus and reports every mode"""
+    from benchmarks.bench_search import run, slo_violations
+
+    report = run(num_recipes=300, vocab_size=200, vector_size=8, tokens_per_recipe=10, num_queries=10,
+                 data_dir=str(tmp_path), measure_load_paths=False)
+    assert set(report["modes"]) == {"exact", "ann", "ann_rerank"}
+    for stats in report["modes"].values():
+        assert stats["clean"]["count"] == 10 and stats["clean"]["p50_ms"] <= stats["clean"]["p99_ms"]
+    assert 0 <= report["typo_correction"]["corrected_fraction"] <= 1
+    assert report["batch"]["queries"] == 10
+    assert report["params"]["recipes"] == 300
+    assert slo_violations(report, float("inf")) == []
+    print("benchmark report test passed!")
+
+
+def test_quantized_vectors(synthetic_engine, synthetic_paths, tmp_path):
+    """Test float16/int8 word vectors against float32 scoring and through the index"""
+    model_path, recipes_path = synthetic_paths
+    assert not hasattr(synthetic_engine.model, "syn1neg"), "Only the KeyedVectors should be kept"
+    vectors = synthetic_engine.word_vectors
+    queries = np.ascontiguousarray(vectors[:3])
+    for dtype, tolerance in [("float16", 1e-3), ("int8", 2e-2)]:
+        data, scales = quantize(vectors, dtype)
+        assert data.dtype == np.dtype(dtype) and data.nbytes < vectors.nbytes
+        assert np.allclose(dequantize(data, scales), vectors, atol=tolerance)
+        assert np.allclose(similarities(data, scales, queries, block_rows=7), queries @ vectors.T, atol=tolerance)
+
+    engine = OptimizedSearchEngine(model_path=model_path, recipes_path=recipes_path, vector_dtype="int8",
+                                   keep_model=False)
+    assert engine.word_vectors.dtype == np.int8 and engine.word_scales is not None
+    assert engine.model is None, "The float32 gensim vectors should not outlive quantizing"
+    with pytest.raises(RuntimeError):
+        engine.compute_avg_log_likelihood("chocolate cake", "chocolate cake")
+    query = "chocolate cake"
+    assert np.allclose(engine.execute_search_Word2Vec(query), synthetic_engine.execute_search_Word2Vec(query), atol=1e-2)
+    agreement = synthetic_engine.vector_agreement(["chocolate cake", "chicken lemon", "garlic bread"], "int8", top_k=5)
+    assert agreement["queries"] == 3 and agreement["overlap_at_k"] >= 0.8
+    assert synthetic_engine.word_vectors.dtype == np.float32, "vector_agreement should restore the vectors"
+
+    index_path = str(tmp_path / "search_index")
+    engine.save_index(index_path)
+    loaded = OptimizedSearchEngine(index_path=index_path)
+    assert isinstance(loaded.word_vectors, np.memmap) and loaded.word_vectors.dtype == np.int8
+    assert loaded.search(query, 3) == engine.search(query, 3)
+    assert OptimizedSearchEngine(index_path=index_path, vector_dtype="float32").word_vectors.dtype == np.float32
+    print("quantized vectors test passed!")
+
+
+def test_ingredient_suggestions(synthetic_engine):
+    """Test ingredient coverage ranking, near matches and runtime updates"""
+    engine = synthetic_engine
+    exact = IngredientIndex(engine, near_threshold=2.0)  # no near matches
+    cards = exact.suggest(["Chicken", "garlic", "lemon", "unobtainium"], top_k=3)
+    # One-ingredient matches tie; the recipe with the fewest distinct words comes first
+    assert [card["Title"] for card in cards] == ["Roast Chicken", "Garlic Bread", "Tomato Basil Pasta"]
+    assert cards[0]["relevance_score"] == 0.75 and cards[0]["matched_ingredients"] == ["Chicken", "garlic", "lemon"]
+    assert cards[0]["missing_ingredients"] == ["unobtainium"]
+    assert exact.suggest(["garlc bread"], top_k=2)[0]["Title"] == "Garlic Bread", "Typos are corrected"
+    assert exact.suggest(["cheese"], top_k=10, min_coverage=0.5) == exact.suggest(["cheese"], top_k=10)
+    assert len(exact.suggest(["cheese"], top_k=10)) == 2
+    assert exact.suggest(["unobtainium"]) == []
+
+    # Near matches count the mean of each word's best similarity in the recipe
+    near = IngredientIndex(engine, near_threshold=-1.0, near_neighbours=engine.word_vectors.shape[0])
+    cards = near.suggest(["garlic", "cocoa"], top_k=len(engine.recipes))
+    assert len(cards) == len(engine.recipes) and all(not card["missing_ingredients"] for card in cards)
+    for card in cards:
+        tokens = engine.recipe_tokens.doc(card["id"])
+        credits = [1.0 if word in tokens else max(engine.model.similarity(word, token) for token in tokens)
+                   for word in ("garlic", "cocoa")]
+        assert np.isclose(card["relevance_score"], np.mean(credits), atol=1e-5)
+
+    added = engine.add_recipe("db:1", ["chicken", "garlic", "lemon"], {"Title": "Quick Lemon Chicken"})
+    cards = exact.suggest(["chicken", "garlic", "lemon"], top_k=2)
+    assert [card["id"] for card in cards] == [added, 2], "Shorter recipes win ties"
+    engine.delete_recipe(2)
+    assert engine.merge_delta() == 1
+    cards = exact.suggest(["chicken", "garlic", "lemon"], top_k=2)
+    assert cards[0]["id"] == added and 2 not in [card["id"] for card in cards]
+    print("ingredient suggestions test passed!")
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import search_service
+from search_executor import SearchExecutor, SearchOverloadedError, SearchTimeoutError
+from search_reload import SearchReloader
+
+
+class SlowEngine:
+    """Stand-in engine whose searches block until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def search(self, query, top_k=5, mode="exact", offset=0):
+        self.release.wait(5)
+        return [len(query), top_k]
+
+
+def test_search_runs_off_the_event_loop():
+    """Test that a blocked search leaves the event loop free to serve other work"""
+    engine = SlowEngine()
+    executor = SearchExecutor(engine, max_workers=1, max_queue=0, timeout=5)
+
+    async def scenario():
+        search = asyncio.ensure_future(executor.submit("search", "chicken", 3))
+        started = time.monotonic()
+        await asyncio.sleep(0.05)  # the loop keeps ticking while the search blocks
+        assert time.monotonic() - started < 1
+        engine.release.set()
+        return await search
+
+    assert asyncio.run(scenario()) == [7, 3]
+    executor.shutdown()
+    print("event loop test passed!")
+
+
+def test_backpressure_and_timeout():
+    """Test 503-style rejection when saturated and timeouts on slow searches"""
+    engine = SlowEngine()
+    executor = SearchExecutor(engine, max_workers=1, max_queue=1, timeout=0.1)
+
+    async def scenario():
+        first = asyncio.ensure_future(executor.submit("search", "a"))
+        second = asyncio.ensure_future(executor.submit("search", "b"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(SearchOverloadedError):
+            await executor.submit("search", "c")
+        with pytest.raises(SearchTimeoutError):
+            await first
+        # Timed-out work still counts until the pool actually finishes it
+        assert executor.in_flight >= 1
+        engine.release.set()
+        with pytest.raises(SearchTimeoutError):
+            await second
+
+    asyncio.run(scenario())
+    executor.shutdown()
+    assert executor.stats()["rejected"] == 1
+    print("backpressure test passed!")
+
+
+def test_hot_reload_drains_old_engine():
+    """Test that a reload sends new searches to the new engine while the old one drains"""
+    old, new = SlowEngine(), SlowEngine()
+    new.release.set()
+    executor = SearchExecutor(old, max_workers=2, max_queue=2, timeout=5)
+    reloader = SearchReloader(executor, lambda: new, drain_timeout=5)
+
+    async def scenario():
+        running = asyncio.ensure_future(executor.submit("search", "old"))
+        await asyncio.sleep(0.05)
+        reload = asyncio.get_running_loop().run_in_executor(None, reloader.reload)
+        await asyncio.sleep(0.05)
+        # The old engine is still blocked, so this only returns if it ran on the new one
+        assert executor.engine is new
+        assert await executor.submit("search", "new", 1) == [3, 1]
+        assert not reload.done(), "Reload should wait for the old engine to drain"
+        old.release.set()
+        assert await running == [3, 5]
+        return await reload
+
+    report = asyncio.run(scenario())
+    executor.shutdown()
+    assert report["drained"] and executor.slot.in_flight(old) == 0
+    assert reloader.status()["reloads"] == 1
+    print("hot reload test passed!")
+
+
+class RecordingEngine(SlowEngine):
+    """Stand-in engine that records the runtime recipes replayed into it"""
+
+    def __init__(self):
+        super().__init__()
+        self.release.set()
+        self.added = []
+
+    def add_recipe(self, key, tokens, metadata):
+        self.added.append(key)
+
+
+def test_reload_replays_only_into_its_service(monkeypatch):
+    """Test that runtime recipe updates are replayed only by a reloader given the service's replace_engine"""
+    monkeypatch.setattr(search_service, "_updates", {"db:7": (["stew"], {"Title": "Stew"})})
+    monkeypatch.setattr(search_service, "_engine", None)
+    executor = SearchExecutor(RecordingEngine(), max_workers=1)
+
+    unrelated = RecordingEngine()
+    SearchReloader(executor, lambda: unrelated, drain_timeout=1).reload()
+    assert executor.engine is unrelated and unrelated.added == []
+    assert search_service.get_engine() is None, "A reloader without a service must not touch it"
+
+    served = RecordingEngine()
+    SearchReloader(executor, lambda: served, drain_timeout=1,
+                   replace_engine=search_service.replace_engine).reload()
+    executor.shutdown()
+    assert executor.engine is served and served.added == ["db:7"]
+    assert search_service.get_engine() is served
+    print("reload replay test passed!")
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from spoonacular_client import SpoonacularClient, SpoonacularError, SpoonacularQuotaExceeded
+
+
+class StubSpoonacular(ThreadingHTTPServer):
+    """Local stand-in for api.spoonacular.com that counts calls and connections"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.calls = []
+        self.connections = set()
+        self.delay = 0.0
+        self.quota_left = 150
+        self.status = 200
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with server.lock:
+            server.calls.append((url.path, params))
+            server.connections.add(self.client_address)
+        time.sleep(server.delay)
+        body = json.dumps({"path": url.path, "query": params.get("query"),
+                           "results": [{"title": "Stub recipe"}]}).encode()
+        self.send_response(server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-API-Quota-Used", str(150 - server.quota_left))
+        self.send_header("X-API-Quota-Left", str(server.quota_left))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = StubSpoonacular()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def run(client: SpoonacularClient, scenario):
+    async def wrapped():
+        try:
+            return await scenario()
+        finally:
+            await client.aclose()
+    return asyncio.run(wrapped())
+
+
+def test_coalescing_cache_and_connection_reuse(stub):
+    """Test that identical concurrent requests make one API call and later ones are cached"""
+    stub.delay = 0.2
+    client = SpoonacularClient("key", base_url=stub.url, rate=0)
+
+    async def scenario():
+        results = await asyncio.gather(*[client.search_recipes(query="pasta", number=5) for _ in range(10)])
+        assert all(result["query"] == "pasta" for result in results)
+        await client.search_recipes(number=5, query="pasta")  # same parameters in another order
+        await client.search_recipes(query="soup", number=5)
+        await client.get_recipe_information(42)
+
+    run(client, scenario)
+    assert [path for path, _ in stub.calls] == ["/recipes/complexSearch", "/recipes/complexSearch",
+                                                "/recipes/42/information"]
+    assert all(params["apiKey"] == "key" for _, params in stub.calls)
+    assert len(stub.connections) == 1, "Sequential requests should reuse one keep-alive connection"
+    stats = client.stats()
+    assert stats["api_calls"] == 3 and stats["coalesced"] == 9 and stats["cache"]["hits"] == 1
+    print("coalescing and cache test passed!")
+
+
+def test_sqlite_persistence(stub, tmp_path):
+    """Test that a new client serves responses cached in the SQLite file by an earlier one"""
+    cache_path = str(tmp_path / "spoonacular.db")
+    first = SpoonacularClient("key", base_url=stub.url, cache_path=cache_path, rate=0)
+    run(first, lambda: first.search_recipes(query="curry"))
+    second = SpoonacularClient("key", base_url=stub.url, cache_path=cache_path, rate=0)
+    result = run(second, lambda: second.search_recipes(query="curry"))
+    assert result["query"] == "curry"
+    assert len(stub.calls) == 1
+    assert second.stats()["store_hits"] == 1
+    print("sqlite persistence test passed!")
+
+
+def test_rate_limit_and_quota(stub):
+    """Test request spacing, stopping at the reported quota and upstream errors"""
+    client = SpoonacularClient("key", base_url=stub.url, rate=20, burst=1)
+
+    async def spaced():
+        start = time.monotonic()
+        await asyncio.gather(*[client.search_recipes(query=f"q{i}") for i in range(4)])
+        return time.monotonic() - start
+
+    assert run(client, spaced) >= 0.14, "4 requests at 20/s with no burst take at least 3 intervals"
+
+    stub.quota_left = 0
+    client = SpoonacularClient("key", base_url=stub.url, rate=0)
+
+    async def exhausted():
+        await client.search_recipes(query="last")  # served, and reports no points left
+        with pytest.raises(SpoonacularQuotaExceeded) as e:
+            await client.search_recipes(query="over")
+        assert e.value.retry_after > 0
+        assert await client.search_recipes(query="last"), "Cached responses are still served"
+
+    run(client, exhausted)
+    assert [params["query"] for _, params in stub.calls[-1:]] == ["last"]
+
+    stub.quota_left = 150
+    stub.status = 500
+    client = SpoonacularClient("key", base_url=stub.url, rate=0)
+
+    async def failing():
+        with pytest.raises(SpoonacularError) as e:
+            await client.search_recipes(query="broken")
+        assert e.value.status_code == 500
+
+    run(client, failing)
+    assert client.stats()["cache"]["size"] == 0, "Errors should not be cached"
+    print("rate limit and quota test passed!")
@@ -0,0 +1,72 @@
+"""
+Text cleaning shared by the corpus build (save_recipes.py) and runtime
+indexing of database recipes (search_service.py), so both produce the same
+tokens.
+
+Only the standard library is used: NLTK's English stopword list is copied
+below instead of read from the nltk corpus, which the API does not install.
+"""
+import re
+
+# nltk.corpus.stopwords.words('english')
+NLTK_ENGLISH_STOPWORDS = [
+    "i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "you're", "you've", "you'll", "you'd",
+    "your", "yours", "yourself", "yourselves", "he", "him", "his", "himself", "she", "she's", "her", "hers",
+    "herself", "it", "it's", "its", "itself", "they", "them", "their", "theirs", "themselves", "what", "which",
+    "who", "whom", "this", "that", "that'll", "these", "those", "am", "is", "are", "was", "were", "be", "been",
+    "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if",
+    "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about", "against", "between",
+    "into", "through", "during", "before", "after", "above", "below", "to", "from", "up", "down", "in", "out",
+    "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "when", "where", "why",
+    "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not",
+    "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don", "don't",
+    "should", "should've", "now", "d", "ll", "m", "o", "re", "ve", "y", "ain", "aren", "aren't", "couldn",
+    "couldn't", "didn", "didn't", "doesn", "doesn't", "hadn", "hadn't", "hasn", "hasn't", "haven", "haven't",
+    "isn", "isn't", "ma", "mightn", "mightn't", "mustn", "mustn't", "needn", "needn't", "shan", "shan't",
+    "shouldn", "shouldn't", "wasn", "wasn't", "weren", "weren't", "won", "won't", "wouldn", "wouldn't",
+]
+
+# Define stopwords (from block 4)
+stop_words = set(NLTK_ENGLISH_STOPWORDS)
+punctuations =  '"\'\\,<>./?@#$%^&*_~/!()-[]{};:'
+custom_stopwords = set(["cup", "cups", "minutes", "oil", "teaspoon", "tablespoon", "ounce", "ounces", "gram", "grams", "minute", "hour", "hours"])
+frequent_words = set(['tablespoons', 'large','salt','heat', 'chopped','Add','fresh','sugar','bowl','butter','flour','baking','mixture','f',
+ 'pan','cream','large', 'chopped', 'Add', 'fresh', 'water', 'medium', 'skillet',  'sauce', 'cook', 'juice', 'cut',  'remaining', 'small','inch', 'finely', 'pot', 'oven', "new", "old", "previous",
+                      'pound','sliced','tender','ground','transfer','heavy','teaspoons', 'occasionally', 'leaves','let','add','cover']
+)
+colors = [
+    "red", "blue", "green", "yellow", "orange", "purple", "pink", "brown",
+    "black", "white", "gray", "grey", "beige", "cyan", "magenta", "teal",
+    "violet", "indigo", "maroon", "turquoise", "lavender", "gold", "silver"
+]
+
+stopwords = frozenset(stop_words.union(custom_stopwords).union(frequent_words).union(colors))
+
+# Characters kept by clean_text are letters and spaces. ASCII is decided up front;
+# other characters are classified the first time they are seen in each process.
+_delete_chars = {code: None for code in range(128) if not (chr(code).isalpha() or chr(code) == ' ')}
+_seen_chars = set(map(chr, range(128)))
+_digits = re.compile(r'\\d+')  # kept from the original cleaning, matches a literal "\d"
+
+
+def _letters_and_spaces(doc: str) -> str:
+    if not doc.isascii():
+        for char in set(doc) - _seen_chars:
+            _seen_chars.add(char)
+            if not char.isalpha():
+                _delete_chars[ord(char)] = None
+    return doc.translate(_delete_chars)
+
+
+# Clean text function (from block 5)
+def clean_text(documents):
+    cleaned_text = []
+    for doc in documents:
+        doc = doc.lower()
+        doc = _digits.sub(' ', doc) # Remove Digits
+        line = _letters_and_spaces(doc)
+        words = [word for word in line.split() if word not in stopwords]
+        cleaned_text.append(' '.join(words))
+    return cleaned_text
+
+
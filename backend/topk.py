@@ -0,0 +1,56 @@
+"""
+Top-k selection for relevance scores.
+
+Results are ordered by descending score with ties going to the lower recipe
+index, so pages are stable across requests. NaN scores rank last.
+"""
+import heapq
+from typing import Tuple
+
+import numpy as np
+
+
+def top_k_indices(scores: np.ndarray, k: int, offset: int = 0) -> np.ndarray:
+    """Positions of the best scores[offset:offset + k] in ranked order, via argpartition"""
+    scores = np.nan_to_num(np.asarray(scores, dtype=np.float64), nan=-np.inf)
+    want = min(offset + k, len(scores))
+    if k <= 0 or want <= offset:
+        return np.zeros(0, dtype=np.int64)
+    if want < len(scores):
+        # Everything strictly above the want-th best score, then the lowest-index ties
+        kth = -np.partition(-scores, want - 1)[want - 1]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:want - len(above)]
+        selected = np.concatenate([above, ties])
+    else:
+        selected = np.arange(len(scores))
+    ranked = selected[np.lexsort((selected, -scores[selected]))]
+    return ranked[offset:want]
+
+
+class StreamingTopK:
+    """Bounded min-heap merging top-k results from scores produced chunk by chunk"""
+
+    def __init__(self, k: int, offset: int = 0):
+        self.k = k
+        self.offset = offset
+        self.size = k + offset
+        # (score, -doc_id): the root is the worst entry kept so far
+        self._heap = []
+
+    def push(self, scores: np.ndarray, doc_ids: np.ndarray):
+        """Offer a chunk of scores for the recipes in doc_ids"""
+        for i in top_k_indices(scores, self.size):
+            score = float(scores[i])
+            item = (score if score == score else -np.inf, -int(doc_ids[i]))
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif item > self._heap[0]:
+                heapq.heapreplace(self._heap, item)
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Recipe ids and scores of the requested page, best first"""
+        items = sorted(self._heap, reverse=True)[self.offset:self.size]
+        doc_ids = np.array([-doc_id for _, doc_id in items], dtype=np.int64)
+        scores = np.array([score for score, _ in items], dtype=np.float64)
+        return doc_ids, scores